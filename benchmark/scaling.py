@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+
+# Copyright (c) Techland. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+
+"""
+Measures how parsing, analysis and export scale with the size of the build.
+For each scale a synthetic build log (and the files it lists) is generated,
+then the stages are timed with the profiler's instrumentation. Results may
+be appended to a json lines file together with the current git commit and
+compared with the results of another run.
+"""
+
+import os
+import sys
+import json
+import shutil
+import logging
+import argparse
+import tempfile
+import functools
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cppbuildprofiler import instrumentation
+from cppbuildprofiler.analysis import Analyser
+from cppbuildprofiler.dependency import DependencyGraph, unify_path
+from cppbuildprofiler.parser import parse_vs_log
+from cppbuildprofiler.profiler import _is_thirdparty_dependency
+from cppbuildprofiler.synthetic import SyntheticLog
+
+_STAGES = ['parse_vs_log', 'run_full_analysis', 'remove_orphans', 'print_csv', 'write', 'read']
+
+def _get_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _run(directory, log):
+    log_path = os.path.join(directory, 'log.txt')
+    lines = log.write(log_path)
+    log.write_sources()
+
+    depgraph = parse_vs_log(log_path)
+    Analyser(depgraph).run_full_analysis()
+    nodes = depgraph.number_of_nodes()
+    edges = depgraph.number_of_edges()
+
+    # the synthetic system headers play the role of third-party code
+    codebase_dir = unify_path(os.path.join(log.root, 'project'))
+    depgraph.remove_dependency_by_predicate(
+        functools.partial(_is_thirdparty_dependency, depgraph, codebase_dir))
+    with instrumentation.stage('remove_orphans'):
+        depgraph.remove_orphans()
+
+    with instrumentation.stage('print_csv'), \
+            open(os.path.join(directory, 'dependency.csv'), 'w', newline='') as stream:
+        depgraph.print_csv(stream, Analyser.INTERNAL_COLUMNS, ',',
+                           depgraph.get_dependency_nodes())
+
+    gml_path = os.path.join(directory, 'graph.gml')
+    with instrumentation.stage('write'):
+        depgraph.write(gml_path)
+    with instrumentation.stage('read'):
+        DependencyGraph.read(gml_path)
+    return lines, nodes, edges
+
+def _measure(scale, seed):
+    directory = tempfile.mkdtemp(prefix='cppbuildprofiler-benchmark')
+    recorder = instrumentation.Instrumentation()
+    try:
+        log = SyntheticLog(root=os.path.join(directory, 'src'), seed=seed).scaled(scale)
+        recorder.start()
+        lines, nodes, edges = _run(directory, log)
+    finally:
+        recorder.stop()
+        shutil.rmtree(directory)
+    times = {stage['name']: stage['wall_time']
+             for stage in recorder.get_report()['stages'] if stage['name'] in _STAGES}
+    return {
+        'scale': scale,
+        'lines': lines,
+        'nodes': nodes,
+        'edges': edges,
+        'times': times,
+        }
+
+def _load_baseline(path):
+    baseline = {}
+    with open(path) as stream:
+        for line in stream:
+            if line.strip():
+                result = json.loads(line)
+                baseline[result['scale']] = result
+    return baseline
+
+def main():
+    parser = argparse.ArgumentParser('measures how the profiler scales with the build size')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100],
+                        help='sizes of the synthetic builds, as multiples of the base build '
+                             '(defaults to 1 10 100)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the synthetic build generator')
+    parser.add_argument('--output', '-o',
+                        help='json lines file to append the results to')
+    parser.add_argument('--baseline', '-b',
+                        help='json lines file with results to compare with (the last '
+                             'result of each scale is used)')
+    opts = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    baseline = _load_baseline(opts.baseline) if opts.baseline else {}
+    commit = _get_commit()
+
+    for scale in opts.scales:
+        result = _measure(scale, opts.seed)
+        result['commit'] = commit
+        result['seed'] = opts.seed
+        result['python'] = sys.version.split()[0]
+        print('scale %dx: %d log lines, %d nodes, %d edges' % (
+            scale, result['lines'], result['nodes'], result['edges']))
+        previous = baseline.get(scale)
+        for stage in _STAGES:
+            seconds = result['times'].get(stage)
+            comparison = ''
+            if previous and previous['times'].get(stage):
+                comparison = ' (%.2fx of %s)' % (seconds / previous['times'][stage],
+                                                 previous.get('commit') or 'baseline')
+            print('    %-20s %9.3f s%s' % (stage, seconds, comparison))
+        if opts.output:
+            with open(opts.output, 'a') as stream:
+                stream.write(json.dumps(result) + '\n')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+# Copyright (c) Techland. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+
+"""
+Measures startup times of the command line entry points, i.e. the cost paid
+by every cppbuildprofiler-cli invocation from a script. Each scenario is run
+in a fresh interpreter a number of times and the median wall time is
+reported. With --max-ms the script fails if any median exceeds the limit,
+so it can be used as a regression check.
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+_SCENARIOS = [
+    ('python', 'pass'),
+    ('import cli', 'import cppbuildprofiler.cli'),
+    ('cli help', 'from cppbuildprofiler.cli import main; main(["help"])'),
+    ('cli help print', 'from cppbuildprofiler.cli import main; main(["help print"])'),
+    ('cli argument error', 'from cppbuildprofiler.cli import main; main(["print --unknown"])'),
+    ('profiler --help',
+     'from cppbuildprofiler.profiler import main\n'
+     'try:\n'
+     '    main(["--help"])\n'
+     'except SystemExit:\n'
+     '    pass'),
+    ('import package API', 'from cppbuildprofiler import Analyser'),
+    ]
+
+def _measure(code, repeats, environment):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], env=environment, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append((time.perf_counter() - start) * 1000.0)
+    return statistics.median(times)
+
+def main():
+    parser = argparse.ArgumentParser('measures entry point startup times')
+    parser.add_argument('--repeats', '-r', type=int, default=10,
+                        help='number of runs per scenario (defaults to 10)')
+    parser.add_argument('--max-ms', type=float,
+                        help='fail if a cli or profiler scenario median exceeds this many '
+                             'milliseconds over the bare interpreter startup')
+    opts = parser.parse_args()
+
+    environment = dict(os.environ)
+    package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    environment['PYTHONPATH'] = os.pathsep.join(
+        [package_dir] + [path for path in [environment.get('PYTHONPATH')] if path])
+
+    baseline = None
+    failed = False
+    for name, code in _SCENARIOS:
+        median = _measure(code, opts.repeats, environment)
+        if baseline is None:
+            baseline = median
+        overhead = median - baseline
+        print('%-20s %8.1f ms (+%.1f ms)' % (name, median, overhead))
+        if (opts.max_ms is not None and name.startswith(('cli', 'profiler', 'import cli'))
+                and overhead > opts.max_ms):
+            failed = True
+    if failed:
+        sys.exit('Startup time regression: some scenarios exceeded %.1f ms' % opts.max_ms)
+
+if __name__ == '__main__':
+    main()
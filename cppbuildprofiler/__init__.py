@@ -8,14 +8,38 @@ classes, probably the easiest way to use it is to execute the module itself
 and perform the profiling interactively via the command line.
 """
 
-from cppbuildprofiler.analysis import Analyser
-from cppbuildprofiler.dependency import DependencyGraph
-from cppbuildprofiler.dependency import unify_path
-from cppbuildprofiler.parser import parse_vs_log
+import importlib
 
-__all__ = [
-    'Analyser',
-    'DependencyGraph',
-    'unify_path',
-    'parse_vs_log',
-    ]
+# The names are imported on first access, so that importing a submodule (e.g.
+# the command line interpreter) doesn't load networkx, numpy and scipy.
+_LAZY_NAMES = {
+    'Analyser': 'cppbuildprofiler.analysis',
+    'DependencyGraph': 'cppbuildprofiler.dependency',
+    'unify_path': 'cppbuildprofiler.dependency',
+    'write_sqlite': 'cppbuildprofiler.export',
+    'write_npz': 'cppbuildprofiler.export',
+    'load_npz': 'cppbuildprofiler.export',
+    'write_parquet': 'cppbuildprofiler.export',
+    'FlameGraph': 'cppbuildprofiler.flamegraph',
+    'HistoryStore': 'cppbuildprofiler.history',
+    'parse_vs_log': 'cppbuildprofiler.parser',
+    'Query': 'cppbuildprofiler.query',
+    'Recommender': 'cppbuildprofiler.recommendation',
+    'HtmlReport': 'cppbuildprofiler.report',
+    'QueryServer': 'cppbuildprofiler.server',
+    'Instrumentation': 'cppbuildprofiler.instrumentation',
+    'SyntheticLog': 'cppbuildprofiler.synthetic',
+    'TerminalRenderer': 'cppbuildprofiler.progress',
+    }
+
+__all__ = list(_LAZY_NAMES)
+
+def __getattr__(name):
+    if name not in _LAZY_NAMES:
+        raise AttributeError('module %r has no attribute %r' % (__name__, name))
+    value = getattr(importlib.import_module(_LAZY_NAMES[name]), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -4,10 +4,19 @@
 """Contains the Analyser class, used to run analysis on the dependency graph."""
 
 import logging
+import math
 import os
-from collections import defaultdict
+from array import array
+import itertools
+from collections import defaultdict, namedtuple
 import networkx as nx
+from cppbuildprofiler import attributes, progress
 from cppbuildprofiler.dependency import DependencyGraph
+from cppbuildprofiler.instrumentation import instrumented
+
+def _graph_size(analyser, *_args, **_kwargs):
+    return {'nodes': analyser._dependency_graph.number_of_nodes(),
+            'edges': analyser._dependency_graph.number_of_edges()}
 
 def _pretty_filesize(size):
     reduced_size = float(size)
@@ -19,27 +28,93 @@ def _pretty_filesize(size):
     assert(prefix_idx < len(prefixes)), 'Size is absurd: %s' % size
     return '%0.2f%sB' % (reduced_size, prefixes[prefix_idx])
 
+def _reachable(origins, successors, visitable=None):
+    """
+    Returns the set of nodes reachable from the origins (including them)
+    through the successors callable. If visitable is provided, only nodes
+    for which it returns True are visited.
+    """
+    visited = set(origins)
+    stack = list(visited)
+    while stack:
+        for child in successors(stack.pop()):
+            if child not in visited and (visitable is None or visitable(child)):
+                visited.add(child)
+                stack.append(child)
+    return visited
+
+def _immediate_dominators(origin, successors):
+    """
+    Calculates immediate dominators of nodes reachable from origin using the
+    Cooper-Harvey-Kennedy algorithm. successors is a callable returning the
+    successors of a node. Returns the list of reachable nodes in post-order
+    and the list of their immediate dominators' post-order indices. The
+    origin is last and is its own dominator.
+    """
+    order = []
+    visited = {origin}
+    stack = [(origin, iter(successors(origin)))]
+    while stack:
+        node, children = stack[-1]
+        for child in children:
+            if child not in visited:
+                visited.add(child)
+                stack.append((child, iter(successors(child))))
+                break
+        else:
+            stack.pop()
+            order.append(node)
+
+    index = {node: i for i, node in enumerate(order)}
+    predecessors = [[] for _ in order]
+    for i, node in enumerate(order):
+        for child in successors(node):
+            predecessors[index[child]].append(i)
+
+    origin_index = len(order) - 1
+    dominators = [None] * len(order)
+    dominators[origin_index] = origin_index
+    changed = True
+    while changed:
+        changed = False
+        for i in range(origin_index - 1, -1, -1):
+            new_dominator = None
+            for predecessor in predecessors[i]:
+                if dominators[predecessor] is None:
+                    continue
+                if new_dominator is None:
+                    new_dominator = predecessor
+                    continue
+                finger = predecessor
+                while finger != new_dominator:
+                    while finger < new_dominator:
+                        finger = dominators[finger]
+                    while new_dominator < finger:
+                        new_dominator = dominators[new_dominator]
+            if dominators[i] != new_dominator:
+                dominators[i] = new_dominator
+                changed = True
+    return order, dominators
+
 class Analyser:
     """Performs an optimisation-related analysis on a dependency graph."""
 
-    class Attributes: # pylint: disable=too-few-public-methods
-        """Contains names of depgraph attributes with analyser metrics"""
-        PROJECT = 'project'
-        ABSOLUTE_PATH = 'absolutepath'
-        COMPILATION_COMMAND = 'compilationcommand'
-        USED_PCH = 'usepch'
-        CREATED_PCH = 'createpch'
-        BUILD_TIME = 'buildtime'
-        FILE_SIZE = 'filesize'
-        TOTAL_SIZE = 'totalsize'
-        AGG_BUILD_TIME_DEV = 'avgbuildtimedev'
-        TRANSLATION_UNITS = 'translationunits'
-        
-        def __init__(self):
-            pass
-        
+    Attributes = attributes.Attributes
+
+    ProjectMetrics = attributes.ProjectMetrics
+
     UNKNOWN_PROJECT_NAME = '__UNKNOWN__'
 
+    PROJECT_GROUPING = attributes.Groupings.PROJECT
+    DIRECTORY_GROUPING = attributes.Groupings.DIRECTORY
+    COMMUNITY_GROUPING = attributes.Groupings.COMMUNITY
+
+    DependencyChange = namedtuple('DependencyChange', [
+        'label', 'removed', 'added', 'total_size_delta', 'build_time_delta'])
+
+    RedundantDependency = namedtuple('RedundantDependency', [
+        'parent', 'child', 'through', 'translation_units'])
+
     ROOT_COLUMNS = {
         Attributes.BUILD_TIME: DependencyGraph.Column('total build time [s]', 0.0),
         Attributes.TRANSLATION_UNITS: DependencyGraph.Column('total translation units', 0),
@@ -52,6 +127,8 @@ class Analyser:
         Attributes.BUILD_TIME: DependencyGraph.Column('build time [s]', 0.0),
         Attributes.FILE_SIZE: DependencyGraph.Column('file size [B]', 0),
         Attributes.TOTAL_SIZE: DependencyGraph.Column('total size [B]', 0),
+        Attributes.SELF_COST: DependencyGraph.Column('estimated own build time [s]', 0.0),
+        Attributes.REPEATED_INCLUSIONS: DependencyGraph.Column('repeated inclusions', 0),
         }
 
     INTERNAL_COLUMNS = {
@@ -65,11 +142,39 @@ class Analyser:
             'total build time of dependants [s]', 0.0),
         Attributes.AGG_BUILD_TIME_DEV: DependencyGraph.Column(
             'aggregated build time deviation from avg [s]', 0.0),
+        Attributes.SELF_COST: DependencyGraph.Column(
+            'estimated self build time [s]', 0.0),
+        Attributes.EXCLUSIVE_SIZE: DependencyGraph.Column(
+            'aggregated exclusive size [B]', 0),
+        Attributes.EXCLUSIVE_BUILD_TIME: DependencyGraph.Column(
+            'aggregated exclusive self build time [s]', 0.0),
+        Attributes.REPEATED_INCLUSIONS: DependencyGraph.Column(
+            'aggregated repeated inclusions', 0),
+        Attributes.INCLUDE_CYCLES: DependencyGraph.Column('aggregated include cycles', 0),
+        }
+
+    PROJECT_COLUMNS = {
+        ProjectMetrics.TRANSLATION_UNITS: DependencyGraph.Column('translation units', 0),
+        ProjectMetrics.BUILD_TIME: DependencyGraph.Column('total build time [s]', 0.0),
+        ProjectMetrics.AVG_BUILD_TIME: DependencyGraph.Column('average build time [s]', 0.0),
+        ProjectMetrics.P95_BUILD_TIME: DependencyGraph.Column('95th percentile build time [s]',
+                                                              0.0),
+        ProjectMetrics.COMPILED_SIZE: DependencyGraph.Column('total compiled size [B]', 0),
+        ProjectMetrics.OWNED_HEADERS: DependencyGraph.Column('owned headers', 0),
+        ProjectMetrics.IMPOSED_BUILD_TIME: DependencyGraph.Column(
+            'build time of other projects\' dependants [s]', 0.0),
         }
 
     def __init__(self, dependency_graph):
         self._dependency_graph = dependency_graph
+        self._condensation = None
         self._build_pch_dependencies()
+
+    def _track_translation_units(self, task):
+        return progress.track(
+            task,
+            lambda: sum(1 for _ in self._dependency_graph.get_top_level_nodes()),
+            'translation units')
     
     def _build_pch_dependencies(self):
         self._pch_dependencies = {}
@@ -82,6 +187,16 @@ class Analyser:
                 self._pch_dependencies[create_pch] = frozenset(
                     self._dependency_graph.traverse_pre_order(create_pch, True))
 
+    def get_condensation(self):
+        """
+        Returns the condensation of the dependency graph, as returned by
+        DependencyGraph.get_condensation. It's calculated once per Analyser,
+        so the graph structure must not be modified in the meantime.
+        """
+        if self._condensation is None:
+            self._condensation = self._dependency_graph.get_condensation()
+        return self._condensation
+
     def _is_pch_dependency(self, parent, child):
         use_pch = self._dependency_graph.get_attribute(parent, self.Attributes.USED_PCH)
         if use_pch:
@@ -89,6 +204,60 @@ class Analyser:
         else:
             return False
 
+    def get_translation_unit_dependencies(self, top_level):
+        """
+        Returns a generator over the dependencies compiled as part of the
+        top_level translation unit, i.e. skipping the precompiled ones.
+        """
+        return (label for label in self._dependency_graph.traverse_pre_order(top_level)
+                if not self._is_pch_dependency(top_level, label))
+
+    def get_translation_unit_include_tree(self, top_level):
+        """
+        Returns a generator of (depth, label) pairs describing the include
+        tree of the top_level translation unit, as printed by /showIncludes:
+        depth-first, in pre-order, starting with the top-level node at depth
+        0. Each file is visited only the first time it is included. Files
+        included through precompiled-headers are skipped.
+
+        The tree is an approximation rebuilt from the dependency graph, which
+        aggregates the includes of all translation units: a header's children
+        are the files it included in any translation unit (not necessarily in
+        this one, e.g. under different preprocessor definitions), in the order
+        the dependencies were first parsed.
+        """
+        use_pch = self._dependency_graph.get_attribute(top_level, self.Attributes.USED_PCH)
+        successors = self._get_compiled_successors(use_pch, {})
+        visited = {top_level}
+        yield 0, top_level
+        stack = [iter(successors(top_level))]
+        while stack:
+            for child in stack[-1]:
+                if child not in visited:
+                    visited.add(child)
+                    yield len(stack), child
+                    stack.append(iter(successors(child)))
+                    break
+            else:
+                stack.pop()
+
+    def _get_compiled_successors(self, use_pch, cache):
+        """
+        Returns a callable listing the immediate dependencies of a node that
+        get compiled in translation units using use_pch. The lists are
+        memoised in cache, so they are shared by all the translation units
+        using the same precompiled header.
+        """
+        pch_dependencies = self._pch_dependencies[use_pch] if use_pch else frozenset()
+        successors = cache.setdefault(use_pch, {})
+        def get(label):
+            if label not in successors:
+                successors[label] = [
+                    child for child in self._dependency_graph.get_node_immediate_dependencies(label)
+                    if child not in pch_dependencies]
+            return successors[label]
+        return get
+
     def _guess_dependency_project(self, label, directory_to_project):
         if self._dependency_graph.has_attribute(label, self.Attributes.PROJECT):
             return self._dependency_graph.get_attribute(label, self.Attributes.PROJECT)
@@ -105,35 +274,288 @@ class Analyser:
     def get_project_dependency_graph(self):
         """
         Builds a dependency graph showing relations between projects. This is
-        a networkx DiGraph, not a DependencyGraph.
+        a networkx DiGraph, not a DependencyGraph. See get_coarsened_graph
+        for the node and edge attributes.
         """
+        return self.get_coarsened_graph(self.PROJECT_GROUPING)
+
+    def _get_directory_groups(self, depth):
+        groups = {}
+        for label in self._dependency_graph.get_nodes():
+            path = self._dependency_graph.get_attribute(label, self.Attributes.ABSOLUTE_PATH)
+            if path is None:
+                groups[label] = self.UNKNOWN_PROJECT_NAME
+            else:
+                components = os.path.dirname(path).split('/')
+                # POSIX absolute paths start with an empty component
+                skipped = 1 if components[0] == '' else 0
+                groups[label] = '/'.join(components[:depth + skipped])
+        return groups
+
+    def _get_community_groups(self, max_iterations):
+        # label propagation on the undirected include graph
+        labels = sorted(self._dependency_graph.get_nodes())
+        groups = {label: label for label in labels}
+        for _ in range(max_iterations):
+            changed = False
+            for label in labels:
+                counts = defaultdict(int)
+                for neighbour in itertools.chain(
+                        self._dependency_graph.get_node_immediate_dependencies(label),
+                        self._dependency_graph.get_node_immediate_dependants(label)):
+                    if neighbour != DependencyGraph.ROOT_NODE_LABEL:
+                        counts[groups[neighbour]] += 1
+                if counts:
+                    best = min(counts, key=lambda group: (-counts[group], group))
+                    if counts[best] > counts.get(groups[label], 0):
+                        groups[label] = best
+                        changed = True
+            if not changed:
+                break
+        return groups
+
+    def get_coarsened_graph(self, grouping, depth=attributes.Groupings.DIRECTORY_DEPTH,
+                            max_iterations=20):
+        """
+        Collapses the dependency graph into a networkx DiGraph of groups of
+        files. grouping is one of:
+        * PROJECT_GROUPING - files are grouped by their project,
+        * DIRECTORY_GROUPING - files are grouped by the first depth components
+        of their directory (not counting the leading / of POSIX paths),
+        * COMMUNITY_GROUPING - files are grouped by communities found with
+        label propagation (at most max_iterations rounds) on the include graph.
+
+        Group nodes have the "nodes" (number of files), "translationunits",
+        "filesize" and "buildtime" (summed over top-level files) attributes.
+        An edge between groups exists if any of their files include each other
+        and has the "includes" (number of such includes) and "buildtime"
+        (summed build time metric of the including files) attributes. Edges
+        are aggregated in a single pass over the graph.
+        """
+        if grouping == self.PROJECT_GROUPING:
+            groups = {label: self._dependency_graph.get_attribute(label, self.Attributes.PROJECT,
+                                                                  self.UNKNOWN_PROJECT_NAME)
+                      for label in self._dependency_graph.get_nodes()}
+        elif grouping == self.DIRECTORY_GROUPING:
+            groups = self._get_directory_groups(depth)
+        elif grouping == self.COMMUNITY_GROUPING:
+            groups = self._get_community_groups(max_iterations)
+        else:
+            raise RuntimeError('Unknown grouping: %s' % grouping)
+
+        top_levels = frozenset(self._dependency_graph.get_top_level_nodes())
         graph = nx.DiGraph()
-        for node in self._dependency_graph.traverse_pre_order():
-            dependencies = self._dependency_graph.get_node_immediate_dependencies(node)
-            source = self._dependency_graph.get_attribute(node, self.Attributes.PROJECT)
-            for dependency_node in dependencies:
-                target = self._dependency_graph.get_attribute(dependency_node,
-                                                              self.Attributes.PROJECT)
-                if source != target:
-                    graph.add_edge(source, target)
-        
+        for group in set(groups.values()):
+            graph.add_node(group, nodes=0, translationunits=0, filesize=0, buildtime=0.0)
+        for label, group in groups.items():
+            attributes = graph.node[group]
+            attributes['nodes'] += 1
+            attributes['filesize'] += self._dependency_graph.get_attribute(
+                label, self.Attributes.FILE_SIZE, 0)
+            build_time = self._dependency_graph.get_attribute(label, self.Attributes.BUILD_TIME,
+                                                              0.0)
+            if label in top_levels:
+                attributes['translationunits'] += 1
+                attributes['buildtime'] += build_time
+
+            for child in self._dependency_graph.get_node_immediate_dependencies(label):
+                target = groups[child]
+                if target == group:
+                    continue
+                if graph.has_edge(group, target):
+                    edge = graph.edge[group][target]
+                    edge['includes'] += 1
+                    edge['buildtime'] += build_time
+                else:
+                    graph.add_edge(group, target, includes=1, buildtime=build_time)
+
         return graph
 
+    def get_dependency_change_impact(self, overlay):
+        """
+        Projects the effect of the dependency edges added and removed in the
+        provided DependencyGraphOverlay. Returns a list of DependencyChange
+        tuples for the translation units whose set of compiled files would
+        change, with the labels of dependencies they would lose and gain and
+        the resulting total size and build time deltas. Build time deltas use
+        the self cost metric, so calculate_self_costs should be run first.
+        Contents of precompiled headers are recalculated with the overlay's
+        dependencies.
+
+        Only the translation units depending on a modified node are visited
+        and their traversal is limited to nodes through which a file affected
+        by the modification can be reached.
+        """
+        removed = overlay.get_removed_dependencies()
+        added = overlay.get_added_dependencies()
+        parents = set(parent for parent, _ in itertools.chain(removed, added))
+
+        removed_dependants = defaultdict(list)
+        for parent, child in removed:
+            removed_dependants[child].append(parent)
+        def all_dependants(label):
+            # dependants in the graph or the overlay: the overlay's and the
+            # ones whose dependency it removed
+            return itertools.chain(overlay.get_node_immediate_dependants(label),
+                                   removed_dependants.get(label, ()))
+
+        candidates = _reachable([child for _, child in removed],
+                                self._dependency_graph.get_node_immediate_dependencies)
+        candidates |= _reachable([child for _, child in added],
+                                 overlay.get_node_immediate_dependencies)
+        relevant = _reachable(candidates, all_dependants)
+        top_levels = frozenset(self._dependency_graph.get_top_level_nodes())
+        affected = [label for label in _reachable(parents, all_dependants) if label in top_levels]
+
+        # a precompiled header only changes if it depends on a modified node
+        overlay_pch_dependencies = {}
+        for create_pch, pch_dependencies in self._pch_dependencies.items():
+            if pch_dependencies & parents:
+                pch_dependencies = frozenset(
+                    _reachable([create_pch], overlay.get_node_immediate_dependencies))
+            overlay_pch_dependencies[create_pch] = pch_dependencies
+
+        changes = []
+        for top_level in sorted(affected):
+            use_pch = self._dependency_graph.get_attribute(top_level, self.Attributes.USED_PCH)
+            def get_visitable(pch_dependencies):
+                pch_dependencies = pch_dependencies[use_pch] if use_pch else frozenset()
+                return lambda label: label in relevant and label not in pch_dependencies
+
+            before = _reachable([top_level],
+                                self._dependency_graph.get_node_immediate_dependencies,
+                                get_visitable(self._pch_dependencies)) & candidates
+            after = _reachable([top_level],
+                               overlay.get_node_immediate_dependencies,
+                               get_visitable(overlay_pch_dependencies)) & candidates
+            lost = sorted(before - after)
+            gained = sorted(after - before)
+            if not lost and not gained:
+                continue
+
+            def total(labels, key, default):
+                return sum(self._dependency_graph.get_attribute(label, key, default)
+                           for label in labels)
+            changes.append(self.DependencyChange(
+                top_level,
+                lost,
+                gained,
+                total(gained, self.Attributes.FILE_SIZE, 0) -
+                total(lost, self.Attributes.FILE_SIZE, 0),
+                total(gained, self.Attributes.SELF_COST, 0.0) -
+                total(lost, self.Attributes.SELF_COST, 0.0)))
+        return changes
+
+    def get_redundant_dependencies(self):
+        """
+        Finds dependency edges implied by other edges, i.e. parent -> child
+        dependencies where child is also included through another dependency
+        of parent (the edges missing from the transitive reduction of the
+        graph). Returns a list of RedundantDependency tuples, naming one of
+        the dependencies through which child is included, sorted by the
+        number of translation units depending on parent (the metric should
+        be calculated beforehand).
+
+        Reachability is calculated once for all nodes, in reverse topological
+        order of the graph's condensation (so include cycles are handled), as
+        bitsets of the transitive dependencies. Memory use is therefore
+        quadratic in the number of nodes, but at one bit per pair. Edges within
+        an include cycle are not reported.
+        """
+        logging.info('Finding redundant dependencies...')
+        components, component_of = self.get_condensation()
+        reachable = [0] * len(components)
+        for component in range(len(components) - 1, -1, -1):
+            reach = 0
+            for label in components[component]:
+                for child in self._dependency_graph.get_node_immediate_dependencies(label):
+                    child_component = component_of[child]
+                    if child_component != component:
+                        reach |= (1 << child_component) | reachable[child_component]
+            reachable[component] = reach
+
+        top_levels = frozenset(self._dependency_graph.get_top_level_nodes())
+        redundant = []
+        for parent, parent_component in component_of.items():
+            # children from the same include cycle include each other, all
+            # but the first one are redundant
+            representatives = {}
+            implied = []
+            for child in sorted(self._dependency_graph.get_node_immediate_dependencies(parent)):
+                component = component_of[child]
+                if component == parent_component:
+                    continue
+                if component in representatives:
+                    implied.append((child, representatives[component]))
+                else:
+                    representatives[component] = child
+
+            # or-ed reachability of all children but the i-th one
+            children = sorted(representatives.items())
+            prefix = [0]
+            for component, _ in children[:-1]:
+                prefix.append(prefix[-1] | reachable[component])
+            suffix = 0
+            for i in range(len(children) - 1, -1, -1):
+                component, child = children[i]
+                bit = 1 << component
+                if (prefix[i] | suffix) & bit:
+                    implied.append((child, next(other for other_component, other in children
+                                                if reachable[other_component] & bit)))
+                suffix |= reachable[component]
+
+            if implied:
+                if parent in top_levels:
+                    translation_units = 1
+                else:
+                    translation_units = self._dependency_graph.get_attribute(
+                        parent, self.Attributes.TRANSLATION_UNITS, 0)
+                for child, through in implied:
+                    redundant.append(self.RedundantDependency(parent, child, through,
+                                                              translation_units))
+
+        redundant.sort(key=lambda dependency: (-dependency.translation_units,
+                                               dependency.parent,
+                                               dependency.child))
+        return redundant
+
+    @instrumented(counters=_graph_size)
+    def get_include_cycles(self):
+        """
+        Returns the include cycles in the graph as a list of sorted label
+        lists (strongly connected components with more than one node and
+        files including themselves), largest first.
+        """
+        components, _ = self.get_condensation()
+        cycles = [sorted(component) for component in components
+                  if len(component) > 1 or
+                  self._dependency_graph.has_immediate_dependency(next(iter(component)),
+                                                                  next(iter(component)))]
+        cycles.sort(key=lambda cycle: (-len(cycle), cycle))
+        return cycles
+
+    @instrumented(counters=_graph_size)
     def calculate_file_sizes(self):
         """
         Calculates file sizes of individual files by checking the disk
         usage for files pointed to by Metrics.ABSOLUTE_PATH in the DependencyGraph.
         """
         logging.info('Calculating file sizes...')
-        for label in self._dependency_graph.traverse_post_order():
-            path = self._dependency_graph.get_attribute(label,
-                                                        self.Attributes.ABSOLUTE_PATH)
-            file_size = os.path.getsize(path)
-            self._dependency_graph.set_attribute(label, self.Attributes.FILE_SIZE,
-                                                 file_size)
-            logging.debug('File size of %s is %s',
-                          label, _pretty_filesize(file_size))
+        tracker = progress.track('Calculating file sizes',
+                                 lambda: self._dependency_graph.number_of_nodes() - 1,
+                                 'files')
+        with tracker:
+            for index, label in enumerate(self._dependency_graph.traverse_post_order(), 1):
+                tracker.update(index)
+                path = self._dependency_graph.get_attribute(label,
+                                                            self.Attributes.ABSOLUTE_PATH)
+                file_size = os.path.getsize(path)
+                self._dependency_graph.set_attribute(label, self.Attributes.FILE_SIZE,
+                                                     file_size)
+                logging.debug('File size of %s is %s',
+                              label, _pretty_filesize(file_size))
 
+    @instrumented(counters=_graph_size)
     def calculate_total_sizes(self):
         """
         Calculates "total" sizes of files. This is the file size of the node
@@ -149,32 +571,36 @@ class Analyser:
             self._dependency_graph.remove_attribute(label, self.Attributes.TOTAL_SIZE)
 
         top_level_total_size = 0
-        for top_level in self._dependency_graph.get_top_level_nodes():
-            subtree_sizes = defaultdict(lambda: 0)
-
-            subtree = self._dependency_graph.get_subtree(top_level)
-            for internal in subtree.traverse_post_order(top_level, True):
-                if not self._is_pch_dependency(top_level, internal):
-                    subtree_size = self._dependency_graph.get_attribute(internal,
-                                                                        self.Attributes.FILE_SIZE)
-                    for child in subtree.get_node_immediate_dependencies(internal):
-                        subtree_size += subtree_sizes[child]
-                    subtree_sizes[internal] += subtree_size
-                    current = self._dependency_graph.get_attribute(internal,
-                                                                   self.Attributes.TOTAL_SIZE,
-                                                                   0)
-                    self._dependency_graph.set_attribute(internal,
-                                                         self.Attributes.TOTAL_SIZE,
-                                                         current + subtree_size)
-                else:
-                    subtree_sizes[internal] = 0
-            top_level_total_size += self._dependency_graph.get_attribute(top_level,
-                                                                         self.Attributes.TOTAL_SIZE)
+        tracker = self._track_translation_units('Calculating total sizes')
+        with tracker:
+            for index, top_level in enumerate(self._dependency_graph.get_top_level_nodes(), 1):
+                tracker.update(index)
+                subtree_sizes = defaultdict(lambda: 0)
+
+                subtree = self._dependency_graph.get_subtree(top_level)
+                for internal in subtree.traverse_post_order(top_level, True):
+                    if not self._is_pch_dependency(top_level, internal):
+                        subtree_size = self._dependency_graph.get_attribute(
+                            internal, self.Attributes.FILE_SIZE)
+                        for child in subtree.get_node_immediate_dependencies(internal):
+                            subtree_size += subtree_sizes[child]
+                        subtree_sizes[internal] += subtree_size
+                        current = self._dependency_graph.get_attribute(internal,
+                                                                       self.Attributes.TOTAL_SIZE,
+                                                                       0)
+                        self._dependency_graph.set_attribute(internal,
+                                                             self.Attributes.TOTAL_SIZE,
+                                                             current + subtree_size)
+                    else:
+                        subtree_sizes[internal] = 0
+                top_level_total_size += self._dependency_graph.get_attribute(
+                    top_level, self.Attributes.TOTAL_SIZE)
 
         self._dependency_graph.set_attribute(DependencyGraph.ROOT_NODE_LABEL,
                                              self.Attributes.TOTAL_SIZE,
                                              top_level_total_size)
 
+    @instrumented(counters=_graph_size)
     def calculate_total_build_times(self):
         """
         Calculates the "total build time" metric. The total build time for a
@@ -186,25 +612,29 @@ class Analyser:
             self._dependency_graph.remove_attribute(label, self.Attributes.BUILD_TIME)
 
         total_build_time = 0.0
-        for label in self._dependency_graph.get_top_level_nodes():
-            build_time = self._dependency_graph.get_attribute(
-                label,
-                self.Attributes.BUILD_TIME)
-            total_build_time += build_time
-            subtree = self._dependency_graph.traverse_pre_order(label)
-            for subtree_label in subtree:
-                if not self._is_pch_dependency(label, subtree_label):
-                    current = self._dependency_graph.get_attribute(
-                        subtree_label, self.Attributes.BUILD_TIME, default=0.0)
-                    current += build_time
-                    self._dependency_graph.set_attribute(
-                        subtree_label,
-                        self.Attributes.BUILD_TIME,
-                        current)
+        tracker = self._track_translation_units('Calculating total build times')
+        with tracker:
+            for index, label in enumerate(self._dependency_graph.get_top_level_nodes(), 1):
+                tracker.update(index)
+                build_time = self._dependency_graph.get_attribute(
+                    label,
+                    self.Attributes.BUILD_TIME)
+                total_build_time += build_time
+                subtree = self._dependency_graph.traverse_pre_order(label)
+                for subtree_label in subtree:
+                    if not self._is_pch_dependency(label, subtree_label):
+                        current = self._dependency_graph.get_attribute(
+                            subtree_label, self.Attributes.BUILD_TIME, default=0.0)
+                        current += build_time
+                        self._dependency_graph.set_attribute(
+                            subtree_label,
+                            self.Attributes.BUILD_TIME,
+                            current)
         self._dependency_graph.set_attribute(DependencyGraph.ROOT_NODE_LABEL,
                                              self.Attributes.BUILD_TIME,
                                              total_build_time)
 
+    @instrumented(counters=_graph_size)
     def calculate_translation_units(self):
         """
         Calculates the "translation units" metric. The metric value for
@@ -215,22 +645,26 @@ class Analyser:
             self._dependency_graph.remove_attribute(label, self.Attributes.TRANSLATION_UNITS)
 
         total_translation_units = 0
-        for label in self._dependency_graph.get_top_level_nodes():
-            total_translation_units += 1
-            subtree = self._dependency_graph.traverse_pre_order(label)
-            for subtree_label in subtree:
-                if not self._is_pch_dependency(label, subtree_label):
-                    current = self._dependency_graph.get_attribute(
-                        subtree_label, self.Attributes.TRANSLATION_UNITS, default=0)
-                    current += 1
-                    self._dependency_graph.set_attribute(
-                        subtree_label,
-                        self.Attributes.TRANSLATION_UNITS,
-                        current)
+        tracker = self._track_translation_units('Calculating translation units')
+        with tracker:
+            for label in self._dependency_graph.get_top_level_nodes():
+                total_translation_units += 1
+                tracker.update(total_translation_units)
+                subtree = self._dependency_graph.traverse_pre_order(label)
+                for subtree_label in subtree:
+                    if not self._is_pch_dependency(label, subtree_label):
+                        current = self._dependency_graph.get_attribute(
+                            subtree_label, self.Attributes.TRANSLATION_UNITS, default=0)
+                        current += 1
+                        self._dependency_graph.set_attribute(
+                            subtree_label,
+                            self.Attributes.TRANSLATION_UNITS,
+                            current)
         self._dependency_graph.set_attribute(DependencyGraph.ROOT_NODE_LABEL,
                                              self.Attributes.TRANSLATION_UNITS,
                                              total_translation_units)
 
+    @instrumented(counters=_graph_size)
     def calculate_agg_build_time_dev(self):
         """
         Calculates the "aggregated build time deviation" metric. This is the sum
@@ -256,6 +690,144 @@ class Analyser:
                                                      self.Attributes.AGG_BUILD_TIME_DEV,
                                                      total_build_time - avg_total_build_time)
 
+    @instrumented(counters=_graph_size)
+    def calculate_self_costs(self, regularisation=1.0, max_iterations=None):
+        """
+        Estimates the "self cost" metric - the marginal build time each
+        dependency adds to every translation unit compiling it. Build logs only
+        provide whole translation unit times, so the costs are fitted with
+        regularised least squares over the translation unit x dependency
+        inclusion matrix:
+
+            tu build time ~= a + b * compiled bytes + sum(header deltas)
+
+        The size-driven part (a, b) is fitted first, the per-header deltas are
+        then fitted to the residuals with a damped sparse solver (LSQR), so the
+        whole thing scales to tens of thousands of translation units and
+        headers. The self cost of a dependency is b * file size + delta,
+        clipped at zero. Top-level nodes get the time left over after
+        subtracting the costs of their dependencies. File sizes should be
+        calculated beforehand.
+        """
+        import numpy as np
+        from scipy.sparse import csr_matrix
+        from scipy.sparse.linalg import lsqr
+
+        logging.info('Calculating self costs...')
+        for label in self._dependency_graph.traverse_pre_order():
+            self._dependency_graph.remove_attribute(label, self.Attributes.SELF_COST)
+
+        top_levels = []
+        build_times = array('d')
+        compiled_sizes = array('d')
+        columns = {}
+        # typecodes of the same width as the numpy dtypes on every platform
+        # ('l' is 4 bytes on Windows)
+        indptr = array('q', [0])
+        indices = array('i')
+        tracker = self._track_translation_units('Collecting translation unit dependencies')
+        with tracker:
+            for index, top_level in enumerate(self._dependency_graph.get_top_level_nodes(), 1):
+                tracker.update(index)
+                build_time = self._dependency_graph.get_attribute(top_level,
+                                                                  self.Attributes.BUILD_TIME)
+                if build_time is None:
+                    continue
+                compiled_size = self._dependency_graph.get_attribute(
+                    top_level, self.Attributes.FILE_SIZE, 0)
+                for label in self.get_translation_unit_dependencies(top_level):
+                    indices.append(columns.setdefault(label, len(columns)))
+                    compiled_size += self._dependency_graph.get_attribute(
+                        label, self.Attributes.FILE_SIZE, 0)
+                indptr.append(len(indices))
+                top_levels.append(top_level)
+                build_times.append(build_time)
+                compiled_sizes.append(compiled_size)
+
+        if not top_levels:
+            return
+
+        build_times = np.frombuffer(build_times, dtype=np.float64)
+        compiled_sizes = np.frombuffer(compiled_sizes, dtype=np.float64)
+        design = np.column_stack([np.ones(len(top_levels)), compiled_sizes])
+        (intercept, per_byte), _, _, _ = np.linalg.lstsq(design, build_times, rcond=None)
+        per_byte = max(per_byte, 0.0)
+        residuals = build_times - intercept - per_byte * compiled_sizes
+
+        inclusions = csr_matrix(
+            (np.ones(len(indices), dtype=np.float32),
+             np.frombuffer(indices, dtype=np.intc),
+             np.frombuffer(indptr, dtype=np.int64)),
+            shape=(len(top_levels), len(columns)))
+        deltas = lsqr(inclusions, residuals, damp=regularisation,
+                      iter_lim=max_iterations)[0]
+        logging.debug('Self cost model: %f s + %e s/B, %d headers',
+                      intercept, per_byte, len(columns))
+
+        self_costs = np.empty(len(columns))
+        for label, column in columns.items():
+            file_size = self._dependency_graph.get_attribute(label, self.Attributes.FILE_SIZE, 0)
+            self_costs[column] = max(per_byte * file_size + deltas[column], 0.0)
+            self._dependency_graph.set_attribute(label, self.Attributes.SELF_COST,
+                                                 float(self_costs[column]))
+
+        dependency_costs = inclusions.dot(self_costs)
+        for top_level, build_time, dependency_cost in zip(top_levels,
+                                                          build_times,
+                                                          dependency_costs):
+            self._dependency_graph.set_attribute(top_level, self.Attributes.SELF_COST,
+                                                 max(float(build_time - dependency_cost), 0.0))
+
+    @instrumented(counters=_graph_size)
+    def calculate_exclusive_costs(self):
+        """
+        Calculates the "exclusive size" and "exclusive build time" metrics.
+        For every translation unit we build the dominator tree of its include
+        graph. A dependency dominates the nodes that are only reachable
+        through it, so these are exactly the files that would disappear from
+        the translation unit if the dependency was no longer included. The
+        metric is the sum of their file sizes (or self costs) aggregated over
+        all translation units. Files included through precompiled-headers are
+        skipped. Translation units using the same precompiled header share
+        the filtered include lists, but each dominator tree is built
+        separately, as it's rooted at the translation unit and its direct
+        includes differ.
+        """
+        logging.info('Calculating exclusive costs...')
+        for label in self._dependency_graph.traverse_pre_order():
+            self._dependency_graph.remove_attribute(label, self.Attributes.EXCLUSIVE_SIZE)
+            self._dependency_graph.remove_attribute(label, self.Attributes.EXCLUSIVE_BUILD_TIME)
+
+        successor_cache = {}
+        tracker = self._track_translation_units('Calculating exclusive costs')
+        with tracker:
+            for index, top_level in enumerate(self._dependency_graph.get_top_level_nodes(), 1):
+                tracker.update(index)
+                use_pch = self._dependency_graph.get_attribute(top_level, self.Attributes.USED_PCH)
+                order, dominators = _immediate_dominators(
+                    top_level, self._get_compiled_successors(use_pch, successor_cache))
+
+                sizes = [self._dependency_graph.get_attribute(label, self.Attributes.FILE_SIZE, 0)
+                         for label in order]
+                build_times = [self._dependency_graph.get_attribute(
+                                   label, self.Attributes.SELF_COST, 0.0)
+                               for label in order]
+                for i in range(len(order) - 1):
+                    dominator = dominators[i]
+                    sizes[dominator] += sizes[i]
+                    build_times[dominator] += build_times[i]
+
+                    label = order[i]
+                    current = self._dependency_graph.get_attribute(
+                        label, self.Attributes.EXCLUSIVE_SIZE, 0)
+                    self._dependency_graph.set_attribute(label, self.Attributes.EXCLUSIVE_SIZE,
+                                                         current + sizes[i])
+                    current = self._dependency_graph.get_attribute(
+                        label, self.Attributes.EXCLUSIVE_BUILD_TIME, 0.0)
+                    self._dependency_graph.set_attribute(
+                        label, self.Attributes.EXCLUSIVE_BUILD_TIME, current + build_times[i])
+
+    @instrumented(counters=_graph_size)
     def guess_project_names(self):
         """
         Sets the project name attribute for all nodes, based on the directory the file
@@ -281,11 +853,73 @@ class Analyser:
                                                  self._guess_dependency_project(
                                                      node, directory_to_project))
 
+    @instrumented(counters=_graph_size)
+    def get_project_metrics(self):
+        """
+        Rolls metrics up per project. Returns a list of (project, metrics)
+        pairs sorted by project name, where metrics is a dictionary keyed
+        by ProjectMetrics values (see PROJECT_COLUMNS). Uses the project
+        attribute set by guess_project_names and the total size and build
+        time metrics.
+
+        The imposed build time of a project is the summed build time of
+        translation units from other projects which compile any of its
+        headers. Every translation unit's include closure is visited once,
+        with files from precompiled headers skipped.
+        """
+        def new_metrics():
+            return {metric: column.default_value
+                    for metric, column in self.PROJECT_COLUMNS.items()}
+        projects = defaultdict(new_metrics)
+        build_times = defaultdict(list)
+
+        def get_project(label):
+            return self._dependency_graph.get_attribute(label, self.Attributes.PROJECT,
+                                                        self.UNKNOWN_PROJECT_NAME)
+
+        for label in self._dependency_graph.get_dependency_nodes():
+            projects[get_project(label)][self.ProjectMetrics.OWNED_HEADERS] += 1
+
+        successor_cache = {}
+        for top_level in self._dependency_graph.get_top_level_nodes():
+            project = get_project(top_level)
+            metrics = projects[project]
+            build_time = self._dependency_graph.get_attribute(top_level,
+                                                              self.Attributes.BUILD_TIME, 0.0)
+            metrics[self.ProjectMetrics.TRANSLATION_UNITS] += 1
+            metrics[self.ProjectMetrics.BUILD_TIME] += build_time
+            metrics[self.ProjectMetrics.COMPILED_SIZE] += self._dependency_graph.get_attribute(
+                top_level, self.Attributes.TOTAL_SIZE, 0)
+            build_times[project].append(build_time)
+
+            use_pch = self._dependency_graph.get_attribute(top_level, self.Attributes.USED_PCH)
+            closure = _reachable([top_level],
+                                 self._get_compiled_successors(use_pch, successor_cache))
+            for other in {get_project(label) for label in closure} - {project}:
+                projects[other][self.ProjectMetrics.IMPOSED_BUILD_TIME] += build_time
+
+        for project, times in build_times.items():
+            times.sort()
+            metrics = projects[project]
+            metrics[self.ProjectMetrics.AVG_BUILD_TIME] = sum(times) / len(times)
+            # nearest-rank percentile
+            metrics[self.ProjectMetrics.P95_BUILD_TIME] = times[
+                max(int(math.ceil(0.95 * len(times))) - 1, 0)]
+
+        return sorted(projects.items())
+
+    @instrumented(counters=_graph_size)
     def run_full_analysis(self):
         """Calculates all available metrics for the graph."""
+        cycles = self.get_include_cycles()
+        if cycles:
+            logging.warning('Found %d include cycles, the largest one: %s',
+                            len(cycles), ', '.join(cycles[0]))
         self.calculate_file_sizes()
         self.calculate_total_sizes()
         self.calculate_total_build_times()
         self.calculate_translation_units()
         self.calculate_agg_build_time_dev()
+        self.calculate_self_costs()
+        self.calculate_exclusive_costs()
         self.guess_project_names()
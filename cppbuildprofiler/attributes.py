@@ -0,0 +1,55 @@
+# Copyright (c) Techland. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+
+"""
+Contains names of dependency graph attributes and analysis options. Kept
+apart from the analysis module so they can be used without importing
+networkx (e.g. when building command line parsers).
+"""
+
+class Attributes: # pylint: disable=too-few-public-methods
+    """Contains names of depgraph attributes with analyser metrics"""
+    PROJECT = 'project'
+    ABSOLUTE_PATH = 'absolutepath'
+    COMPILATION_COMMAND = 'compilationcommand'
+    USED_PCH = 'usepch'
+    CREATED_PCH = 'createpch'
+    BUILD_TIME = 'buildtime'
+    FILE_SIZE = 'filesize'
+    TOTAL_SIZE = 'totalsize'
+    AGG_BUILD_TIME_DEV = 'avgbuildtimedev'
+    TRANSLATION_UNITS = 'translationunits'
+    SELF_COST = 'selfcost'
+    EXCLUSIVE_SIZE = 'exclusivesize'
+    EXCLUSIVE_BUILD_TIME = 'exclusivebuildtime'
+    REPEATED_INCLUSIONS = 'repeatedinclusions'
+    INCLUDE_CYCLES = 'includecycles'
+
+    def __init__(self):
+        pass
+
+class ProjectMetrics: # pylint: disable=too-few-public-methods
+    """Contains names of per-project metrics"""
+    TRANSLATION_UNITS = 'translationunits'
+    BUILD_TIME = 'buildtime'
+    AVG_BUILD_TIME = 'avgbuildtime'
+    P95_BUILD_TIME = 'p95buildtime'
+    COMPILED_SIZE = 'compiledsize'
+    OWNED_HEADERS = 'ownedheaders'
+    IMPOSED_BUILD_TIME = 'imposedbuildtime'
+
+    def __init__(self):
+        pass
+
+class Groupings: # pylint: disable=too-few-public-methods
+    """
+    Contains names of the ways files may be grouped when coarsening the graph
+    and the default number of path components of directory groups
+    """
+    PROJECT = 'project'
+    DIRECTORY = 'directory'
+    COMMUNITY = 'community'
+    DIRECTORY_DEPTH = 2
+
+    def __init__(self):
+        pass
@@ -8,12 +8,18 @@
 import sys
 import argparse
 import cmd
+import shlex
 import os
 import logging
 import traceback
 import functools
-import networkx as nx
-from cppbuildprofiler import *
+# Other modules are imported by the commands using them, so that the
+# interpreter starts (and prints help) without loading networkx.
+from cppbuildprofiler.attributes import Attributes, ProjectMetrics, Groupings
+from cppbuildprofiler import instrumentation, progress
+
+_OUTPUT_BUFFER_SIZE = 1 << 20
+_UNDO_HISTORY_SIZE = 16
 
 class Interpreter(cmd.Cmd):
     
@@ -22,32 +28,92 @@ class Interpreter(cmd.Cmd):
     """
 
     _ALL_METRICS = [
-        Analyser.Attributes.PROJECT,
-        Analyser.Attributes.ABSOLUTE_PATH,
-        Analyser.Attributes.TRANSLATION_UNITS,
-        Analyser.Attributes.FILE_SIZE,
-        Analyser.Attributes.TOTAL_SIZE,
-        Analyser.Attributes.BUILD_TIME,
-        Analyser.Attributes.AGG_BUILD_TIME_DEV,
+        Attributes.PROJECT,
+        Attributes.ABSOLUTE_PATH,
+        Attributes.TRANSLATION_UNITS,
+        Attributes.FILE_SIZE,
+        Attributes.TOTAL_SIZE,
+        Attributes.BUILD_TIME,
+        Attributes.AGG_BUILD_TIME_DEV,
+        Attributes.SELF_COST,
+        Attributes.EXCLUSIVE_SIZE,
+        Attributes.EXCLUSIVE_BUILD_TIME,
+        Attributes.REPEATED_INCLUSIONS,
+        Attributes.INCLUDE_CYCLES,
+        ProjectMetrics.AVG_BUILD_TIME,
+        ProjectMetrics.P95_BUILD_TIME,
+        ProjectMetrics.COMPILED_SIZE,
+        ProjectMetrics.OWNED_HEADERS,
+        ProjectMetrics.IMPOSED_BUILD_TIME,
         ]
 
     def __init__(self):
         super().__init__()
         self.prompt = 'c++bp$ '
         self.use_rawinput = True
+        self._depgraph = None
+        self._snapshots = {}
+        self._undo_history = []
+        self._instrumentation = None
+        self._instrumentation_path = None
 
     def _argv(self, param_string):
-        return filter(bool, param_string.split(' '))
+        # quotes group arguments, backslashes are kept for Windows paths
+        # and # doesn't start a comment
+        lexer = shlex.shlex(param_string, posix=True)
+        lexer.whitespace_split = True
+        lexer.escape = ''
+        lexer.commenters = ''
+        return list(lexer)
+
+    def _parse_args(self, parser, param_string):
+        try:
+            argv = self._argv(param_string)
+        except ValueError as e:
+            parser.error(str(e))
+        return parser.parse_args(argv)
+
+    def _open_output(self, path):
+        if path:
+            return open(path, 'w', newline='', buffering=_OUTPUT_BUFFER_SIZE)
+        else:
+            return os.fdopen(os.dup(sys.stdout.fileno()), 'w', newline='')
+
+    def _get_analyser(self):
+        # a new one per command, as commands may modify the graph (the query
+        # server shares one between its read-only commands)
+        from cppbuildprofiler.analysis import Analyser
+        return Analyser(self._depgraph)
+
+    def _get_recommender(self):
+        from cppbuildprofiler.recommendation import Recommender
+        return Recommender(self._depgraph)
+
+    def _save_undo_state(self):
+        # called by commands modifying or replacing the dependency graph,
+        # copies share the graph until it gets modified
+        if self._depgraph is not None:
+            self._undo_history.append(self._depgraph)
+            del self._undo_history[:-_UNDO_HISTORY_SIZE]
+            self._depgraph = self._depgraph.copy()
 
     def emptyline(self):
         pass
 
     def onecmd(self, line):
         try:
-            super().onecmd(line)
+            with instrumentation.stage(self.parseline(line)[0] or 'empty'):
+                super().onecmd(line)
         except Exception as e:
             logging.error(e, exc_info=0)
             logging.debug(traceback.format_exc())
+        if self._instrumentation is not None:
+            # rewritten after each command, so that the report is complete
+            # however the session ends
+            try:
+                self._instrumentation.write(self._instrumentation_path)
+            except OSError as e:
+                logging.error('Failed to write the instrumentation report: %s', e)
 
     def do_shell(self, line):
         out = os.popen(line).read()
@@ -68,7 +134,7 @@ class Interpreter(cmd.Cmd):
     def do_set_verbosity(self, params):
         parser = self._set_verbosity_argparser()
         try:
-            opts = parser.parse_args(self._argv(params))
+            opts = self._parse_args(parser, params)
             if opts.level == 'DEBUG':
                 logging.getLogger().setLevel(logging.DEBUG)
             elif opts.level == 'INFO':
@@ -90,9 +156,56 @@ class Interpreter(cmd.Cmd):
     def do_get_project_dependency_graph(self, params):
         parser = self._get_project_dependency_graph_argparser()
         try:
-            opts = parser.parse_args(self._argv(params))
+            opts = self._parse_args(parser, params)
+            from cppbuildprofiler.analysis import Analyser
+            from cppbuildprofiler.graphio import write_gml
             graph = Analyser(self._depgraph).get_project_dependency_graph()
-            nx.write_gml(graph, opts.path)
+            write_gml(graph, opts.path)
+        except SystemExit:
+            return
+
+    def _coarsen_argparser(self):
+        parser = argparse.ArgumentParser('collapses the dependency graph into groups of files '
+                                         'and writes the group graph to a file')
+        parser.add_argument(
+            'path',
+            action='store',
+            help='path to the file to write to')
+        parser.add_argument(
+            '--by',
+            choices=[Groupings.PROJECT,
+                     Groupings.DIRECTORY,
+                     Groupings.COMMUNITY],
+            default=Groupings.DIRECTORY,
+            help='how files are grouped')
+        parser.add_argument(
+            '--depth',
+            action='store',
+            type=int,
+            default=Groupings.DIRECTORY_DEPTH,
+            help='number of leading path components used by the directory grouping '
+                 '(defaults to %d)' % Groupings.DIRECTORY_DEPTH)
+        parser.add_argument(
+            '--format',
+            choices=['gml', 'graphml'],
+            default='gml',
+            help='output file format')
+        return parser
+
+    def help_coarsen(self):
+        self._coarsen_argparser().print_help()
+
+    def do_coarsen(self, params):
+        parser = self._coarsen_argparser()
+        try:
+            opts = self._parse_args(parser, params)
+            from cppbuildprofiler.analysis import Analyser
+            from cppbuildprofiler.graphio import write_gml, write_graphml
+            graph = Analyser(self._depgraph).get_coarsened_graph(opts.by, opts.depth)
+            if opts.format == 'gml':
+                write_gml(graph, opts.path)
+            else:
+                write_graphml(graph, opts.path)
         except SystemExit:
             return
 
@@ -111,7 +224,9 @@ class Interpreter(cmd.Cmd):
     def do_parse_vs_log(self, params):
         parser = self._parse_vs_log_argparser()
         try:
-            opts = parser.parse_args(self._argv(params))
+            opts = self._parse_args(parser, params)
+            from cppbuildprofiler.parser import parse_vs_log
+            self._save_undo_state()
             self._depgraph = parse_vs_log(opts.path)
             logging.info('Parsed %s and created a dependency graph with %d '
                          'nodes and %d edges',
@@ -135,7 +250,9 @@ class Interpreter(cmd.Cmd):
     def do_load(self, params):
         parser = self._load_argparser()
         try:
-            opts = parser.parse_args(self._argv(params))
+            opts = self._parse_args(parser, params)
+            from cppbuildprofiler.dependency import DependencyGraph
+            self._save_undo_state()
             self._depgraph = DependencyGraph.read(opts.path)
             logging.info('Loaded dependency graph from %s with %d nodes '
                          'and %d edges',
@@ -151,6 +268,19 @@ class Interpreter(cmd.Cmd):
             'path',
             action='store',
             help='path to the file to write to')
+        parser.add_argument(
+            '--format',
+            choices=['gml', 'graphml', 'sqlite', 'npz', 'parquet'],
+            default='gml',
+            help='output file format (only gml files can be loaded back, npz also '
+                 'writes the adjacency matrix to a PATH_adjacency.npz file, parquet '
+                 'requires pyarrow). gml and graphml files are compressed if PATH '
+                 'ends with .gz')
+        parser.add_argument(
+            '--attributes',
+            action='store',
+            nargs='+',
+            help='node attributes to store in gml and graphml files (defaults to all)')
         return parser
 
     def help_store(self):
@@ -159,8 +289,16 @@ class Interpreter(cmd.Cmd):
     def do_store(self, params):
         parser = self._store_argparser()
         try:
-            opts = parser.parse_args(self._argv(params))
-            self._depgraph.write(opts.path)
+            opts = self._parse_args(parser, params)
+            from cppbuildprofiler.export import write_npz, write_parquet, write_sqlite
+            if opts.format == 'sqlite':
+                write_sqlite(self._depgraph, opts.path)
+            elif opts.format == 'npz':
+                write_npz(self._depgraph, opts.path)
+            elif opts.format == 'parquet':
+                write_parquet(self._depgraph, opts.path)
+            else:
+                self._depgraph.write(opts.path, opts.attributes, opts.format)
             logging.info('Stored dependency graph from %s with %d nodes '
                          'and %d edges',
                          opts.path,
@@ -169,6 +307,346 @@ class Interpreter(cmd.Cmd):
         except SystemExit:
             return
 
+    def _report_argparser(self):
+        parser = argparse.ArgumentParser('writes a static HTML report of the analysed '
+                                         'dependency graph')
+        parser.add_argument(
+            'path',
+            action='store',
+            help='directory to write the report to')
+        parser.add_argument(
+            '--page-size',
+            action='store',
+            type=int,
+            default=100,
+            help='number of table rows per page')
+        parser.add_argument(
+            '--max-sorted-rows',
+            action='store',
+            type=int,
+            default=1000,
+            help='number of rows available when sorting by a non-default column')
+        parser.add_argument(
+            '--neighbourhoods',
+            action='store',
+            type=int,
+            default=50,
+            help='number of heaviest files per table to draw neighbourhood views for')
+        return parser
+
+    def help_report(self):
+        self._report_argparser().print_help()
+
+    def do_report(self, params):
+        parser = self._report_argparser()
+        try:
+            opts = self._parse_args(parser, params)
+            from cppbuildprofiler.report import HtmlReport
+            HtmlReport(self._depgraph,
+                       opts.page_size,
+                       opts.max_sorted_rows,
+                       opts.neighbourhoods).write(opts.path)
+        except SystemExit:
+            return
+
+    def _serve_argparser(self):
+        parser = argparse.ArgumentParser('answers read-only commands (print, why etc.) '
+                                         'for the dependency graph over HTTP with json '
+                                         'responses until interrupted')
+        parser.add_argument(
+            '--host',
+            action='store',
+            default='127.0.0.1',
+            help='address to listen on (defaults to 127.0.0.1), only loopback addresses '
+                 'are allowed without --allow-remote')
+        parser.add_argument(
+            '--allow-remote',
+            action='store_true',
+            help='allow listening on addresses other clients can connect to (queries are '
+                 'not authenticated)')
+        parser.add_argument(
+            '--port', '-p',
+            action='store',
+            type=int,
+            default=8000,
+            help='port to listen on (defaults to 8000)')
+        parser.add_argument(
+            '--socket',
+            action='store',
+            help='path of a Unix socket to listen on instead of the port')
+        parser.add_argument(
+            '--threads',
+            action='store',
+            type=int,
+            default=8,
+            help='number of threads handling requests')
+        return parser
+
+    def help_serve(self):
+        self._serve_argparser().print_help()
+
+    def do_serve(self, params):
+        parser = self._serve_argparser()
+        try:
+            opts = self._parse_args(parser, params)
+            if self._depgraph is None:
+                raise RuntimeError('No dependency graph loaded, run parse_vs_log or load first')
+            from cppbuildprofiler.server import QueryServer
+            server = QueryServer(self._depgraph, opts.host, opts.port, opts.socket,
+                                 opts.threads, opts.allow_remote)
+            logging.info('Serving dependency graph with %d nodes and %d edges on %s',
+                         self._depgraph.number_of_nodes(),
+                         self._depgraph.number_of_edges(),
+                         server.address)
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                server.shutdown()
+        except SystemExit:
+            return
+
+    def _instrument_argparser(self):
+        parser = argparse.ArgumentParser('measures the time and memory used by the following '
+                                         'commands and analysis steps and stores them in a '
+                                         'json report')
+        parser.add_argument(
+            'path',
+            action='store',
+            nargs='?',
+            help='path to the report file, rewritten after each command')
+        parser.add_argument(
+            '--trace-memory',
+            action='store_true',
+            help='also measure allocated memory with tracemalloc (slows commands down)')
+        parser.add_argument(
+            '--stop',
+            action='store_true',
+            help='stop measuring')
+        return parser
+
+    def help_instrument(self):
+        self._instrument_argparser().print_help()
+
+    def do_instrument(self, params):
+        parser = self._instrument_argparser()
+        try:
+            opts = self._parse_args(parser, params)
+            if opts.stop:
+                if self._instrumentation is None:
+                    raise RuntimeError('Instrumentation not started')
+                recorder = self._instrumentation
+                self._instrumentation = None
+                recorder.stop()
+                recorder.write(self._instrumentation_path)
+                logging.info('Stored instrumentation report in %s', self._instrumentation_path)
+                return
+            if opts.path is None:
+                raise RuntimeError('Specify the path to the report file')
+            if self._instrumentation is not None:
+                raise RuntimeError('Instrumentation already started')
+            recorder = instrumentation.Instrumentation(opts.trace_memory)
+            # fails early if the report can't be written
+            recorder.write(opts.path)
+            recorder.start()
+            self._instrumentation = recorder
+            self._instrumentation_path = opts.path
+        except SystemExit:
+            return
+
+    def _snapshot_argparser(self):
+        parser = argparse.ArgumentParser('saves the dependency graph under a name, restores '
+                                         'it or lists the saved snapshots')
+        parser.add_argument(
+            'action',
+            choices=['save', 'restore', 'delete', 'list'],
+            help='what to do')
+        parser.add_argument(
+            'name',
+            action='store',
+            nargs='?',
+            help='name of the snapshot (not used by list)')
+        return parser
+
+    def help_snapshot(self):
+        self._snapshot_argparser().print_help()
+
+    def do_snapshot(self, params):
+        parser = self._snapshot_argparser()
+        try:
+            opts = self._parse_args(parser, params)
+            if opts.action == 'list':
+                for name in sorted(self._snapshots):
+                    snapshot = self._snapshots[name]
+                    print('%s: %d nodes, %d edges' % (name,
+                                                      snapshot.number_of_nodes(),
+                                                      snapshot.number_of_edges()),
+                          file=self.stdout)
+                return
+            if opts.name is None:
+                raise RuntimeError('Specify the name of the snapshot to %s' % opts.action)
+            if opts.action == 'save':
+                if self._depgraph is None:
+                    raise RuntimeError('No dependency graph loaded, run parse_vs_log or load first')
+                self._snapshots[opts.name] = self._depgraph.copy()
+                logging.info('Saved snapshot %s', opts.name)
+                return
+            if opts.name not in self._snapshots:
+                raise RuntimeError('Snapshot "%s" not found' % opts.name)
+            if opts.action == 'restore':
+                self._save_undo_state()
+                self._depgraph = self._snapshots[opts.name].copy()
+                logging.info('Restored snapshot %s with %d nodes and %d edges',
+                             opts.name,
+                             self._depgraph.number_of_nodes(),
+                             self._depgraph.number_of_edges())
+            else:
+                del self._snapshots[opts.name]
+                logging.info('Deleted snapshot %s', opts.name)
+        except SystemExit:
+            return
+
+    def _undo_argparser(self):
+        parser = argparse.ArgumentParser('reverts the dependency graph to its state before '
+                                         'the last command that modified it')
+        return parser
+
+    def help_undo(self):
+        self._undo_argparser().print_help()
+
+    def do_undo(self, params):
+        parser = self._undo_argparser()
+        try:
+            opts = self._parse_args(parser, params)
+            if not self._undo_history:
+                raise RuntimeError('Nothing to undo')
+            self._depgraph = self._undo_history.pop()
+            logging.info('Reverted to dependency graph with %d nodes and %d edges',
+                         self._depgraph.number_of_nodes(),
+                         self._depgraph.number_of_edges())
+        except SystemExit:
+            return
+
+    def _history_argparser(self):
+        parser = argparse.ArgumentParser('keeps the dependency graphs and metrics of builds '
+                                         'in a history database and queries it')
+        parser.add_argument(
+            'action',
+            choices=['add', 'load', 'builds', 'metric', 'diff'],
+            help='add: adds the dependency graph as the latest build, load: replaces the '
+                 'dependency graph with a build, builds: lists the builds, metric: prints '
+                 'the history of a metric of a file, diff: prints dependencies added and '
+                 'removed between builds')
+        parser.add_argument(
+            'database',
+            action='store',
+            help='path to the history database (created if missing)')
+        parser.add_argument(
+            '--build', '-b',
+            action='store',
+            help='name of the build to add (defaults to the current time) or load, the build '
+                 'to look the --label up in, or the newer build to diff (defaults to the '
+                 'latest build)')
+        parser.add_argument(
+            '--since', '-s',
+            action='store',
+            help='the older build to diff (defaults to the build before --build)')
+        parser.add_argument(
+            '--path', '-p',
+            action='store',
+            help='absolute path of the file whose metric to print')
+        parser.add_argument(
+            '--label', '-l',
+            action='store',
+            help='label of the file whose metric to print in --build (defaults to the latest '
+                 'build), the metric is followed by path across builds')
+        parser.add_argument(
+            '--metric', '-m',
+            action='store',
+            default=Attributes.BUILD_TIME,
+            help='metric to print (defaults to %s)' % Attributes.BUILD_TIME)
+        parser.add_argument(
+            '--last', '-n',
+            action='store',
+            type=int,
+            help='only print the metric in the last N builds')
+        parser.add_argument('--out', '-o',
+                            action='store',
+                            help='file to print out to',
+                            required=False)
+        parser.add_argument('--column-separator',
+                            action='store',
+                            help='column separator (defaults to ";")',
+                            default=';')
+        return parser
+
+    def help_history(self):
+        self._history_argparser().print_help()
+
+    def do_history(self, params):
+        parser = self._history_argparser()
+        try:
+            opts = self._parse_args(parser, params)
+            from cppbuildprofiler.history import HistoryStore
+            separator = opts.column_separator.replace('\\t', '\t')
+            with HistoryStore(opts.database) as history:
+                if opts.action == 'add':
+                    nodes, edges = history.add_build(self._depgraph, opts.build)
+                    logging.info('Added build to %s, %d nodes added or changed and %d '
+                                 'dependencies added since the previous build',
+                                 opts.database, nodes, edges)
+                elif opts.action == 'load':
+                    if opts.build is None:
+                        raise RuntimeError('Specify the --build to load')
+                    depgraph = history.get_graph(opts.build)
+                    self._save_undo_state()
+                    self._depgraph = depgraph
+                    logging.info('Loaded build %s with %d nodes and %d edges',
+                                 opts.build,
+                                 self._depgraph.number_of_nodes(),
+                                 self._depgraph.number_of_edges())
+                elif opts.action == 'builds':
+                    with self._open_output(opts.out) as stream:
+                        stream.write(separator.join(['build', 'timestamp', 'nodes',
+                                                     'dependencies']) + '\n')
+                        for build in history.get_builds():
+                            stream.write(separator.join(str(value) for value in build) + '\n')
+                elif opts.action == 'metric':
+                    if opts.path is not None:
+                        path = opts.path
+                    elif opts.label is not None:
+                        path = history.find_path(opts.label, opts.build)
+                    else:
+                        raise RuntimeError('Specify the --path or --label of the file')
+                    values = history.get_metric_history(path, opts.metric, opts.last)
+                    with self._open_output(opts.out) as stream:
+                        stream.write(separator.join(['build', 'timestamp', opts.metric]) + '\n')
+                        for build, timestamp, value in values:
+                            stream.write(separator.join([build, timestamp,
+                                                         '' if value is None else str(value)])
+                                         + '\n')
+                else:
+                    builds = [build[0] for build in history.get_builds()]
+                    new = opts.build or (builds[-1] if builds else None)
+                    if new not in builds:
+                        raise RuntimeError('Build "%s" not found in the history' % new)
+                    since = opts.since
+                    if since is None:
+                        if builds.index(new) == 0:
+                            raise RuntimeError('No build before %s' % new)
+                        since = builds[builds.index(new) - 1]
+                    added, removed = history.get_dependency_changes(since, new)
+                    with self._open_output(opts.out) as stream:
+                        stream.write(separator.join(['change', 'parent', 'dependency']) + '\n')
+                        for change, dependencies in [('added', added), ('removed', removed)]:
+                            for parent, child in dependencies:
+                                stream.write(separator.join([change, parent, child]) + '\n')
+                    logging.info('%d dependencies added and %d removed since %s',
+                                 len(added), len(removed), since)
+        except SystemExit:
+            return
+
     def _analyse_argparser(self):
         parser = argparse.ArgumentParser('runs the dependency graph analysis')
         return parser
@@ -179,7 +657,9 @@ class Interpreter(cmd.Cmd):
     def do_analyse(self, params):
         parser = self._analyse_argparser()
         try:
-            opts = parser.parse_args(self._argv(params))
+            opts = self._parse_args(parser, params)
+            from cppbuildprofiler.analysis import Analyser
+            self._save_undo_state()
             Analyser(self._depgraph).run_full_analysis()
         except SystemExit:
             return
@@ -198,19 +678,21 @@ class Interpreter(cmd.Cmd):
 
     def _is_thirdparty_dependency(self, codebase_root, parent, _):
         parent_path = self._depgraph.get_attribute(parent,
-                                                   Analyser.Attributes.ABSOLUTE_PATH,
+                                                   Attributes.ABSOLUTE_PATH,
                                                    codebase_root)
         return os.path.commonprefix([parent_path, codebase_root]) != codebase_root
 
     def do_remove_thirdparty_dependencies(self, params):
         try:
             parser = self._remove_thirdparty_dependencies_argparser()
-            opts = parser.parse_args(self._argv(params))
+            opts = self._parse_args(parser, params)
+            from cppbuildprofiler.dependency import unify_path
             codebase_root = unify_path(opts.codebase_root.strip('"\''))
 
             orig_nodes = self._depgraph.number_of_nodes()
             orig_edges = self._depgraph.number_of_edges()
 
+            self._save_undo_state()
             self._depgraph.remove_dependency_by_predicate(
                 functools.partial(self._is_thirdparty_dependency, codebase_root))
             self._depgraph.remove_orphans()
@@ -234,6 +716,31 @@ class Interpreter(cmd.Cmd):
                             help='include nodes origin depends on')
         parser.add_argument('--dependants', action='store_true',
                             help='include nodes that depend on origin')
+        parser.add_argument('--max-depth', action='store', type=int,
+                            help='maximum distance of nodes from origin')
+        parser.add_argument('--min-build-time', action='store', type=float,
+                            help='skip nodes with a smaller build time metric')
+        parser.add_argument('--metric', '-m', action='store',
+                            choices=[Attributes.BUILD_TIME,
+                                     Attributes.SELF_COST,
+                                     Attributes.FILE_SIZE,
+                                     Attributes.TOTAL_SIZE,
+                                     Attributes.TRANSLATION_UNITS,
+                                     Attributes.AGG_BUILD_TIME_DEV,
+                                     Attributes.EXCLUSIVE_SIZE,
+                                     Attributes.EXCLUSIVE_BUILD_TIME,
+                                     Attributes.REPEATED_INCLUSIONS,
+                                     Attributes.INCLUDE_CYCLES],
+                            default=Attributes.BUILD_TIME,
+                            help='metric ranking nodes for --top-k and --max-nodes '
+                                 '(defaults to %s)' % Attributes.BUILD_TIME)
+        parser.add_argument('--top-k', action='store', type=int, metavar='K',
+                            help='only follow K dependencies (dependants) of each node '
+                                 'with the highest METRIC')
+        parser.add_argument('--max-nodes', action='store', type=int,
+                            help='stop after N nodes, expanding the nodes with the highest '
+                                 'METRIC first (a node is only reached through the ones '
+                                 'kept, so these are not the N highest overall)')
         return parser
 
     def help_subgraph(self):
@@ -242,12 +749,22 @@ class Interpreter(cmd.Cmd):
     def do_subgraph(self, params):
         parser = self._subgraph_argparser()
         try:
-            opts = parser.parse_args(self._argv(params))
+            opts = self._parse_args(parser, params)
             pre_nodes = self._depgraph.number_of_nodes()
             pre_edges = self._depgraph.number_of_edges()
+            predicate = None
+            if opts.min_build_time is not None:
+                predicate = lambda label: self._depgraph.get_attribute(
+                    label, Attributes.BUILD_TIME, 0.0) >= opts.min_build_time
+            self._save_undo_state()
             self._depgraph = self._depgraph.get_subgraph(opts.origin,
                                                          opts.dependencies,
-                                                         opts.dependants)
+                                                         opts.dependants,
+                                                         opts.max_depth,
+                                                         opts.max_nodes,
+                                                         predicate,
+                                                         opts.metric,
+                                                         opts.top_k)
             logging.info('Created subgraph of %s with %d nodes and %d edges '
                          '(%d nodes and %d edges removed)',
                          opts.origin,
@@ -266,7 +783,7 @@ class Interpreter(cmd.Cmd):
                             required=False)
         parser.add_argument('--nodes', '-n',
                             help='nodes to print',
-                            choices=['root', 'top-level', 'dependency'],
+                            choices=['root', 'top-level', 'dependency', 'project'],
                             required=True)
         parser.add_argument('--metrics', '-m',
                             action='store',
@@ -283,6 +800,25 @@ class Interpreter(cmd.Cmd):
                             action='store',
                             help='column separator (defaults to ";")',
                             default=';')
+        parser.add_argument('--sort', '-s',
+                            action='store',
+                            help='metric (or "label") to sort by, descending')
+        parser.add_argument('--ascending',
+                            action='store_true',
+                            help='sort in ascending order')
+        parser.add_argument('--top', '-t',
+                            action='store',
+                            type=int,
+                            help='print only the first N rows')
+        parser.add_argument('--where', '-w',
+                            action='store',
+                            help='filter expression, e.g. '
+                                 '"project == core and buildtime > 100" '
+                                 '(supports ==, !=, <, <=, >, >=, =~, and, or, not, '
+                                 'parentheses)')
+        parser.add_argument('--label-regex', '-r',
+                            action='store',
+                            help='print only nodes with labels matching the regex')
         return parser
 
     def help_print(self):
@@ -291,7 +827,10 @@ class Interpreter(cmd.Cmd):
     def do_print(self, params):
         parser = self._print_argparser()
         try:
-            opts = parser.parse_args(self._argv(params))
+            opts = self._parse_args(parser, params)
+            from cppbuildprofiler.analysis import Analyser
+            from cppbuildprofiler.dependency import DependencyGraph
+            from cppbuildprofiler.query import Query
 
             if opts.metrics is not None:
                 metrics = opts.metrics
@@ -299,6 +838,7 @@ class Interpreter(cmd.Cmd):
                 raise RuntimeError('Specify --all-metrics to print all metrics '
                                    'or a list of metrics after --metrics')
 
+            rows = None
             if opts.nodes == 'root':
                 available_columns = Analyser.ROOT_COLUMNS
                 labels = [DependencyGraph.ROOT_NODE_LABEL]
@@ -308,23 +848,372 @@ class Interpreter(cmd.Cmd):
             elif opts.nodes == 'dependency':
                 available_columns = Analyser.INTERNAL_COLUMNS
                 labels = self._depgraph.get_dependency_nodes()
+            elif opts.nodes == 'project':
+                available_columns = Analyser.PROJECT_COLUMNS
+                rows = self._get_analyser().get_project_metrics()
             else:
                 assert(False), 'Unexpected nodes value: %s' % opts.nodes
 
             columns = {metric : available_columns[metric]
                        for metric in metrics if metric in available_columns}
 
-            if opts.out:
-                stream = open(opts.out, 'w')
-            else:
-                stream = os.fdopen(os.dup(sys.stdout.fileno()), 'w')
+            if rows is None:
+                rows = self._depgraph.get_rows(labels)
+            if (opts.where or opts.label_regex or opts.sort or
+                    opts.top is not None):
+                query = Query(opts.where, opts.label_regex, opts.sort, opts.top,
+                              opts.ascending,
+                              {metric: column.default_value
+                               for metric, column in available_columns.items()})
+                rows = query.select(rows)
 
-            with stream:
-                self._depgraph.print_csv(
+            with self._open_output(opts.out) as stream:
+                DependencyGraph.print_table(
                     stream,
                     columns,
                     opts.column_separator,
-                    labels)
+                    rows)
+        except SystemExit:
+            return
+
+    def _whatif_argparser(self):
+        parser = argparse.ArgumentParser('projects the effect of removing or '
+                                         'adding dependencies without modifying '
+                                         'the dependency graph')
+        parser.add_argument('--remove', '-r',
+                            nargs=2,
+                            action='append',
+                            metavar=('PARENT', 'CHILD'),
+                            default=[],
+                            help='dependency to remove')
+        parser.add_argument('--add', '-a',
+                            nargs=2,
+                            action='append',
+                            metavar=('PARENT', 'CHILD'),
+                            default=[],
+                            help='dependency to add')
+        parser.add_argument('--out', '-o',
+                            action='store',
+                            help='file to print the affected translation units to',
+                            required=False)
+        parser.add_argument('--column-separator',
+                            action='store',
+                            help='column separator (defaults to ";")',
+                            default=';')
+        return parser
+
+    def help_whatif(self):
+        self._whatif_argparser().print_help()
+
+    def do_whatif(self, params):
+        parser = self._whatif_argparser()
+        try:
+            opts = self._parse_args(parser, params)
+            overlay = self._depgraph.get_overlay()
+            for parent, child in opts.remove:
+                overlay.remove_dependency(parent, child)
+            for parent, child in opts.add:
+                overlay.add_dependency(parent, child)
+
+            changes = self._get_analyser().get_dependency_change_impact(overlay)
+
+            separator = opts.column_separator.replace('\\t', '\t')
+            with self._open_output(opts.out) as stream:
+                stream.write(separator.join(['label',
+                                             'removed dependencies',
+                                             'added dependencies',
+                                             'total size delta [B]',
+                                             'build time delta [s]']) + '\n')
+                for change in changes:
+                    stream.write(separator.join([change.label,
+                                                 ' '.join(change.removed),
+                                                 ' '.join(change.added),
+                                                 str(change.total_size_delta),
+                                                 str(change.build_time_delta)]) + '\n')
+
+            logging.info('%d translation units affected, projected total size delta: '
+                         '%d B, build time delta: %f s',
+                         len(changes),
+                         sum(change.total_size_delta for change in changes),
+                         sum(change.build_time_delta for change in changes))
+        except SystemExit:
+            return
+
+    def _redundant_dependencies_argparser(self):
+        parser = argparse.ArgumentParser('lists dependencies already included '
+                                         'through other dependencies of the '
+                                         'same file')
+        parser.add_argument('--out', '-o',
+                            action='store',
+                            help='file to print out to',
+                            required=False)
+        parser.add_argument('--column-separator',
+                            action='store',
+                            help='column separator (defaults to ";")',
+                            default=';')
+        return parser
+
+    def help_redundant_dependencies(self):
+        self._redundant_dependencies_argparser().print_help()
+
+    def do_redundant_dependencies(self, params):
+        parser = self._redundant_dependencies_argparser()
+        try:
+            opts = self._parse_args(parser, params)
+            redundant = self._get_analyser().get_redundant_dependencies()
+
+            separator = opts.column_separator.replace('\\t', '\t')
+            with self._open_output(opts.out) as stream:
+                stream.write(separator.join(['parent',
+                                             'dependency',
+                                             'included through',
+                                             'number of dependent translation units']) + '\n')
+                for dependency in redundant:
+                    stream.write(separator.join([dependency.parent,
+                                                 dependency.child,
+                                                 dependency.through,
+                                                 str(dependency.translation_units)]) + '\n')
+            logging.info('Found %d redundant dependencies', len(redundant))
+        except SystemExit:
+            return
+
+    def _include_cycles_argparser(self):
+        parser = argparse.ArgumentParser('lists include cycles in the '
+                                         'dependency graph')
+        parser.add_argument('--out', '-o',
+                            action='store',
+                            help='file to print out to',
+                            required=False)
+        return parser
+
+    def help_include_cycles(self):
+        self._include_cycles_argparser().print_help()
+
+    def do_include_cycles(self, params):
+        parser = self._include_cycles_argparser()
+        try:
+            opts = self._parse_args(parser, params)
+            cycles = self._get_analyser().get_include_cycles()
+            with self._open_output(opts.out) as stream:
+                for cycle in cycles:
+                    stream.write('%s\n' % ' '.join(cycle))
+            logging.info('Found %d include cycles', len(cycles))
+        except SystemExit:
+            return
+
+    def _flamegraph_argparser(self):
+        parser = argparse.ArgumentParser('exports aggregated include trees as a '
+                                         'flame graph')
+        parser.add_argument('path',
+                            action='store',
+                            help='path to the file to write to')
+        parser.add_argument('--format', '-f',
+                            choices=['folded', 'speedscope'],
+                            default='folded',
+                            help='output format: folded stacks for flamegraph.pl or '
+                                 'speedscope json (defaults to folded)')
+        parser.add_argument('--weight', '-w',
+                            choices=[Attributes.FILE_SIZE,
+                                     Attributes.SELF_COST],
+                            default=Attributes.FILE_SIZE,
+                            help='metric used as frame weight (defaults to file size)')
+        parser.add_argument('--project', '-p',
+                            action='store',
+                            help='only export translation units of this project')
+        parser.add_argument('--keep-translation-units',
+                            action='store_true',
+                            help="don't merge stacks of translation units from the "
+                                 "same project")
+        return parser
+
+    def help_flamegraph(self):
+        self._flamegraph_argparser().print_help()
+
+    def do_flamegraph(self, params):
+        parser = self._flamegraph_argparser()
+        try:
+            opts = self._parse_args(parser, params)
+            from cppbuildprofiler.flamegraph import FlameGraph
+            flame_graph = FlameGraph(self._depgraph, opts.weight, not opts.keep_translation_units)
+            flame_graph.add_translation_units(opts.project)
+            with open(opts.path, 'w') as stream:
+                if opts.format == 'folded':
+                    # sample counts must be integers, self costs are stored in
+                    # seconds and written in microseconds
+                    scale = 1e6 if opts.weight == Attributes.SELF_COST else 1
+                    flame_graph.write_folded(stream, scale)
+                else:
+                    unit = 'seconds' if opts.weight == Attributes.SELF_COST else 'bytes'
+                    flame_graph.write_speedscope(stream, opts.project or 'includes', unit)
+        except SystemExit:
+            return
+
+    def _why_argparser(self):
+        parser = argparse.ArgumentParser('prints the shortest include chains '
+                                         'through which a file gets included')
+        parser.add_argument('target',
+                            action='store',
+                            help='label of the included file')
+        parser.add_argument('--origin', '-o',
+                            action='store',
+                            help='label of the including file (defaults to all '
+                                 'top-level files)')
+        parser.add_argument('--project', '-p',
+                            action='store',
+                            help='only print chains from top-level files of this '
+                                 'project (can\'t be used with --origin)')
+        parser.add_argument('--count', '-k',
+                            action='store',
+                            type=int,
+                            default=1,
+                            help='number of shortest chains to print (requires '
+                                 '--origin)')
+        parser.add_argument('--out',
+                            action='store',
+                            help='file to print out to',
+                            required=False)
+        return parser
+
+    def help_why(self):
+        self._why_argparser().print_help()
+
+    def do_why(self, params):
+        parser = self._why_argparser()
+        try:
+            opts = self._parse_args(parser, params)
+            if opts.origin:
+                if opts.project is not None:
+                    raise RuntimeError('--project can\'t be used with --origin')
+                paths = self._depgraph.get_shortest_dependency_paths(opts.origin,
+                                                                     opts.target,
+                                                                     opts.count)
+            else:
+                if opts.count != 1:
+                    raise RuntimeError('--count requires --origin')
+                origins = [label for label in self._depgraph.get_top_level_nodes()
+                           if opts.project is None or self._depgraph.get_attribute(
+                               label, Attributes.PROJECT) == opts.project]
+                paths = self._depgraph.get_shortest_dependant_paths(opts.target, origins)
+                paths = [paths[origin] for origin in sorted(paths)]
+
+            with self._open_output(opts.out) as stream:
+                for path in paths:
+                    stream.write('%s\n' % ' -> '.join(path))
+            logging.info('Found %d include chains', len(paths))
+        except SystemExit:
+            return
+
+    def _recommend_pch_argparser(self):
+        parser = argparse.ArgumentParser('recommends precompiled header contents '
+                                         'for each project')
+        parser.add_argument('--size-budget', '-s',
+                            action='store',
+                            type=int,
+                            required=True,
+                            help='maximum size of the precompiled files in bytes')
+        parser.add_argument('--max-headers',
+                            action='store',
+                            type=int,
+                            help='maximum number of headers to include in the pch')
+        parser.add_argument('--include-own-headers',
+                            action='store_true',
+                            help='allow precompiling headers of the project itself')
+        parser.add_argument('--project', '-p',
+                            action='append',
+                            help='project to recommend the pch for (defaults to all)')
+        parser.add_argument('--out', '-o',
+                            action='store',
+                            help='file to print out to',
+                            required=False)
+        parser.add_argument('--column-separator',
+                            action='store',
+                            help='column separator (defaults to ";")',
+                            default=';')
+        return parser
+
+    def help_recommend_pch(self):
+        self._recommend_pch_argparser().print_help()
+
+    def do_recommend_pch(self, params):
+        parser = self._recommend_pch_argparser()
+        try:
+            opts = self._parse_args(parser, params)
+            recommendations = self._get_recommender().recommend_pch_contents(
+                opts.size_budget, opts.max_headers, opts.include_own_headers, opts.project)
+
+            separator = opts.column_separator.replace('\\t', '\t')
+            with self._open_output(opts.out) as stream:
+                stream.write(separator.join(['project',
+                                             'translation units',
+                                             'headers',
+                                             'pch size [B]',
+                                             'projected saved build time [s]']) + '\n')
+                for recommendation in recommendations:
+                    stream.write(separator.join([recommendation.project,
+                                                 str(recommendation.translation_units),
+                                                 ' '.join(recommendation.headers),
+                                                 str(recommendation.size),
+                                                 str(recommendation.saved_build_time)]) + '\n')
+        except SystemExit:
+            return
+
+    def _recommend_unity_argparser(self):
+        parser = argparse.ArgumentParser('groups the translation units of each '
+                                         'project into unity build batches')
+        parser.add_argument('--max-batch-size', '-s',
+                            action='store',
+                            type=int,
+                            required=True,
+                            help='maximum number of translation units in a batch')
+        parser.add_argument('--max-batch-build-time', '-t',
+                            action='store',
+                            type=float,
+                            help='maximum summed build time of a batch in seconds')
+        parser.add_argument('--project', '-p',
+                            action='append',
+                            help='project to batch (defaults to all)')
+        parser.add_argument('--out', '-o',
+                            action='store',
+                            help='file to print the batch assignment to',
+                            required=False)
+        parser.add_argument('--column-separator',
+                            action='store',
+                            help='column separator (defaults to ";")',
+                            default=';')
+        return parser
+
+    def help_recommend_unity(self):
+        self._recommend_unity_argparser().print_help()
+
+    def do_recommend_unity(self, params):
+        parser = self._recommend_unity_argparser()
+        try:
+            opts = self._parse_args(parser, params)
+            batches = self._get_recommender().recommend_unity_batches(
+                opts.max_batch_size, opts.max_batch_build_time, projects=opts.project)
+
+            separator = opts.column_separator.replace('\\t', '\t')
+            with self._open_output(opts.out) as stream:
+                stream.write(separator.join(['project',
+                                             'batch',
+                                             'label',
+                                             'batch total size [B]',
+                                             'batch size reduction [B]',
+                                             'batch saved build time [s]']) + '\n')
+                for batch in batches:
+                    for label in batch.translation_units:
+                        stream.write(separator.join([batch.project,
+                                                     str(batch.index),
+                                                     label,
+                                                     str(batch.total_size),
+                                                     str(batch.size_reduction),
+                                                     str(batch.saved_build_time)]) + '\n')
+
+            logging.info('Created %d batches, projected total size reduction: %d B, '
+                         'saved build time: %f s',
+                         len(batches),
+                         sum(batch.size_reduction for batch in batches),
+                         sum(batch.saved_build_time for batch in batches))
         except SystemExit:
             return
 
@@ -337,6 +1226,13 @@ def main(args=None):
     if args is None:
         args = sys.argv[1:]
 
+    show_progress = sys.stderr.isatty()
+    if args and args[0] == '--no-progress':
+        show_progress = False
+        args = args[1:]
+    if show_progress:
+        progress.add_terminal_renderer()
+
     cl = Interpreter()
 
     argline = ' '.join(args).strip('\'" \\t')
@@ -7,10 +7,14 @@ files and their analysis metric values.
 """
 
 import os
+import csv
 import logging
 import itertools
-from collections import namedtuple
+import heapq
+import math
+from collections import namedtuple, defaultdict
 import networkx as nx
+from cppbuildprofiler.graphio import write_gml, write_graphml
 
 def unify_path(path):
     """
@@ -34,12 +38,45 @@ class DependencyGraph:
 
     Column = namedtuple('Column', ['title', 'default_value'])
 
+    _BATCH_SIZE = 4096
+
     def __init__(self, graph=None):
+        # number of DependencyGraphs sharing the graph or its attribute dicts
+        self._references = [1]
         if graph is None:
             graph = nx.DiGraph()
         self._graph = graph
         self._graph.add_node(self.ROOT_NODE_LABEL)
 
+    def __del__(self):
+        self._references[0] -= 1
+
+    def _share(self, graph):
+        shared = DependencyGraph(graph)
+        self._references[0] += 1
+        shared._references = self._references
+        return shared
+
+    def _detach(self):
+        # called before every modification, copies the structure of a shared
+        # graph (attribute values are immutable, so they are not copied)
+        if self._references[0] > 1:
+            self._references[0] -= 1
+            self._references = [1]
+            graph = self._graph.__class__()
+            graph.graph.update(self._graph.graph)
+            graph.add_nodes_from(self._graph.nodes_iter(data=True))
+            graph.add_edges_from(self._graph.edges_iter(data=True))
+            self._graph = graph
+
+    def copy(self):
+        """
+        Returns a copy of the dependency graph. The copy shares the graph
+        with the original until either of them gets modified, so copies are
+        cheap to make and keep.
+        """
+        return self._share(self._graph)
+
     @classmethod
     def read(cls, path):
         """
@@ -48,9 +85,18 @@ class DependencyGraph:
         """
         return DependencyGraph(nx.read_gml(path))
         
-    def write(self, path):
-        """Writes the dependency graph to a .gml file."""
-        nx.write_gml(self._graph, path)
+    def write(self, path, attributes=None, graph_format='gml'):
+        """
+        Writes the dependency graph to a .gml (or .graphml if graph_format is
+        "graphml") file. If attributes is provided, only the listed node
+        attributes are written. Paths ending with .gz get compressed.
+        """
+        if graph_format == 'gml':
+            write_gml(self._graph, path, attributes)
+        elif graph_format == 'graphml':
+            write_graphml(self._graph, path, attributes)
+        else:
+            raise RuntimeError('Unknown graph format: %s' % graph_format)
 
     def number_of_nodes(self):
         """Returns the number of nodes in the dependency graph"""
@@ -67,6 +113,7 @@ class DependencyGraph:
         """
         if self._graph.has_node(label):
             raise RuntimeError('Duplicated node for label "%s"' % label)
+        self._detach()
         self._graph.add_node(label, **kwargs)
         self._graph.add_edge(self.ROOT_NODE_LABEL, label)
 
@@ -78,6 +125,7 @@ class DependencyGraph:
         if not self._graph.has_node(parent):
             raise RuntimeError('Dependency node parent "%s" not found for label "%s"' %
                                (parent, label))
+        self._detach()
         self._graph.add_node(label, **kwargs)
         self._graph.add_edge(parent, label)
 
@@ -85,6 +133,10 @@ class DependencyGraph:
         """Returns true iff parent depends on successor (directly or indirectly)"""
         return self._graph.has_node(successor) and nx.has_path(self._graph, parent, successor)
 
+    def get_nodes(self):
+        """Returns an iterator over all nodes, except for the root."""
+        return (label for label in self._graph.nodes_iter() if label != self.ROOT_NODE_LABEL)
+
     def get_top_level_nodes(self):
         """Returns an iterator over all the top-level nodes."""
         return self._graph.successors_iter(self.ROOT_NODE_LABEL)
@@ -98,29 +150,219 @@ class DependencyGraph:
         """Returns an iterator over the nodes immediate dependencies."""
         return self._graph.successors_iter(label)
 
-    def get_subgraph(self, label, add_dependencies, add_dependants):
+    def get_node_immediate_dependants(self, label):
+        """Returns an iterator over the nodes immediately depending on the node."""
+        return self._graph.predecessors_iter(label)
+
+    def has_immediate_dependency(self, parent, child):
+        """Returns True iff there is a parent -> child dependency edge."""
+        return self._graph.has_edge(parent, child)
+
+    def get_overlay(self):
         """
-        Returns a dependency graph containing the node denoted by the provided
-        label. If add_dependants is false, the graph root node is reattached
-        to the origin node which becomes the sole top-level node.
+        Returns a DependencyGraphOverlay that may be used to add or remove
+        dependencies hypothetically, without modifying this graph.
+        """
+        return DependencyGraphOverlay(self)
+
+    def get_condensation(self):
+        """
+        Returns the strongly connected components of the graph (without the
+        root) as a list of frozensets of labels, sorted so that each component
+        comes before the components it depends on, and a dictionary mapping
+        labels to their component's index in that list. Components of more
+        than one node are include cycles.
         """
+        graph = self._graph.subgraph(label for label in self._graph.nodes_iter()
+                                     if label != self.ROOT_NODE_LABEL)
+        condensation = nx.condensation(graph)
+        order = nx.topological_sort(condensation)
+        index = {component: i for i, component in enumerate(order)}
+        components = [frozenset(condensation.node[component]['members'])
+                      for component in order]
+        mapping = {label: index[component]
+                   for label, component in condensation.graph['mapping'].items()}
+        return components, mapping
+
+    def _check_node(self, label):
         if not self._graph.has_node(label):
             raise RuntimeError('Node "%s" not found' % label)
 
-        nodes = itertools.chain([label])
+    def get_shortest_dependency_path(self, origin, target):
+        """
+        Returns the shortest include chain from origin to target as a list of
+        labels, or None if origin doesn't depend on target. Uses a
+        bidirectional breadth-first search, expanding the smaller frontier -
+        forward through dependencies and backward through dependants.
+        """
+        self._check_node(origin)
+        self._check_node(target)
+        if origin == target:
+            return [origin]
+
+        parents = {origin: None}
+        children = {target: None}
+        forward = [origin]
+        backward = [target]
+        while forward and backward:
+            if len(forward) <= len(backward):
+                fringe, forward = forward, []
+                for label in fringe:
+                    for child in self._graph.successors_iter(label):
+                        if child not in parents:
+                            parents[child] = label
+                            if child in children:
+                                return self._join_path(child, parents, children)
+                            forward.append(child)
+            else:
+                fringe, backward = backward, []
+                for label in fringe:
+                    for parent in self._graph.predecessors_iter(label):
+                        if parent not in children:
+                            children[parent] = label
+                            if parent in parents:
+                                return self._join_path(parent, parents, children)
+                            backward.append(parent)
+        return None
+
+    @classmethod
+    def _join_path(cls, meeting_point, parents, children):
+        path = []
+        label = meeting_point
+        while label is not None:
+            path.append(label)
+            label = parents[label]
+        path.reverse()
+        label = children[meeting_point]
+        while label is not None:
+            path.append(label)
+            label = children[label]
+        return path
+
+    def get_shortest_dependency_paths(self, origin, target, count):
+        """
+        Returns a list of up to count shortest include chains (lists of
+        labels) from origin to target, shortest first.
+        """
+        if count == 1:
+            path = self.get_shortest_dependency_path(origin, target)
+            return [path] if path is not None else []
+        self._check_node(origin)
+        self._check_node(target)
+        try:
+            return list(itertools.islice(
+                nx.shortest_simple_paths(self._graph, origin, target), count))
+        except nx.NetworkXNoPath:
+            return []
+
+    def get_shortest_dependant_paths(self, target, origins):
+        """
+        Returns a dictionary mapping each of the origins labels depending on
+        target to the shortest include chain from it to target. All paths are
+        found in a single backward breadth-first search from target, which
+        stops as soon as all origins are reached.
+        """
+        self._check_node(target)
+        remaining = set(origins)
+        children = {target: None}
+        paths = {}
+        fringe = [target]
+        while fringe and remaining:
+            next_fringe = []
+            for label in fringe:
+                if label in remaining:
+                    remaining.discard(label)
+                    paths[label] = self._join_path(label, {label: None}, children)
+                for parent in self._graph.predecessors_iter(label):
+                    if parent not in children:
+                        children[parent] = label
+                        next_fringe.append(parent)
+            fringe = next_fringe
+        return paths
+
+    def _bounded_search(self, origin, add_dependencies, add_dependants, max_depth, max_nodes,
+                        predicate, priority, top_k):
+        def get_priority(label):
+            return self.get_attribute(label, priority, 0) if priority else 0
+
+        # best-first search: (negated priority, insertion order, label, depth, reverse)
+        # the origin is expanded in both directions before any other node
+        counter = itertools.count()
+        heap = []
         if add_dependencies:
-            dependencies = self.traverse_pre_order(label)
-            nodes = itertools.chain(nodes, dependencies)
+            heap.append((-math.inf, next(counter), origin, 0, False))
+        if add_dependants:
+            heap.append((-math.inf, next(counter), origin, 0, True))
+        visited = {origin}
+        nodes = []
+        while heap and (max_nodes is None or len(nodes) < max_nodes):
+            _, _, label, depth, reverse = heapq.heappop(heap)
+            if label != origin or not nodes:
+                nodes.append(label)
+            if max_depth is not None and depth >= max_depth:
+                continue
+            if reverse:
+                neighbours = self._graph.predecessors_iter(label)
+            else:
+                neighbours = self._graph.successors_iter(label)
+            neighbours = [neighbour for neighbour in neighbours
+                          if neighbour not in visited and
+                          neighbour != self.ROOT_NODE_LABEL and
+                          (predicate is None or predicate(neighbour))]
+            if top_k is not None:
+                neighbours = heapq.nlargest(top_k, neighbours, key=get_priority)
+            for neighbour in neighbours:
+                visited.add(neighbour)
+                heapq.heappush(heap, (-get_priority(neighbour), next(counter), neighbour,
+                                      depth + 1, reverse))
+        if not nodes:
+            nodes.append(origin)
+        return nodes
+
+    def get_subgraph(self, label, add_dependencies, add_dependants, max_depth=None,
+                     max_nodes=None, predicate=None, priority=None, top_k=None):
+        """
+        Returns a dependency graph containing the node denoted by the provided
+        label. If add_dependants is false, the graph root node is reattached
+        to the origin node which becomes the sole top-level node.
+
+        The neighbourhood may be bounded: max_depth limits the distance from
+        the origin, only nodes for which predicate(label) is True are added
+        and top_k limits the number of dependencies (dependants) followed
+        from each node to the ones with the highest priority attribute value.
+        Nodes are visited best-first by the priority attribute, expanding the
+        reached node with the highest priority next, until max_nodes nodes
+        are added. Nothing beyond the returned nodes is visited. If the
+        dependants are bounded, the ones whose own dependants weren't added
+        are attached to the root as top-level nodes.
+        """
+        self._check_node(label)
+
+        nodes = self._bounded_search(label, add_dependencies, add_dependants, max_depth,
+                                     max_nodes, predicate, priority, top_k)
         if add_dependants:
-            dependants = self.traverse_pre_order(label, reverse=True)
-            nodes = itertools.chain(nodes, dependants)
+            nodes.append(self.ROOT_NODE_LABEL)
 
+        # networkx subgraphs share node attribute dicts with the original graph
         subgraph = self._graph.subgraph(nodes)
 
         if not add_dependants:
             subgraph.add_edge(self.ROOT_NODE_LABEL, label)
-
-        return DependencyGraph(subgraph)
+        else:
+            # a truncated search may not reach top-level nodes, so each
+            # group of nodes without dependants in the subgraph (a node or
+            # an include cycle) not attached to the root yet gets attached
+            condensation = nx.condensation(subgraph.subgraph(
+                node for node in nodes if node != self.ROOT_NODE_LABEL))
+            for component in condensation.nodes_iter():
+                if condensation.in_degree(component) == 0:
+                    members = condensation.node[component]['members']
+                    if not any(subgraph.has_edge(self.ROOT_NODE_LABEL, member)
+                               for member in members):
+                        subgraph.add_edge(self.ROOT_NODE_LABEL,
+                                          label if label in members else min(members))
+
+        return self._share(subgraph)
 
     def get_subtree(self, label):
         """Gets the dfs traversal tree with the root at label as a DependencyGraph"""
@@ -153,6 +395,7 @@ class DependencyGraph:
         Removes dependency edges for which
         predicate(parent_label, dependency_label) evaluates to True.
         """
+        self._detach()
         for parent in self._graph.nodes_iter():
             if parent != self.ROOT_NODE_LABEL:
                 for child in self._graph.successors(parent):
@@ -186,6 +429,7 @@ class DependencyGraph:
         """
         Sets the provided attribute to the given value for the provided label.
         """
+        self._detach()
         self._graph.node[label][key] = value
 
     def remove_attribute(self, label, key):
@@ -193,6 +437,7 @@ class DependencyGraph:
         Removes the given attribute from the label.
         """
         if key in self._graph.node[label]:
+            self._detach()
             del self._graph.node[label][key]
         
     def _traverse(self, origin, method, include_origin, reverse):
@@ -220,6 +465,43 @@ class DependencyGraph:
         """
         return self._traverse(origin, nx.dfs_preorder_nodes, include_origin, reverse)
 
+    @staticmethod
+    def print_table(stream, columns, column_separator, rows):
+        """
+        Prints a table in csv format to the provided stream.
+
+        "columns" is a dictionary, where the keys are the attribute keys,
+        and the values are Column objects. Columns are printed in the
+        dictionary's order. "rows" is an iterable of (label, attribute
+        dictionary) pairs. Values containing the separator, quotes or new
+        lines are quoted. Open files with newline='' and a large buffer for
+        best performance.
+        """
+        column_separator = column_separator.replace('\\t', '\t')
+        column_separator = column_separator.replace('\\n', '\n')
+        if len(column_separator) != 1:
+            raise RuntimeError('Column separator must be a single character, got "%s"' %
+                               column_separator)
+
+        writer = csv.writer(stream, delimiter=column_separator, lineterminator='\n')
+        writer.writerow(['label'] + [column.title for column in columns.values()])
+        getters = [(metric, column.default_value) for metric, column in columns.items()]
+        rows = iter(rows)
+        while True:
+            batch = [[label] + [attributes.get(metric, default) for metric, default in getters]
+                     for label, attributes in itertools.islice(rows, DependencyGraph._BATCH_SIZE)]
+            if not batch:
+                break
+            writer.writerows(batch)
+
+    def get_rows(self, labels):
+        """
+        Returns an iterator over (label, attributes) pairs for the provided
+        labels, as accepted by print_table. The attribute dictionaries must
+        not be modified.
+        """
+        return ((label, self._graph.node[label]) for label in labels)
+
     def print_csv(self, stream, columns, column_separator, labels):
         """
         Prints the dependency graph in csv format to the provided stream.
@@ -227,14 +509,89 @@ class DependencyGraph:
         "columns" is a dictionary, where the keys are the attribute keys,
         and the values are Column objects.
         """
-        column_separator = column_separator.replace('\\t', '\t')
-        column_separator = column_separator.replace('\\n', '\n')
+        self.print_table(stream, columns, column_separator, self.get_rows(labels))
+
+class DependencyGraphOverlay:
 
-        stream.write('label%s' % column_separator)
-        stream.write('%s\n' % column_separator.join(column.title for column in columns.values()))
-        for label in labels:
-            node = self._graph.node[label]
-            stream.write('%s%s' % (label, column_separator))
-            stream.write('%s\n' % 
-                         column_separator.join(str(node.get(metric, column.default_value))
-                                               for (metric, column) in columns.items()))
+    """
+    A copy-on-write view of a DependencyGraph with some dependency edges
+    added or removed. Only the modifications are stored, the underlying graph
+    is never changed, so overlays are cheap to create and discard. Node
+    attributes are read from the underlying graph.
+    """
+
+    def __init__(self, dependency_graph):
+        self._dependency_graph = dependency_graph
+        self._removed = set()
+        self._added = defaultdict(set)
+        self._added_dependants = defaultdict(set)
+
+    def _check_node(self, label):
+        if not self._dependency_graph.has_node(label):
+            raise RuntimeError('Node "%s" not found' % label)
+
+    def remove_dependency(self, parent, child):
+        """Removes the parent -> child dependency from the overlay."""
+        if child in self._added.get(parent, ()):
+            self._added[parent].discard(child)
+            self._added_dependants[child].discard(parent)
+        elif self._dependency_graph.has_immediate_dependency(parent, child):
+            self._removed.add((parent, child))
+        else:
+            raise RuntimeError('Dependency "%s" -> "%s" not found' % (parent, child))
+
+    def add_dependency(self, parent, child):
+        """Adds a parent -> child dependency between existing nodes."""
+        self._check_node(parent)
+        self._check_node(child)
+        if (parent, child) in self._removed:
+            self._removed.discard((parent, child))
+        elif not self._dependency_graph.has_immediate_dependency(parent, child):
+            self._added[parent].add(child)
+            self._added_dependants[child].add(parent)
+
+    def get_removed_dependencies(self):
+        """Returns a list of (parent, child) dependencies removed in the overlay."""
+        return sorted(self._removed)
+
+    def get_added_dependencies(self):
+        """Returns a list of (parent, child) dependencies added in the overlay."""
+        return sorted((parent, child)
+                      for parent, children in self._added.items()
+                      for child in children)
+
+    def get_graph(self):
+        """Returns the underlying DependencyGraph."""
+        return self._dependency_graph
+
+    def get_top_level_nodes(self):
+        """Returns an iterator over all the top-level nodes."""
+        return self._dependency_graph.get_top_level_nodes()
+
+    def has_node(self, label):
+        """Returns True iff a node with the provided label is present in the graph."""
+        return self._dependency_graph.has_node(label)
+
+    def get_attribute(self, label, key, default=None):
+        """Returns the attribute value for the provided label in the underlying graph."""
+        return self._dependency_graph.get_attribute(label, key, default)
+
+    def get_node_immediate_dependencies(self, label):
+        """Returns an iterator over the nodes immediate dependencies."""
+        dependencies = self._dependency_graph.get_node_immediate_dependencies(label)
+        if self._removed:
+            dependencies = (child for child in dependencies
+                            if (label, child) not in self._removed)
+        if label in self._added:
+            dependencies = itertools.chain(dependencies, self._added[label])
+        return dependencies
+
+    def get_node_immediate_dependants(self, label):
+        """Returns an iterator over the nodes immediately depending on the node."""
+        dependants = self._dependency_graph.get_node_immediate_dependants(label)
+        if self._removed:
+            dependants = (parent for parent in dependants
+                          if (parent, label) not in self._removed)
+        if label in self._added_dependants:
+            dependants = itertools.chain(dependants, self._added_dependants[label])
+        return dependants
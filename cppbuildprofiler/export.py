@@ -0,0 +1,318 @@
+# Copyright (c) Techland. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+
+"""
+Contains exporters writing the dependency graph and its metrics to formats
+better suited for querying than .gml and .csv files.
+"""
+
+import os
+import logging
+import sqlite3
+from cppbuildprofiler.analysis import Analyser
+
+_NODE_METRICS = [
+    Analyser.Attributes.BUILD_TIME,
+    Analyser.Attributes.FILE_SIZE,
+    Analyser.Attributes.TOTAL_SIZE,
+    Analyser.Attributes.AGG_BUILD_TIME_DEV,
+    Analyser.Attributes.TRANSLATION_UNITS,
+    Analyser.Attributes.SELF_COST,
+    Analyser.Attributes.EXCLUSIVE_SIZE,
+    Analyser.Attributes.EXCLUSIVE_BUILD_TIME,
+    Analyser.Attributes.REPEATED_INCLUSIONS,
+    Analyser.Attributes.INCLUDE_CYCLES,
+    ]
+
+_PROJECT_METRICS = list(Analyser.PROJECT_COLUMNS.keys())
+
+_BULK_PRAGMAS = [
+    'PRAGMA journal_mode = OFF',
+    'PRAGMA synchronous = OFF',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA cache_size = -262144',
+    'PRAGMA locking_mode = EXCLUSIVE',
+    ]
+
+_SCHEMA = '''
+CREATE TABLE projects (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    {project_metrics}
+);
+CREATE TABLE compilation_commands (
+    id INTEGER PRIMARY KEY,
+    command TEXT NOT NULL
+);
+CREATE TABLE nodes (
+    id INTEGER PRIMARY KEY,
+    label TEXT NOT NULL,
+    top_level INTEGER NOT NULL,
+    project_id INTEGER REFERENCES projects(id),
+    absolute_path TEXT,
+    used_pch TEXT,
+    created_pch TEXT,
+    compilation_command_id INTEGER REFERENCES compilation_commands(id)
+);
+CREATE TABLE metrics (
+    node_id INTEGER PRIMARY KEY REFERENCES nodes(id),
+    {node_metrics}
+);
+CREATE TABLE edges (
+    parent_id INTEGER NOT NULL REFERENCES nodes(id),
+    child_id INTEGER NOT NULL REFERENCES nodes(id)
+);
+'''
+
+_INDEXES = '''
+CREATE UNIQUE INDEX projects_name ON projects(name);
+CREATE UNIQUE INDEX nodes_label ON nodes(label);
+CREATE INDEX nodes_project ON nodes(project_id, top_level);
+CREATE UNIQUE INDEX edges_parent_child ON edges(parent_id, child_id);
+CREATE INDEX edges_child ON edges(child_id);
+'''
+
+_VIEWS = '''
+CREATE VIEW top_headers_by_deviation AS
+    SELECT nodes.label, projects.name AS project, metrics.*
+    FROM nodes
+    JOIN metrics ON metrics.node_id = nodes.id
+    LEFT JOIN projects ON projects.id = nodes.project_id
+    WHERE nodes.top_level = 0
+    ORDER BY metrics.{deviation} DESC;
+CREATE VIEW slowest_translation_units AS
+    SELECT nodes.label, projects.name AS project, metrics.*
+    FROM nodes
+    JOIN metrics ON metrics.node_id = nodes.id
+    LEFT JOIN projects ON projects.id = nodes.project_id
+    WHERE nodes.top_level = 1
+    ORDER BY metrics.{build_time} DESC;
+CREATE VIEW translation_units_per_project AS
+    SELECT projects.name AS project,
+           COUNT(nodes.id) AS translation_units,
+           SUM(metrics.{build_time}) AS build_time,
+           SUM(metrics.{total_size}) AS total_size
+    FROM nodes
+    JOIN metrics ON metrics.node_id = nodes.id
+    LEFT JOIN projects ON projects.id = nodes.project_id
+    WHERE nodes.top_level = 1
+    GROUP BY nodes.project_id
+    ORDER BY build_time DESC;
+'''
+
+def _execute_script(connection, script):
+    # unlike executescript, doesn't commit the pending transaction
+    for statement in script.split(';'):
+        if statement.strip():
+            connection.execute(statement)
+
+def write_sqlite(dependency_graph, path):
+    """
+    Writes the dependency graph to a new SQLite database at path, replacing
+    any existing file. Nodes (without the root), edges, metrics (one column
+    per metric, named like the attribute), projects with their rolled up
+    metrics and distinct compilation commands are stored in separate tables.
+    Data is inserted in a single transaction, indexes are created
+    afterwards. The database also contains the top_headers_by_deviation,
+    slowest_translation_units and translation_units_per_project views.
+    """
+    if os.path.exists(path):
+        os.remove(path)
+
+    logging.info('Rolling up project metrics...')
+    project_metrics = Analyser(dependency_graph).get_project_metrics()
+
+    connection = sqlite3.connect(path, isolation_level=None)
+    try:
+        for pragma in _BULK_PRAGMAS:
+            connection.execute(pragma)
+        _execute_script(connection, _SCHEMA.format(
+            project_metrics=',\n    '.join('%s NUMERIC' % metric for metric in _PROJECT_METRICS),
+            node_metrics=',\n    '.join('%s NUMERIC' % metric for metric in _NODE_METRICS)))
+
+        connection.execute('BEGIN')
+
+        project_ids = {}
+        for project, metrics in project_metrics:
+            project_ids[project] = len(project_ids) + 1
+        connection.executemany(
+            'INSERT INTO projects VALUES (%s)' % ', '.join('?' * (len(_PROJECT_METRICS) + 2)),
+            ([project_ids[project], project] + [metrics[metric] for metric in _PROJECT_METRICS]
+             for project, metrics in project_metrics))
+
+        labels = list(dependency_graph.get_nodes())
+        projects = {label: dependency_graph.get_attribute(label, Analyser.Attributes.PROJECT,
+                                                          Analyser.UNKNOWN_PROJECT_NAME)
+                    for label in labels}
+        # projects seen only in orphans (e.g. left by removing dependencies)
+        # aren't rolled up, they are stored without metrics
+        orphan_projects = sorted(set(projects.values()) - set(project_ids))
+        for project in orphan_projects:
+            project_ids[project] = len(project_ids) + 1
+        connection.executemany('INSERT INTO projects (id, name) VALUES (?, ?)',
+                               ((project_ids[project], project) for project in orphan_projects))
+
+        node_ids = {label: node_id for node_id, label in enumerate(labels, 1)}
+        top_levels = frozenset(dependency_graph.get_top_level_nodes())
+        command_ids = {}
+
+        def get_command_id(command):
+            if command is None:
+                return None
+            return command_ids.setdefault(command, len(command_ids) + 1)
+
+        def get_attribute(label, key):
+            return dependency_graph.get_attribute(label, key)
+
+        logging.info('Storing %d nodes...', len(labels))
+        connection.executemany(
+            'INSERT INTO nodes VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            ((node_ids[label],
+              label,
+              int(label in top_levels),
+              project_ids[projects[label]],
+              get_attribute(label, Analyser.Attributes.ABSOLUTE_PATH),
+              get_attribute(label, Analyser.Attributes.USED_PCH),
+              get_attribute(label, Analyser.Attributes.CREATED_PCH),
+              get_command_id(get_attribute(label, Analyser.Attributes.COMPILATION_COMMAND)))
+             for label in labels))
+        connection.executemany(
+            'INSERT INTO compilation_commands VALUES (?, ?)',
+            ((command_id, command) for command, command_id in command_ids.items()))
+        connection.executemany(
+            'INSERT INTO metrics VALUES (%s)' % ', '.join('?' * (len(_NODE_METRICS) + 1)),
+            ([node_ids[label]] + [get_attribute(label, metric) for metric in _NODE_METRICS]
+             for label in labels))
+
+        logging.info('Storing %d edges...', dependency_graph.number_of_edges() - len(top_levels))
+        connection.executemany(
+            'INSERT INTO edges VALUES (?, ?)',
+            ((node_ids[label], node_ids[child])
+             for label in labels
+             for child in dependency_graph.get_node_immediate_dependencies(label)))
+
+        logging.info('Creating indexes...')
+        _execute_script(connection, _INDEXES)
+        _execute_script(connection, _VIEWS.format(
+            deviation=Analyser.Attributes.AGG_BUILD_TIME_DEV,
+            build_time=Analyser.Attributes.BUILD_TIME,
+            total_size=Analyser.Attributes.TOTAL_SIZE))
+        connection.execute('COMMIT')
+    finally:
+        connection.close()
+
+def _get_column_arrays(dependency_graph):
+    import numpy as np
+
+    labels = list(dependency_graph.get_nodes())
+    top_levels = frozenset(dependency_graph.get_top_level_nodes())
+    columns = [
+        ('label', np.array(labels, dtype=str)),
+        ('project', np.array([dependency_graph.get_attribute(label, Analyser.Attributes.PROJECT,
+                                                             Analyser.UNKNOWN_PROJECT_NAME)
+                              for label in labels], dtype=str)),
+        ('toplevel', np.array([label in top_levels for label in labels], dtype=np.bool_)),
+        ]
+    for metric in _NODE_METRICS:
+        default = Analyser.INTERNAL_COLUMNS[metric].default_value
+        dtype = np.float64 if isinstance(default, float) else np.int64
+        columns.append((metric, np.fromiter(
+            (dependency_graph.get_attribute(label, metric, default) for label in labels),
+            dtype=dtype, count=len(labels))))
+    return labels, columns
+
+def _get_adjacency(dependency_graph, labels):
+    import numpy as np
+    from scipy.sparse import csr_matrix
+
+    node_ids = {label: node_id for node_id, label in enumerate(labels)}
+    indptr = np.zeros(len(labels) + 1, dtype=np.int64)
+    indices = []
+    for node_id, label in enumerate(labels):
+        children = [node_ids[child]
+                    for child in dependency_graph.get_node_immediate_dependencies(label)]
+        children.sort()
+        indices.extend(children)
+        indptr[node_id + 1] = len(indices)
+    indices = np.array(indices, dtype=np.int32)
+    return csr_matrix((np.ones(len(indices), dtype=np.int8), indices, indptr),
+                      shape=(len(labels), len(labels)))
+
+def write_npz(dependency_graph, path, adjacency_path=None):
+    """
+    Writes the nodes' labels, projects, top-level flags and metrics as typed
+    columns (one array per column, named like the metric attributes) to an
+    uncompressed .npz file at path. Metrics missing in the graph get the
+    default values of the csv columns.
+
+    The edges are written to adjacency_path (defaulting to path with an
+    "_adjacency" suffix) as a sparse CSR matrix with scipy.sparse.save_npz,
+    rows and columns being indices into the label array.
+
+    Both files can be memory mapped with load_npz.
+    """
+    import numpy as np
+    from scipy.sparse import save_npz
+
+    labels, columns = _get_column_arrays(dependency_graph)
+    # numpy would append the .npz extension to paths, but not to files
+    with open(path, 'wb') as stream:
+        np.savez(stream, **dict(columns))
+
+    if adjacency_path is None:
+        root, ext = os.path.splitext(path)
+        adjacency_path = root + '_adjacency' + (ext or '.npz')
+    with open(adjacency_path, 'wb') as stream:
+        save_npz(stream, _get_adjacency(dependency_graph, labels), compressed=False)
+
+def load_npz(path):
+    """
+    Loads an uncompressed .npz file written by write_npz (either of the two)
+    without copying. The member arrays are memory mapped at their offsets
+    in the archive. Returns a dictionary of read-only arrays. Use
+    scipy.sparse.csr_matrix((data, indices, indptr), shape) to rebuild the
+    adjacency matrix from its arrays.
+    """
+    import zipfile
+    import struct
+    import numpy as np
+
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, 'rb') as stream:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise RuntimeError('%s is compressed and can\'t be memory mapped' % path)
+            stream.seek(info.header_offset)
+            local_header = stream.read(30)
+            name_length, extra_length = struct.unpack('<2H', local_header[26:30])
+            stream.seek(info.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(stream)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(stream)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(stream)
+            name = info.filename[:-len('.npy')]
+            if dtype.hasobject:
+                raise RuntimeError('Can\'t memory map object array %s in %s' % (name, path))
+            if 0 in shape:
+                arrays[name] = np.empty(shape, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(path, dtype=dtype, mode='r', offset=stream.tell(),
+                                         shape=shape, order='F' if fortran_order else 'C')
+    return arrays
+
+def write_parquet(dependency_graph, path):
+    """
+    Writes the same columns as write_npz to an Apache Parquet file. Requires
+    the optional pyarrow package.
+    """
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError('Writing parquet files requires the pyarrow package')
+
+    _, columns = _get_column_arrays(dependency_graph)
+    table = pyarrow.Table.from_arrays([pyarrow.array(array) for _, array in columns],
+                                      names=[name for name, _ in columns])
+    pyarrow.parquet.write_table(table, path)
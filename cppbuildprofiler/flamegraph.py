@@ -0,0 +1,128 @@
+# Copyright (c) Techland. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+
+"""
+Contains the FlameGraph class, exporting aggregated include trees in formats
+understood by flame graph tools.
+"""
+
+import json
+from cppbuildprofiler.analysis import Analyser
+
+class FlameGraph:
+
+    """
+    Aggregates include trees of translation units into a flame graph, where
+    a stack is an include chain and the weight of a frame is the file size
+    (or another metric) of the included file. Identical stacks are merged as
+    translation units are added, so memory use is bounded by the number of
+    distinct include chains, not by the number of translation units.
+
+    If merge_translation_units is True, the bottom frame of each stack is the
+    project of the translation unit instead of its label, so include chains
+    from different translation units of a project are merged.
+
+    Include trees are rebuilt from the aggregated dependency graph, see
+    Analyser.get_translation_unit_include_tree for how they may differ from
+    the ones seen by the compiler.
+    """
+
+    _FRAME = 0
+    _WEIGHT = 1
+    _CHILDREN = 2
+
+    def __init__(self, dependency_graph, weight=Analyser.Attributes.FILE_SIZE,
+                 merge_translation_units=True):
+        self._dependency_graph = dependency_graph
+        self._analyser = Analyser(dependency_graph)
+        self._weight = weight
+        self._merge_translation_units = merge_translation_units
+        self._root = [None, 0, {}]
+
+    def _frame(self, parent, name):
+        children = parent[self._CHILDREN]
+        if name not in children:
+            children[name] = [name, 0, {}]
+        return children[name]
+
+    def add_translation_unit(self, top_level):
+        """Adds the include tree of the top_level translation unit."""
+        stack = [self._root]
+        for depth, label in self._analyser.get_translation_unit_include_tree(top_level):
+            del stack[depth + 1:]
+            if depth == 0 and self._merge_translation_units:
+                name = self._dependency_graph.get_attribute(label, Analyser.Attributes.PROJECT,
+                                                            Analyser.UNKNOWN_PROJECT_NAME)
+            else:
+                name = label
+            frame = self._frame(stack[-1], name)
+            frame[self._WEIGHT] += self._dependency_graph.get_attribute(label, self._weight, 0)
+            stack.append(frame)
+
+    def add_translation_units(self, project=None):
+        """
+        Adds the include trees of all translation units, or of the ones from
+        the provided project only.
+        """
+        for top_level in self._dependency_graph.get_top_level_nodes():
+            if project is None or self._dependency_graph.get_attribute(
+                    top_level, Analyser.Attributes.PROJECT) == project:
+                self.add_translation_unit(top_level)
+
+    def _traverse(self):
+        stack = [(self._root, iter(sorted(self._root[self._CHILDREN].items())))]
+        path = []
+        while stack:
+            for _, frame in stack[-1][1]:
+                path.append(frame)
+                yield path
+                stack.append((frame, iter(sorted(frame[self._CHILDREN].items()))))
+                break
+            else:
+                stack.pop()
+                if path:
+                    path.pop()
+
+    def write_folded(self, stream, scale=1):
+        """
+        Writes the flame graph in Brendan Gregg's "folded stacks" format,
+        accepted by flamegraph.pl and most other flame graph tools. Weights
+        are multiplied by scale and rounded, as sample counts are integers.
+        """
+        for path in self._traverse():
+            weight = int(round(path[-1][self._WEIGHT] * scale))
+            if weight > 0:
+                stream.write('%s %d\n' % (';'.join(frame[self._FRAME].replace(';', '_')
+                                                   for frame in path),
+                                          weight))
+
+    def write_speedscope(self, stream, name, unit='bytes'):
+        """
+        Writes the flame graph as a speedscope (https://www.speedscope.app)
+        sampled profile with the provided name and weight unit.
+        """
+        frames = {}
+        samples = []
+        weights = []
+        for path in self._traverse():
+            weight = path[-1][self._WEIGHT]
+            if weight > 0:
+                samples.append([frames.setdefault(frame[self._FRAME], len(frames))
+                                for frame in path])
+                weights.append(weight)
+        json.dump({
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'exporter': 'cppbuildprofiler',
+            'name': name,
+            'shared': {'frames': [{'name': frame} for frame in
+                                  sorted(frames, key=frames.get)]},
+            'profiles': [{
+                'type': 'sampled',
+                'name': name,
+                'unit': unit,
+                'startValue': 0,
+                'endValue': sum(weights),
+                'samples': samples,
+                'weights': weights,
+                }],
+            }, stream)
@@ -0,0 +1,174 @@
+# Copyright (c) Techland. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+
+"""
+Contains streaming writers of networkx graphs in the GML and GraphML formats.
+Unlike the networkx writers they write the graph node by node and edge by
+edge, without building the whole document in memory, and may be limited to a
+subset of attributes. Files with a .gz extension are compressed. The output is
+readable with networkx's read_gml and read_graphml.
+"""
+
+import re
+import gzip
+from xml.sax.saxutils import escape as _escape_xml, quoteattr as _quote_xml
+
+_BUFFER_SIZE = 1 << 20
+
+_VALID_GML_KEY = re.compile('^[A-Za-z][0-9A-Za-z]*$')
+_GML_ESCAPED = re.compile('[^ -~]|[&"]')
+
+def _open(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'wt', encoding='utf-8', compresslevel=6)
+    return open(path, 'w', encoding='utf-8', buffering=_BUFFER_SIZE)
+
+def _get_attributes(attributes, keys):
+    if keys is None:
+        return attributes.items()
+    return ((key, attributes[key]) for key in keys if key in attributes)
+
+def _escape_gml(text):
+    if _GML_ESCAPED.search(text) is None:
+        return text
+    return _GML_ESCAPED.sub(lambda match: '&#%d;' % ord(match.group(0)), text)
+
+def _format_gml_value(value):
+    # bool is an int, but networkx can't read True and False back
+    if isinstance(value, int):
+        return str(int(value))
+    elif isinstance(value, float):
+        text = repr(value).upper()
+        # GML reals need a decimal point, which repr skips for e.g. 1E+20
+        exponent = text.rfind('E')
+        if exponent != -1 and text.find('.', 0, exponent) == -1:
+            text = text[:exponent] + '.' + text[exponent:]
+        return text
+    return '"%s"' % _escape_gml(str(value))
+
+def _format_gml_attributes(attributes, keys, ignored_keys, valid_keys):
+    if not attributes:
+        return ''
+    lines = []
+    for key, value in _get_attributes(attributes, keys):
+        if value is None or key in ignored_keys:
+            continue
+        if key not in valid_keys:
+            if not _VALID_GML_KEY.match(key):
+                raise RuntimeError('"%s" is not a valid GML attribute key' % key)
+            valid_keys.add(key)
+        if value.__class__ is int:
+            text = str(value)
+        elif value.__class__ is float:
+            text = repr(value).upper()
+            if 'E' in text and '.' not in text:
+                text = _format_gml_value(value)
+        elif value.__class__ is str:
+            text = '"%s"' % _escape_gml(value)
+        else:
+            text = _format_gml_value(value)
+        lines.append('    %s %s\n' % (key, text))
+    return ''.join(lines)
+
+def write_gml(graph, path, node_attributes=None, edge_attributes=None):
+    """
+    Writes the networkx graph to a GML file at path. node_attributes and
+    edge_attributes are lists of attribute keys to write, all attributes are
+    written if None. Attributes set to None are skipped. Node labels are
+    written as strings.
+    """
+    node_ids = {}
+    valid_keys = set()
+    with _open(path) as stream:
+        stream.write('graph [\n')
+        if graph.is_directed():
+            stream.write('  directed 1\n')
+        for node, attributes in graph.nodes_iter(data=True):
+            node_id = len(node_ids)
+            node_ids[node] = node_id
+            stream.write('  node [\n    id %d\n    label "%s"\n%s  ]\n' % (
+                node_id,
+                _escape_gml(str(node)),
+                _format_gml_attributes(attributes, node_attributes, ('id', 'label'), valid_keys)))
+        for source, target, attributes in graph.edges_iter(data=True):
+            stream.write('  edge [\n    source %d\n    target %d\n%s  ]\n' % (
+                node_ids[source],
+                node_ids[target],
+                _format_gml_attributes(attributes, edge_attributes, ('source', 'target'),
+                                       valid_keys)))
+        stream.write(']\n')
+
+def _get_graphml_type(value):
+    if isinstance(value, bool):
+        return 'boolean'
+    elif isinstance(value, int):
+        return 'long'
+    elif isinstance(value, float):
+        return 'double'
+    return 'string'
+
+def _merge_graphml_types(current, new):
+    if current is None or current == new:
+        return new
+    elif {current, new} == {'long', 'double'}:
+        return 'double'
+    return 'string'
+
+def _collect_graphml_keys(items, keys):
+    types = {}
+    for attributes in items:
+        for key, value in _get_attributes(attributes, keys):
+            if value is not None:
+                types[key] = _merge_graphml_types(types.get(key), _get_graphml_type(value))
+    return types
+
+def _format_graphml_value(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return _escape_xml(str(value))
+
+def _format_graphml_attributes(attributes, keys, key_ids):
+    return ''.join('<data key="%s">%s</data>' % (key_ids[key], _format_graphml_value(value))
+                   for key, value in _get_attributes(attributes, keys)
+                   if value is not None)
+
+def write_graphml(graph, path, node_attributes=None, edge_attributes=None):
+    """
+    Writes the networkx graph to a GraphML file at path. node_attributes and
+    edge_attributes are lists of attribute keys to write, all attributes are
+    written if None. Attributes set to None are skipped. Node labels are used
+    as node ids. The attribute types are determined with an additional pass
+    over the graph before writing.
+    """
+    node_types = _collect_graphml_keys(
+        (attributes for _, attributes in graph.nodes_iter(data=True)), node_attributes)
+    edge_types = _collect_graphml_keys(
+        (attributes for _, _, attributes in graph.edges_iter(data=True)), edge_attributes)
+
+    with _open(path) as stream:
+        stream.write('<?xml version="1.0" encoding="utf-8"?>\n'
+                     '<graphml xmlns="http://graphml.graphdrawing.org/xmlns" '
+                     'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+                     'xsi:schemaLocation="http://graphml.graphdrawing.org/xmlns '
+                     'http://graphml.graphdrawing.org/xmlns/1.0/graphml.xsd">\n')
+        node_key_ids = {}
+        edge_key_ids = {}
+        for domain, types, key_ids in [('node', node_types, node_key_ids),
+                                       ('edge', edge_types, edge_key_ids)]:
+            for key, attribute_type in sorted(types.items()):
+                key_id = 'd%d' % (len(node_key_ids) + len(edge_key_ids))
+                key_ids[key] = key_id
+                stream.write('  <key id="%s" for="%s" attr.name=%s attr.type="%s" />\n' %
+                             (key_id, domain, _quote_xml(str(key)), attribute_type))
+        stream.write('  <graph edgedefault="%s">\n' %
+                     ('directed' if graph.is_directed() else 'undirected'))
+        for node, attributes in graph.nodes_iter(data=True):
+            stream.write('    <node id=%s>%s</node>\n' % (
+                _quote_xml(str(node)),
+                _format_graphml_attributes(attributes, node_attributes, node_key_ids)))
+        for source, target, attributes in graph.edges_iter(data=True):
+            stream.write('    <edge source=%s target=%s>%s</edge>\n' % (
+                _quote_xml(str(source)),
+                _quote_xml(str(target)),
+                _format_graphml_attributes(attributes, edge_attributes, edge_key_ids)))
+        stream.write('  </graph>\n</graphml>\n')
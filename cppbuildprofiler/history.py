@@ -0,0 +1,378 @@
+# Copyright (c) Techland. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+
+"""
+Contains a build history store keeping the dependency graphs and metrics of
+consecutive builds in a single SQLite database. Consecutive graphs are
+mostly identical, so the structure is deduplicated: every file (identified
+by its unified absolute path) and every include dependency is stored once,
+and the builds it is present in are stored as spans of consecutive builds,
+which only change when the structure does. Labels are stored per span, as
+the label of a file depends on the other files with the same name parsed
+before it. Strings (labels, projects, paths, compilation commands) are
+stored once too. Metrics are stored per build in a table clustered by
+node, so the history of a file's metric is read with a single range scan.
+"""
+
+import sqlite3
+from datetime import datetime
+import networkx as nx
+from cppbuildprofiler.attributes import Attributes
+from cppbuildprofiler.dependency import DependencyGraph, unify_path
+
+METRICS = [
+    Attributes.BUILD_TIME,
+    Attributes.FILE_SIZE,
+    Attributes.TOTAL_SIZE,
+    Attributes.AGG_BUILD_TIME_DEV,
+    Attributes.TRANSLATION_UNITS,
+    Attributes.SELF_COST,
+    Attributes.EXCLUSIVE_SIZE,
+    Attributes.EXCLUSIVE_BUILD_TIME,
+    Attributes.REPEATED_INCLUSIONS,
+    Attributes.INCLUDE_CYCLES,
+    ]
+
+# string attributes stored in node spans, a new span starts when any changes
+_NODE_ATTRIBUTES = [
+    Attributes.PROJECT,
+    Attributes.ABSOLUTE_PATH,
+    Attributes.USED_PCH,
+    Attributes.CREATED_PCH,
+    Attributes.COMPILATION_COMMAND,
+    ]
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS builds (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    timestamp TEXT NOT NULL,
+    nodes INTEGER NOT NULL,
+    edges INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS strings (
+    id INTEGER PRIMARY KEY,
+    value TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS nodes (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS edges (
+    id INTEGER PRIMARY KEY,
+    parent_id INTEGER NOT NULL REFERENCES nodes(id),
+    child_id INTEGER NOT NULL REFERENCES nodes(id),
+    UNIQUE (parent_id, child_id)
+);
+CREATE TABLE IF NOT EXISTS node_spans (
+    node_id INTEGER NOT NULL REFERENCES nodes(id),
+    first_build_id INTEGER NOT NULL REFERENCES builds(id),
+    last_build_id INTEGER REFERENCES builds(id),
+    label_id INTEGER NOT NULL REFERENCES strings(id),
+    top_level INTEGER NOT NULL,
+    {attributes},
+    PRIMARY KEY (node_id, first_build_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS edge_spans (
+    edge_id INTEGER NOT NULL REFERENCES edges(id),
+    first_build_id INTEGER NOT NULL REFERENCES builds(id),
+    last_build_id INTEGER REFERENCES builds(id),
+    PRIMARY KEY (edge_id, first_build_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS metrics (
+    node_id INTEGER NOT NULL REFERENCES nodes(id),
+    build_id INTEGER NOT NULL REFERENCES builds(id),
+    {metrics},
+    PRIMARY KEY (node_id, build_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS node_spans_open ON node_spans(last_build_id);
+CREATE INDEX IF NOT EXISTS edge_spans_open ON edge_spans(last_build_id)
+'''
+
+def _in_build(table, build=':build'):
+    # condition selecting spans of a build, last_build_id is NULL while the span is open
+    return '{0}.first_build_id <= {1} AND ({0}.last_build_id IS NULL OR ' \
+           '{0}.last_build_id >= {1})'.format(table, build)
+
+def _attribute_column(attribute):
+    return '%s_id' % attribute
+
+def _get_path(dependency_graph, label):
+    # files are identified by their paths, nodes without one by their labels
+    return unify_path(dependency_graph.get_attribute(label, Attributes.ABSOLUTE_PATH, label))
+
+class HistoryStore:
+
+    """
+    Stores dependency graphs of consecutive builds in an SQLite database at
+    path, created if it doesn't exist. Builds must be added in
+    chronological order. Builds are referred to by their unique names.
+    """
+
+    def __init__(self, path):
+        self._connection = sqlite3.connect(path, isolation_level=None)
+        self._connection.execute('PRAGMA journal_mode = WAL')
+        self._connection.execute('BEGIN')
+        try:
+            for statement in _SCHEMA.format(
+                    attributes=',\n    '.join('%s INTEGER REFERENCES strings(id)' %
+                                              _attribute_column(attribute)
+                                              for attribute in _NODE_ATTRIBUTES),
+                    metrics=',\n    '.join('%s NUMERIC' % metric
+                                           for metric in METRICS)).split(';'):
+                self._connection.execute(statement)
+            self._connection.execute('COMMIT')
+        except Exception:
+            self._connection.execute('ROLLBACK')
+            self._connection.close()
+            raise
+
+    def close(self):
+        """Closes the database"""
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _get_ids(self, table, column, values):
+        # returns ids of the values, inserting missing ones
+        ids = dict((value, row_id) for row_id, value in
+                   self._connection.execute('SELECT id, %s FROM %s' % (column, table)))
+        missing = [value for value in set(values) if value not in ids]
+        next_id = max(ids.values(), default=0) + 1
+        for row_id, value in enumerate(missing, next_id):
+            ids[value] = row_id
+        self._connection.executemany('INSERT INTO %s (id, %s) VALUES (?, ?)' % (table, column),
+                                     ((ids[value], value) for value in missing))
+        return ids
+
+    def _get_build_id(self, build):
+        row = self._connection.execute('SELECT id FROM builds WHERE name = ?',
+                                       (build,)).fetchone()
+        if row is None:
+            raise RuntimeError('Build "%s" not found in the history' % build)
+        return row[0]
+
+    def _update_spans(self, table, key, columns, build_id, previous_build_id, current):
+        # current maps the keys present in the build to tuples of the other
+        # columns of their spans, spans with changed columns are reopened
+        open_spans = {row[0]: row[1:] for row in self._connection.execute(
+            'SELECT %s FROM %s WHERE last_build_id IS NULL' % (', '.join([key] + columns),
+                                                               table))}
+        closed = [row_id for row_id, values in open_spans.items()
+                  if current.get(row_id) != values]
+        opened = [row_id for row_id, values in current.items()
+                  if open_spans.get(row_id) != values]
+        self._connection.executemany(
+            'UPDATE %s SET last_build_id = ? WHERE %s = ? AND last_build_id IS NULL' % (
+                table, key),
+            ((previous_build_id, row_id) for row_id in closed))
+        self._connection.executemany(
+            'INSERT INTO %s (%s) VALUES (%s)' % (
+                table, ', '.join([key, 'first_build_id'] + columns),
+                ', '.join('?' * (len(columns) + 2))),
+            ((row_id, build_id) + current[row_id] for row_id in opened))
+        return len(opened)
+
+    def add_build(self, dependency_graph, name=None, timestamp=None):
+        """
+        Adds the dependency graph with its metrics as the latest build named
+        name (defaults to the timestamp, which defaults to now). Returns a
+        (nodes, edges) tuple with the numbers of nodes added or changed and
+        dependencies added since the previous build, i.e. of new spans.
+        Nodes are identified by their absolute paths, or by their labels if
+        they have none.
+        """
+        timestamp = timestamp or datetime.now().isoformat(timespec='seconds')
+        name = name or timestamp
+        labels = list(dependency_graph.get_nodes())
+        paths = {}
+        labels_by_path = {}
+        for label in labels:
+            paths[label] = _get_path(dependency_graph, label)
+            other = labels_by_path.setdefault(paths[label], label)
+            if other != label:
+                raise RuntimeError('Nodes "%s" and "%s" have the same path %s' % (
+                    other, label, paths[label]))
+        top_levels = frozenset(dependency_graph.get_top_level_nodes())
+        edges = [(parent, child)
+                 for parent in labels
+                 for child in dependency_graph.get_node_immediate_dependencies(parent)]
+
+        self._connection.execute('BEGIN')
+        try:
+            if self._connection.execute('SELECT 1 FROM builds WHERE name = ?',
+                                        (name,)).fetchone():
+                raise RuntimeError('Build "%s" already in the history' % name)
+            previous_build_id = self._connection.execute(
+                'SELECT MAX(id) FROM builds').fetchone()[0]
+            build_id = self._connection.execute(
+                'INSERT INTO builds (name, timestamp, nodes, edges) VALUES (?, ?, ?, ?)',
+                (name, timestamp, len(labels), len(edges))).lastrowid
+
+            path_ids = self._get_ids('nodes', 'path', paths.values())
+            node_ids = {label: path_ids[paths[label]] for label in labels}
+            values = {}
+            for label in labels:
+                values[label] = [label] + [dependency_graph.get_attribute(label, attribute)
+                                           for attribute in _NODE_ATTRIBUTES]
+                values[label] = [str(value) if value is not None else None
+                                 for value in values[label]]
+            string_ids = self._get_ids('strings', 'value',
+                                       (value for label in labels for value in values[label]
+                                        if value is not None))
+            string_ids[None] = None
+            nodes = {node_ids[label]: tuple([string_ids[values[label][0]],
+                                             int(label in top_levels)] +
+                                            [string_ids[value] for value in values[label][1:]])
+                     for label in labels}
+            changed_nodes = self._update_spans(
+                'node_spans', 'node_id',
+                ['label_id', 'top_level'] +
+                [_attribute_column(attribute) for attribute in _NODE_ATTRIBUTES],
+                build_id, previous_build_id, nodes)
+
+            edge_ids = {}
+            for row_id, parent_id, child_id in self._connection.execute(
+                    'SELECT id, parent_id, child_id FROM edges'):
+                edge_ids[parent_id, child_id] = row_id
+            next_id = max(edge_ids.values(), default=0) + 1
+            new_edges = []
+            for parent, child in edges:
+                key = (node_ids[parent], node_ids[child])
+                if key not in edge_ids:
+                    edge_ids[key] = next_id
+                    new_edges.append((next_id,) + key)
+                    next_id += 1
+            self._connection.executemany('INSERT INTO edges VALUES (?, ?, ?)', new_edges)
+            changed_edges = self._update_spans(
+                'edge_spans', 'edge_id', [], build_id, previous_build_id,
+                {edge_ids[node_ids[parent], node_ids[child]]: () for parent, child in edges})
+
+            rows = []
+            for label in labels:
+                metrics = [dependency_graph.get_attribute(label, metric) for metric in METRICS]
+                if any(value is not None for value in metrics):
+                    rows.append([node_ids[label], build_id] + metrics)
+            self._connection.executemany(
+                'INSERT INTO metrics (node_id, build_id, %s) VALUES (%s)' % (
+                    ', '.join(METRICS), ', '.join('?' * (len(METRICS) + 2))),
+                rows)
+            self._connection.execute('COMMIT')
+        except Exception:
+            self._connection.execute('ROLLBACK')
+            raise
+        return changed_nodes, changed_edges
+
+    def get_builds(self):
+        """Returns a list of (name, timestamp, nodes, edges) tuples of the builds"""
+        return self._connection.execute(
+            'SELECT name, timestamp, nodes, edges FROM builds ORDER BY id').fetchall()
+
+    def find_path(self, label, build=None):
+        """
+        Returns the path identifying the file with the label in the build
+        (the latest build if None).
+        """
+        if build is None:
+            build_id = self._connection.execute('SELECT MAX(id) FROM builds').fetchone()[0]
+        else:
+            build_id = self._get_build_id(build)
+        row = self._connection.execute(
+            'SELECT nodes.path '
+            'FROM node_spans '
+            'JOIN nodes ON nodes.id = node_spans.node_id '
+            'JOIN strings ON strings.id = node_spans.label_id '
+            'WHERE strings.value = :label AND %s' % _in_build('node_spans'),
+            {'label': label, 'build': build_id}).fetchone()
+        if row is None:
+            raise RuntimeError('Node "%s" not found in the build' % label)
+        return row[0]
+
+    def get_metric_history(self, path, metric, last=None):
+        """
+        Returns a list of (build name, timestamp, value) tuples with the
+        values of the metric of the file with the path in the last builds
+        (all if last is None), oldest first. Value is None in builds without
+        the file or metric. The history follows the file even if its label
+        changed between builds.
+        """
+        if metric not in METRICS:
+            raise RuntimeError('Unknown metric: %s' % metric)
+        row = self._connection.execute('SELECT id FROM nodes WHERE path = ?',
+                                       (unify_path(path),)).fetchone()
+        if row is None:
+            raise RuntimeError('Node "%s" not found in the history' % path)
+        history = self._connection.execute(
+            'SELECT builds.name, builds.timestamp, metrics.%s '
+            'FROM builds '
+            'LEFT JOIN metrics ON metrics.node_id = ? AND metrics.build_id = builds.id '
+            'ORDER BY builds.id DESC LIMIT ?' % metric,
+            (row[0], -1 if last is None else last)).fetchall()
+        history.reverse()
+        return history
+
+    def get_dependency_changes(self, old_build, new_build):
+        """
+        Returns an (added, removed) tuple of sorted lists of (parent, child)
+        dependencies present in only one of the builds, labelled as in the
+        build they're present in.
+        """
+        old_build_id = self._get_build_id(old_build)
+        new_build_id = self._get_build_id(new_build)
+
+        def get_difference(build_id, other_build_id):
+            return sorted(self._connection.execute(
+                'SELECT parent_labels.value, child_labels.value '
+                'FROM edges '
+                'JOIN node_spans AS parents ON parents.node_id = edges.parent_id AND {0} '
+                'JOIN node_spans AS children ON children.node_id = edges.child_id AND {1} '
+                'JOIN strings AS parent_labels ON parent_labels.id = parents.label_id '
+                'JOIN strings AS child_labels ON child_labels.id = children.label_id '
+                'WHERE edges.id IN ('
+                '    SELECT edge_id FROM edge_spans WHERE {2} '
+                '    EXCEPT '
+                '    SELECT edge_id FROM edge_spans WHERE {3})'.format(
+                    _in_build('parents'), _in_build('children'), _in_build('edge_spans'),
+                    _in_build('edge_spans', ':other')),
+                {'build': build_id, 'other': other_build_id}).fetchall())
+
+        return (get_difference(new_build_id, old_build_id),
+                get_difference(old_build_id, new_build_id))
+
+    def get_graph(self, build):
+        """Returns the DependencyGraph of the build with its metrics"""
+        build_id = self._get_build_id(build)
+        strings = dict(self._connection.execute('SELECT id, value FROM strings'))
+        graph = nx.DiGraph()
+        graph.add_node(DependencyGraph.ROOT_NODE_LABEL)
+        labels = {}
+        for row in self._connection.execute(
+                'SELECT node_id, label_id, top_level, %s FROM node_spans WHERE %s' % (
+                    ', '.join(_attribute_column(attribute) for attribute in _NODE_ATTRIBUTES),
+                    _in_build('node_spans')),
+                {'build': build_id}):
+            node_id, label_id, top_level = row[:3]
+            label = labels[node_id] = strings[label_id]
+            graph.add_node(label, **{attribute: strings[string_id]
+                                     for attribute, string_id in zip(_NODE_ATTRIBUTES, row[3:])
+                                     if string_id is not None})
+            if top_level:
+                graph.add_edge(DependencyGraph.ROOT_NODE_LABEL, label)
+        for row in self._connection.execute(
+                'SELECT node_id, %s FROM metrics WHERE build_id = ?' % ', '.join(METRICS),
+                (build_id,)):
+            graph.node[labels[row[0]]].update((metric, value)
+                                              for metric, value in zip(METRICS, row[1:])
+                                              if value is not None)
+        graph.add_edges_from(
+            (labels[parent_id], labels[child_id])
+            for parent_id, child_id in self._connection.execute(
+                'SELECT edges.parent_id, edges.child_id '
+                'FROM edge_spans JOIN edges ON edges.id = edge_spans.edge_id '
+                'WHERE %s' % _in_build('edge_spans'),
+                {'build': build_id}))
+        return DependencyGraph(graph)
@@ -0,0 +1,243 @@
+# Copyright (c) Techland. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+
+"""
+Contains stage-level instrumentation of the profiler itself. When an
+Instrumentation is started, stages (parsing, analysis steps, CLI commands,
+file writing) record their wall and CPU time, the peak resident set size of
+the process, optionally traced memory, and throughput counters (e.g. parsed
+lines). The results may be written to a json report. When no instrumentation
+is started, stages cost a single check.
+"""
+
+import sys
+import time
+import json
+import platform
+import threading
+import functools
+import contextlib
+import tracemalloc
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+_active = None
+
+def _get_peak_rss():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # reported in bytes on macOS and in kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+class Stage:
+
+    """Measurements of a single instrumented stage."""
+
+    def __init__(self, name, path, depth):
+        self.name = name
+        self.path = path
+        self.depth = depth
+        self.counters = {}
+        self.wall_time = None
+        self.cpu_time = None
+        self.peak_rss = None
+        self.peak_rss_delta = None
+        self.traced_memory_delta = None
+        self.traced_memory_peak = None
+
+    def count(self, counter, value):
+        """Adds value to the stage's counter"""
+        self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def get_report(self):
+        """Returns the measurements as a json-serialisable dict"""
+        report = {
+            'name': self.name,
+            'path': self.path,
+            'depth': self.depth,
+            'wall_time': self.wall_time,
+            'cpu_time': self.cpu_time,
+            'peak_rss': self.peak_rss,
+            'peak_rss_delta': self.peak_rss_delta,
+            'counters': self.counters,
+            'rates': {'%s_per_second' % counter: value / self.wall_time
+                      for counter, value in self.counters.items()
+                      if self.wall_time},
+            }
+        if self.traced_memory_delta is not None:
+            report['traced_memory_delta'] = self.traced_memory_delta
+            report['traced_memory_peak'] = self.traced_memory_peak
+        return report
+
+class _NullStage: # pylint: disable=too-few-public-methods
+
+    def count(self, counter, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+_NULL_STAGE = _NullStage()
+
+class Instrumentation:
+
+    """
+    Records instrumented stages while started. Stages are reported in the
+    order they were entered, with paths of the enclosing stages' names.
+    With trace_memory, tracemalloc is used to measure the memory allocated
+    by each stage, which slows the profiler down considerably. Peak traced
+    memory of a stage is only available with Python 3.9 or newer.
+    """
+
+    def __init__(self, trace_memory=False):
+        self._trace_memory = trace_memory
+        self._stages = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._started = None
+        self._started_tracing = False
+
+    def start(self):
+        """Makes this instrumentation record the stages entered from now on"""
+        global _active # pylint: disable=global-statement
+        if _active is not None:
+            raise RuntimeError('Instrumentation already started')
+        if self._trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self._started = datetime.now().isoformat()
+        _active = self
+
+    def stop(self):
+        """
+        Stops recording stages. Memory tracing is only stopped if it was
+        started by this instrumentation.
+        """
+        global _active # pylint: disable=global-statement
+        if _active is self:
+            _active = None
+            if self._started_tracing:
+                tracemalloc.stop()
+                self._started_tracing = False
+
+    def _get_stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        Returns a context manager measuring the enclosed code as a stage
+        named name. The context manager returns the Stage.
+        """
+        stack = self._get_stack()
+        parent = stack[-1] if stack else None
+        current = Stage(name,
+                        parent.path + '/' + name if parent else name,
+                        len(stack))
+        with self._lock:
+            self._stages.append(current)
+        stack.append(current)
+
+        traced_memory = None
+        if self._trace_memory and tracemalloc.is_tracing():
+            traced_memory, peak = tracemalloc.get_traced_memory()
+            if hasattr(tracemalloc, 'reset_peak'):
+                if parent is not None:
+                    parent.traced_memory_peak = max(parent.traced_memory_peak or 0, peak)
+                tracemalloc.reset_peak()
+        peak_rss = _get_peak_rss()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield current
+        finally:
+            current.wall_time = time.perf_counter() - wall_start
+            current.cpu_time = time.process_time() - cpu_start
+            current.peak_rss = _get_peak_rss()
+            if peak_rss is not None:
+                current.peak_rss_delta = current.peak_rss - peak_rss
+            if traced_memory is not None and tracemalloc.is_tracing():
+                memory, peak = tracemalloc.get_traced_memory()
+                current.traced_memory_delta = memory - traced_memory
+                if hasattr(tracemalloc, 'reset_peak'):
+                    current.traced_memory_peak = max(current.traced_memory_peak or 0, peak)
+                    if parent is not None:
+                        parent.traced_memory_peak = max(parent.traced_memory_peak or 0,
+                                                        current.traced_memory_peak)
+            stack.pop()
+
+    def current_stage(self):
+        """Returns the innermost stage entered by this thread, or None"""
+        stack = self._get_stack()
+        return stack[-1] if stack else None
+
+    def get_report(self):
+        """Returns the report of the recorded stages as a json-serialisable dict"""
+        with self._lock:
+            stages = [stage.get_report() for stage in self._stages
+                      if stage.wall_time is not None]
+        return {
+            'started': self._started,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'trace_memory': self._trace_memory,
+            'stages': stages,
+            }
+
+    def write(self, path):
+        """Writes the report to a json file"""
+        with open(path, 'w') as stream:
+            json.dump(self.get_report(), stream, indent=2)
+
+def stage(name):
+    """
+    Returns a context manager measuring the enclosed code as a stage of the
+    started instrumentation, or doing nothing if none is started.
+    """
+    if _active is None:
+        return _NULL_STAGE
+    return _active.stage(name)
+
+def count(counter, value):
+    """Adds value to the counter of the innermost stage, if instrumented"""
+    if _active is not None:
+        current = _active.current_stage()
+        if current is not None:
+            current.count(counter, value)
+
+def is_active():
+    """Returns True iff an instrumentation is started"""
+    return _active is not None
+
+def instrumented(name=None, counters=None):
+    """
+    Decorates a function to be measured as a stage (named after the function
+    by default). If provided, counters is called with the function's
+    arguments when instrumented and returns a dict of counters to add.
+    """
+    def decorator(function):
+        stage_name = name or function.__name__
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _active is None:
+                return function(*args, **kwargs)
+            with _active.stage(stage_name) as current:
+                result = function(*args, **kwargs)
+                if counters is not None:
+                    for counter, value in counters(*args, **kwargs).items():
+                        current.count(counter, value)
+                return result
+        return wrapper
+    return decorator
@@ -14,6 +14,7 @@ import collections
 import functools
 from cppbuildprofiler.dependency import DependencyGraph, unify_path
 from cppbuildprofiler.analysis import Analyser
+from cppbuildprofiler import instrumentation, progress
 
 _CHANNEL_PATTERN = re.compile(r'^(\d+)>')
 
@@ -25,6 +26,9 @@ class _Channel_state:
             self.label = None
             self.attributes = {}
             self.dependencies = []
+            self.included = set()
+            self.repeated_inclusions = collections.Counter()
+            self.include_cycles = collections.Counter()
 
         def _update_dependency(self, new_label, dependency):
             parent, child = dependency
@@ -101,6 +105,19 @@ class _Channel_state:
                     child,
                     **attributes
                     )
+
+            if n.repeated_inclusions:
+                dependency_graph.set_attribute(n.label,
+                                               Analyser.Attributes.REPEATED_INCLUSIONS,
+                                               sum(n.repeated_inclusions.values()))
+            for attribute, counts in [
+                    (Analyser.Attributes.REPEATED_INCLUSIONS, n.repeated_inclusions),
+                    (Analyser.Attributes.INCLUDE_CYCLES, n.include_cycles)]:
+                for path, count in counts.items():
+                    label = self._unique_label(path, dependency_graph)
+                    logging.debug('%s included %s: %d', label, attribute, count)
+                    current = dependency_graph.get_attribute(label, attribute, 0)
+                    dependency_graph.set_attribute(label, attribute, current + count)
         self._nodes.clear()
 
     def _handle_project_call(self, project, dependency_graph):
@@ -163,6 +180,11 @@ class _Channel_state:
             self._dependency_stack.pop()
 
         parent = self._dependency_stack[-1]
+        if dependency_path in self._dependency_stack:
+            self._current_node.include_cycles[dependency_path] += 1
+        elif dependency_path in self._current_node.included:
+            self._current_node.repeated_inclusions[dependency_path] += 1
+        self._current_node.included.add(dependency_path)
         self._current_node.dependencies.append((parent, dependency_path))
         self._dependency_stack.append(dependency_path)
 
@@ -213,6 +235,7 @@ class _Channel_state:
     def end(self, dependency_graph):
         self._flush(dependency_graph)
 
+@instrumentation.instrumented()
 def parse_vs_log(build_log_path):
     """
     Parses a visual studio log pointed to by the build_log_path and returns
@@ -221,19 +244,34 @@ def parse_vs_log(build_log_path):
 
     Graph node labels are the files' basenames. If there is a duplicate name,
     it will be suffixed by "_1", "_2", etc.
+
+    Headers included more than once in a translation unit (e.g. lacking
+    include guards) and headers including themselves are counted while
+    parsing, in the "repeated inclusions" and "include cycles" attributes.
     """
     dependency_graph = DependencyGraph()
     channels = collections.defaultdict(_Channel_state)
 
-    with open(build_log_path) as f:
-        for l in f:
+    lines = 0
+    tracker = progress.track('Parsing %s' % os.path.basename(build_log_path),
+                             lambda: os.path.getsize(build_log_path), 'B')
+    with open(build_log_path) as f, tracker:
+        for lines, l in enumerate(f, 1):
+            if not lines & 0xfff:
+                # the position of the underlying binary stream is exact up to
+                # its buffer size
+                tracker.update(f.buffer.tell(), lines=lines)
             l = l.rstrip('\n')
             m = _CHANNEL_PATTERN.match(l)
             if m:
                 channel_id = int(m.group(1))
                 channels[channel_id].parse_line(l, dependency_graph)
 
+        tracker.update(f.buffer.tell(), lines=lines)
+
     for c in channels.values():
         c.end(dependency_graph)
 
+    instrumentation.count('lines', lines)
+    instrumentation.count('bytes', os.path.getsize(build_log_path))
     return dependency_graph
@@ -11,19 +11,39 @@ be imported into a spreadsheet programme for further analysis.
 
 import logging
 import os
+import sys
 import argparse
 import functools
-from cppbuildprofiler.analysis import Analyser
-from cppbuildprofiler.dependency import unify_path, DependencyGraph
-from cppbuildprofiler.parser import parse_vs_log
+from concurrent.futures import ThreadPoolExecutor
+from cppbuildprofiler.attributes import Attributes
+from cppbuildprofiler import instrumentation, progress
+
+_CSV_BUFFER_SIZE = 1 << 20
 
 def _is_thirdparty_dependency(dependency_graph, codebase_dir, parent, _):
     parent_path = dependency_graph.get_attribute(parent,
-                                                 Analyser.Attributes.ABSOLUTE_PATH,
+                                                 Attributes.ABSOLUTE_PATH,
                                                  codebase_dir)
     return os.path.commonprefix([parent_path, codebase_dir]) != codebase_dir
 
-def _profile(profile_dir, log_file, codebase_dir, column_separator):
+def _write_csv(path, name, columns, column_separator, rows):
+    from cppbuildprofiler.dependency import DependencyGraph
+    logging.info('Storing %s stats in %s', name, path)
+    # runs in a worker thread, so it's reported as a top-level stage
+    with instrumentation.stage('write_%s_csv' % name), \
+            open(path, 'w', newline='', buffering=_CSV_BUFFER_SIZE) as f:
+        DependencyGraph.print_table(f, columns, column_separator, rows)
+
+def _profile(profile_dir, log_file, codebase_dir, column_separator, sqlite=False, npz=False,
+             parquet=False, html=False, history=None, build_name=None):
+    # imported here, so that --help and argument errors don't load networkx
+    from cppbuildprofiler.analysis import Analyser
+    from cppbuildprofiler.dependency import unify_path, DependencyGraph
+    from cppbuildprofiler.export import write_sqlite, write_npz, write_parquet
+    from cppbuildprofiler.history import HistoryStore
+    from cppbuildprofiler.parser import parse_vs_log
+    from cppbuildprofiler.report import HtmlReport
+
     log_path = os.path.join(profile_dir, log_file)
     logging.info('Parsing %s', log_path)
     depgraph = parse_vs_log(log_path)
@@ -41,9 +61,11 @@ def _profile(profile_dir, log_file, codebase_dir, column_separator):
     if codebase_dir is not None:
         logging.info('Removing third-party dependencies')
         codebase_dir = unify_path(codebase_dir)
-        depgraph.remove_dependency_by_predicate(
-            functools.partial(_is_thirdparty_dependency, depgraph, codebase_dir))
-        depgraph.remove_orphans()
+        with instrumentation.stage('remove_thirdparty_dependencies') as stage:
+            depgraph.remove_dependency_by_predicate(
+                functools.partial(_is_thirdparty_dependency, depgraph, codebase_dir))
+            depgraph.remove_orphans()
+            stage.count('edges', orig_edges)
         logging.info('Cleanup done. Dependency graph now has %d nodes and %d edges '
                      '(%d nodes and %d edges removed)',
                      depgraph.number_of_nodes(),
@@ -53,24 +75,73 @@ def _profile(profile_dir, log_file, codebase_dir, column_separator):
     else:
         logging.info('Not removing third-party dependencies, as codebse_dir was not provided')
 
+    # the project metrics only count the files left in the graph
+    project_metrics = analyser.get_project_metrics()
+
     gml_path = os.path.join(profile_dir, 'graph.gml')
     logging.info('Storing the graph in %s', gml_path)
-    depgraph.write(gml_path)
-
-    root_csv_path = os.path.join(profile_dir, 'root.csv')
-    logging.info('Storing root stats in %s', root_csv_path)
-    with open(root_csv_path, 'w') as f:
-        depgraph.print_csv(f, Analyser.ROOT_COLUMNS, column_separator, [DependencyGraph.ROOT_NODE_LABEL])
-
-    top_level_csv_path = os.path.join(profile_dir, 'top_level.csv')
-    logging.info('Storing top_level stats in %s', top_level_csv_path)
-    with open(top_level_csv_path, 'w') as f:
-        depgraph.print_csv(f, Analyser.TOP_LEVEL_COLUMNS, column_separator, depgraph.get_top_level_nodes())
-
-    dependency_csv_path = os.path.join(profile_dir, 'dependency.csv')
-    logging.info('Storing dependency stats in %s', dependency_csv_path)
-    with open(dependency_csv_path, 'w') as f:
-        depgraph.print_csv(f, Analyser.INTERNAL_COLUMNS, column_separator, depgraph.get_dependency_nodes())
+    nodes = depgraph.number_of_nodes()
+    edges = depgraph.number_of_edges()
+    with instrumentation.stage('write_gml') as stage:
+        depgraph.write(gml_path)
+        stage.count('nodes', nodes)
+        stage.count('edges', edges)
+
+    if sqlite:
+        sqlite_path = os.path.join(profile_dir, 'profile.sqlite')
+        logging.info('Storing the graph and metrics in %s', sqlite_path)
+        with instrumentation.stage('write_sqlite') as stage:
+            write_sqlite(depgraph, sqlite_path)
+            stage.count('nodes', nodes)
+            stage.count('edges', edges)
+
+    if npz:
+        npz_path = os.path.join(profile_dir, 'metrics.npz')
+        logging.info('Storing metric columns in %s', npz_path)
+        with instrumentation.stage('write_npz') as stage:
+            write_npz(depgraph, npz_path, os.path.join(profile_dir, 'adjacency.npz'))
+            stage.count('nodes', nodes)
+            stage.count('edges', edges)
+
+    if parquet:
+        parquet_path = os.path.join(profile_dir, 'metrics.parquet')
+        logging.info('Storing metric columns in %s', parquet_path)
+        with instrumentation.stage('write_parquet') as stage:
+            write_parquet(depgraph, parquet_path)
+            stage.count('nodes', nodes)
+
+    if history:
+        logging.info('Adding the build to the history in %s', history)
+        with instrumentation.stage('add_history_build') as stage, HistoryStore(history) as store:
+            added_nodes, added_edges = store.add_build(depgraph, build_name)
+            stage.count('nodes', nodes)
+            stage.count('edges', edges)
+        logging.info('%d nodes added or changed and %d dependencies added since the previous '
+                     'build',
+                     added_nodes, added_edges)
+
+    if html:
+        report_path = os.path.join(profile_dir, 'report')
+        logging.info('Storing the HTML report in %s', report_path)
+        with instrumentation.stage('write_html') as stage:
+            HtmlReport(depgraph).write(report_path)
+            stage.count('nodes', nodes)
+
+    tables = [
+        ('root', Analyser.ROOT_COLUMNS, depgraph.get_rows([DependencyGraph.ROOT_NODE_LABEL])),
+        ('top_level', Analyser.TOP_LEVEL_COLUMNS,
+         depgraph.get_rows(depgraph.get_top_level_nodes())),
+        ('dependency', Analyser.INTERNAL_COLUMNS,
+         depgraph.get_rows(depgraph.get_dependency_nodes())),
+        ('project', Analyser.PROJECT_COLUMNS, project_metrics),
+        ]
+    with instrumentation.stage('write_csv'), \
+            ThreadPoolExecutor(max_workers=len(tables)) as executor:
+        futures = [executor.submit(_write_csv, os.path.join(profile_dir, name + '.csv'),
+                                   name, columns, column_separator, rows)
+                   for name, columns, rows in tables]
+        for future in futures:
+            future.result()
 
 def main(args=None):
     logging.basicConfig(level=logging.INFO)
@@ -100,9 +171,66 @@ def main(args=None):
         help='column separator (defaults to ",")',
         default=',')
 
+    parser.add_argument(
+        '--sqlite',
+        action='store_true',
+        help='also store the graph and metrics in a profile.sqlite database')
+    parser.add_argument(
+        '--npz',
+        action='store_true',
+        help='also store metric columns in metrics.npz and the edges in adjacency.npz')
+    parser.add_argument(
+        '--parquet',
+        action='store_true',
+        help='also store metric columns in metrics.parquet (requires pyarrow)')
+    parser.add_argument(
+        '--html',
+        action='store_true',
+        help='also generate a static HTML report in the report directory')
+    parser.add_argument(
+        '--history',
+        action='store',
+        help='path to a build history database (created if missing) to add the build to')
+    parser.add_argument(
+        '--build-name',
+        action='store',
+        help='name of the build in the --history database (defaults to the current time)')
+    parser.add_argument(
+        '--instrument',
+        action='store_true',
+        help='measure the time and memory used by each stage of profiling and store them '
+             'in instrumentation.json')
+    parser.add_argument(
+        '--trace-memory',
+        action='store_true',
+        help='with --instrument, also measure the memory allocated by each stage with '
+             'tracemalloc (slows profiling down)')
+    parser.add_argument(
+        '--no-progress',
+        action='store_true',
+        help="don't print the progress of parsing and analysis (it's only printed when "
+             "stderr is a terminal)")
+
     opts = parser.parse_args(args)
 
-    _profile(opts.profile_dir, opts.log_file, opts.codebase_dir, opts.column_separator)
+    if not opts.no_progress and sys.stderr.isatty():
+        progress.add_terminal_renderer()
+
+    recorder = None
+    if opts.instrument:
+        recorder = instrumentation.Instrumentation(opts.trace_memory)
+        recorder.start()
+    try:
+        with instrumentation.stage('profile'):
+            _profile(opts.profile_dir, opts.log_file, opts.codebase_dir,
+                     opts.column_separator, opts.sqlite, opts.npz, opts.parquet, opts.html,
+                     opts.history, opts.build_name)
+    finally:
+        if recorder is not None:
+            recorder.stop()
+            instrumentation_path = os.path.join(opts.profile_dir, 'instrumentation.json')
+            logging.info('Storing instrumentation report in %s', instrumentation_path)
+            recorder.write(instrumentation_path)
 
 if __name__ == '__main__':
     main()
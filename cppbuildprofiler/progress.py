@@ -0,0 +1,204 @@
+# Copyright (c) Techland. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+
+"""
+Contains progress reporting of long tasks, like parsing large logs and the
+analysis steps. Tasks report progress to the registered callbacks, e.g. a
+TerminalRenderer, at most every REPORT_INTERVAL seconds. Tasks check the
+clock only every so many updates, so updating progress in loops costs an
+attribute assignment and a comparison. When no callbacks are registered,
+tracking progress costs nothing.
+"""
+
+import sys
+import time
+import logging
+from collections import namedtuple
+
+REPORT_INTERVAL = 0.5
+
+ProgressState = namedtuple('ProgressState', ['task', 'done', 'total', 'unit', 'counters',
+                                             'elapsed', 'rate', 'eta', 'finished'])
+ProgressState.__doc__ = """
+Progress of a task passed to the callbacks. total and eta are None if the
+task size is unknown, rate is in units per second and eta in seconds.
+counters are additional counters (e.g. parsed lines) reported by the task.
+"""
+
+_callbacks = []
+
+def add_callback(callback):
+    """Registers a function called with the ProgressState of running tasks"""
+    _callbacks.append(callback)
+
+def remove_callback(callback):
+    """Unregisters a callback registered with add_callback"""
+    _callbacks.remove(callback)
+
+class _NullTracker:
+
+    def update(self, done, **counters):
+        pass
+
+    def finish(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+_NULL_TRACKER = _NullTracker()
+
+class Tracker:
+
+    """
+    Tracks the progress of a single task. Call update with the amount of
+    work done so far and finish (or use the tracker as a context manager)
+    when the task ends.
+    """
+
+    def __init__(self, task, total, unit, callbacks):
+        self._task = task
+        self._total = total
+        self._unit = unit
+        self._callbacks = callbacks
+        self._done = 0
+        self._counters = {}
+        self._start = time.perf_counter()
+        self._last_report = self._start
+        self._next_check = 1
+
+    def update(self, done, **counters):
+        """Sets the amount of work done and the additional counters"""
+        self._done = done
+        if counters:
+            self._counters = counters
+        if done >= self._next_check:
+            self._check()
+
+    def _check(self):
+        now = time.perf_counter()
+        elapsed = now - self._start
+        # check the clock about ten times per report interval
+        per_check = self._done / elapsed * REPORT_INTERVAL / 10 if elapsed > 0 else 1
+        self._next_check = self._done + max(int(per_check), 1)
+        if now - self._last_report >= REPORT_INTERVAL:
+            self._last_report = now
+            self._report(elapsed, False)
+
+    def _report(self, elapsed, finished):
+        rate = self._done / elapsed if elapsed > 0 else None
+        eta = None
+        if self._total is not None and rate:
+            eta = max(self._total - self._done, 0) / rate
+        state = ProgressState(self._task, self._done, self._total, self._unit,
+                              dict(self._counters), elapsed, rate, eta, finished)
+        for callback in self._callbacks:
+            callback(state)
+
+    def finish(self):
+        """Reports the task as finished"""
+        self._report(time.perf_counter() - self._start, True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.finish()
+
+def track(task, total=None, unit='items'):
+    """
+    Returns a Tracker reporting the progress of the task to the registered
+    callbacks. total is the amount of work to do, or a function returning
+    it, called only if there are any callbacks.
+    """
+    if not _callbacks:
+        return _NULL_TRACKER
+    if callable(total):
+        total = total()
+    return Tracker(task, total, unit, list(_callbacks))
+
+def _format_amount(amount, unit):
+    if unit == 'B':
+        amount = float(amount)
+        for prefix in ['', 'K', 'M', 'G']:
+            if amount < 1000.0 or prefix == 'G':
+                break
+            amount /= 1000.0
+        return '%.1f %sB' % (amount, prefix)
+    return '%d %s' % (amount, unit)
+
+def _format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return '%d:%02d:%02d' % (hours, minutes, seconds)
+
+class TerminalRenderer:
+
+    """
+    Progress callback rewriting a single status line on a terminal stream
+    (stderr by default). Tasks finishing before their first report aren't
+    printed. The renderer is also a logging filter, added to handlers
+    writing to the same stream it clears the status line before each
+    record.
+    """
+
+    def __init__(self, stream=None):
+        self._stream = stream or sys.stderr
+        self._width = 0
+
+    @staticmethod
+    def format(state):
+        """Returns the progress as a line of text"""
+        parts = [_format_amount(state.done, state.unit)]
+        if state.total:
+            parts[0] += ' / %s (%.1f%%)' % (_format_amount(state.total, state.unit),
+                                            100.0 * state.done / state.total)
+        if state.rate is not None:
+            parts.append('%s/s' % _format_amount(state.rate, state.unit))
+        for counter, value in sorted(state.counters.items()):
+            text = '%d %s' % (value, counter)
+            if state.elapsed > 0:
+                text += ' (%d/s)' % (value / state.elapsed)
+            parts.append(text)
+        if state.finished:
+            parts.append('done in %s' % _format_duration(state.elapsed))
+        elif state.eta is not None:
+            parts.append('ETA %s' % _format_duration(state.eta))
+        return '%s: %s' % (state.task, ', '.join(parts))
+
+    def __call__(self, state):
+        if state.finished and not self._width:
+            return
+        line = self.format(state)
+        self._stream.write('\r' + line.ljust(self._width))
+        self._width = len(line)
+        if state.finished:
+            self._stream.write('\n')
+            self._width = 0
+        self._stream.flush()
+
+    def clear(self):
+        """Erases the status line, the next report writes it again"""
+        if self._width:
+            self._stream.write('\r' + ' ' * self._width + '\r')
+            self._stream.flush()
+            self._width = 0
+
+    def filter(self, record):
+        self.clear()
+        return True
+
+def add_terminal_renderer(stream=None):
+    """
+    Registers a TerminalRenderer writing to stream (stderr by default) and
+    adds it as a filter of the root logger's handlers, so log records don't
+    get written over the status line.
+    """
+    renderer = TerminalRenderer(stream)
+    add_callback(renderer)
+    for handler in logging.getLogger().handlers:
+        handler.addFilter(renderer)
+    return renderer
@@ -0,0 +1,222 @@
+# Copyright (c) Techland. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+
+"""
+Contains the Query class, filtering and ordering rows of metrics before they
+get printed.
+"""
+
+import re
+import heapq
+import operator
+
+_TOKEN_REGEX = re.compile(r'''\s*(?:
+    (?P<paren>[()])|
+    (?P<operator>==|!=|<=|>=|=~|<|>)|
+    (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')|
+    (?P<word>[^\s()=!<>~"']+)
+    )''', re.VERBOSE)
+
+_COMPARISONS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    }
+
+_KEYWORDS = frozenset(['and', 'or', 'not'])
+
+def _tokenise(expression):
+    tokens = []
+    position = 0
+    expression = expression.rstrip()
+    while position < len(expression):
+        match = _TOKEN_REGEX.match(expression, position)
+        if match is None or match.end() == position:
+            raise RuntimeError('Invalid where expression, unexpected character at %d: %s' %
+                               (position, expression))
+        kind = match.lastgroup
+        text = match.group(kind)
+        if kind == 'string':
+            kind = 'value'
+            text = re.sub(r'\\(.)', r'\1', text[1:-1])
+        elif kind == 'word':
+            kind = 'keyword' if text in _KEYWORDS else 'word'
+        tokens.append((kind, text))
+        position = match.end()
+    return tokens
+
+def _to_number(text):
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+def _compile_comparison(key, comparison, text, defaults):
+    default = defaults.get(key)
+    if comparison == '=~':
+        try:
+            regex = re.compile(text)
+        except re.error as err:
+            raise RuntimeError('Invalid regular expression "%s": %s' % (text, err))
+        return lambda label, attributes: regex.search(
+            str(label if key == 'label' else attributes.get(key, default))) is not None
+
+    compare = _COMPARISONS[comparison]
+    number = _to_number(text)
+    def evaluate(label, attributes):
+        value = label if key == 'label' else attributes.get(key, default)
+        if number is not None and isinstance(value, (int, float)):
+            return compare(value, number)
+        return compare(str(value), text)
+    return evaluate
+
+class _WhereParser:
+
+    """
+    Recursive descent parser of where expressions:
+        expression := conjunction ('or' conjunction)*
+        conjunction := negation ('and' negation)*
+        negation := 'not' negation | '(' expression ')' | KEY OPERATOR VALUE
+    """
+
+    def __init__(self, expression, defaults):
+        self._expression = expression
+        self._tokens = _tokenise(expression)
+        self._position = 0
+        self._defaults = defaults
+
+    def _peek(self):
+        if self._position < len(self._tokens):
+            return self._tokens[self._position]
+        return (None, None)
+
+    def _next(self, expected_kind=None):
+        token = self._peek()
+        if token[0] is None or (expected_kind is not None and token[0] != expected_kind):
+            raise RuntimeError('Invalid where expression, expected %s at token %d: %s' %
+                               (expected_kind or 'more tokens', self._position,
+                                self._expression))
+        self._position += 1
+        return token
+
+    def parse(self):
+        predicate = self._parse_expression()
+        if self._position != len(self._tokens):
+            raise RuntimeError('Invalid where expression, unexpected "%s": %s' %
+                               (self._peek()[1], self._expression))
+        return predicate
+
+    def _parse_expression(self):
+        operands = [self._parse_conjunction()]
+        while self._peek() == ('keyword', 'or'):
+            self._next()
+            operands.append(self._parse_conjunction())
+        if len(operands) == 1:
+            return operands[0]
+        return lambda label, attributes: any(operand(label, attributes) for operand in operands)
+
+    def _parse_conjunction(self):
+        operands = [self._parse_negation()]
+        while self._peek() == ('keyword', 'and'):
+            self._next()
+            operands.append(self._parse_negation())
+        if len(operands) == 1:
+            return operands[0]
+        return lambda label, attributes: all(operand(label, attributes) for operand in operands)
+
+    def _parse_negation(self):
+        token = self._peek()
+        if token == ('keyword', 'not'):
+            self._next()
+            operand = self._parse_negation()
+            return lambda label, attributes: not operand(label, attributes)
+        if token == ('paren', '('):
+            self._next()
+            predicate = self._parse_expression()
+            if self._next('paren')[1] != ')':
+                raise RuntimeError('Invalid where expression, expected ")": %s' %
+                                   self._expression)
+            return predicate
+        key = self._next('word')[1]
+        comparison = self._next('operator')[1]
+        kind, text = self._next()
+        if kind not in ('word', 'value'):
+            raise RuntimeError('Invalid where expression, expected a value after %s %s: %s' %
+                               (key, comparison, self._expression))
+        return _compile_comparison(key, comparison, text, self._defaults)
+
+class Query:
+
+    """
+    Selects and orders (label, attributes) rows, as printed by
+    DependencyGraph.print_table.
+
+    where is an expression like 'project == core and buildtime > 100' built
+    of comparisons (==, !=, <, <=, >, >= and =~ for regular expression
+    search) joined with "and", "or", "not" and parentheses. The left side of
+    a comparison is an attribute key or "label", the right side a number, a
+    word or a quoted string. Numbers are compared numerically with numeric
+    attributes, everything else is compared as strings. Missing attributes
+    take their value from defaults.
+
+    Rows are sorted by the sort attribute key (or "label"), descending
+    unless ascending is set, rows without the attribute (and without a
+    default) come last. If defaults are provided, sort must be one of their
+    keys or "label". If top is set, only the top rows by sort are selected
+    with a heap, without sorting all of them.
+    """
+
+    def __init__(self, where=None, label_regex=None, sort=None, top=None, ascending=False,
+                 defaults=None):
+        if (sort is not None and sort != 'label' and defaults is not None and
+                sort not in defaults):
+            raise RuntimeError('Unknown column to sort by: %s (expected "label" or one of: %s)' %
+                               (sort, ', '.join(defaults)))
+        self._defaults = defaults or {}
+        self._where = _WhereParser(where, self._defaults).parse() if where else None
+        self._label_regex = re.compile(label_regex) if label_regex else None
+        self._sort = sort
+        self._top = top
+        self._ascending = ascending
+
+    def _matches(self, label, attributes):
+        if self._label_regex is not None and not self._label_regex.search(label):
+            return False
+        return self._where is None or self._where(label, attributes)
+
+    def select(self, rows):
+        """
+        Returns a list of the rows (label, attributes pairs) matching the
+        query, in the requested order.
+        """
+        rows = (row for row in rows if self._matches(*row))
+        if self._sort is None:
+            if self._top is None:
+                return list(rows)
+            return [row for _, row in zip(range(self._top), rows)]
+
+        if self._sort == 'label':
+            key = operator.itemgetter(0)
+            missing = []
+        else:
+            default = self._defaults.get(self._sort)
+            def key(row):
+                return row[1].get(self._sort, default)
+            # None can't be compared, so rows without values come last
+            rows = list(rows)
+            missing = [row for row in rows if key(row) is None]
+            if missing:
+                rows = [row for row in rows if key(row) is not None]
+
+        if self._top is None:
+            selected = sorted(rows, key=key, reverse=not self._ascending)
+        elif self._ascending:
+            selected = heapq.nsmallest(self._top, rows, key=key)
+        else:
+            selected = heapq.nlargest(self._top, rows, key=key)
+        if self._top is not None:
+            missing = missing[:self._top - len(selected)]
+        return selected + missing
@@ -0,0 +1,367 @@
+# Copyright (c) Techland. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+
+"""
+Contains the Recommender class, proposing build setup changes based on an
+analysed dependency graph.
+"""
+
+import logging
+import heapq
+import random
+import zlib
+from collections import defaultdict, namedtuple
+import numpy as np
+from cppbuildprofiler.analysis import Analyser
+
+_MINHASH_PRIME = (1 << 61) - 1
+
+class Recommender:
+
+    """
+    Proposes build setup changes (precompiled-header contents, unity build
+    batches) for an analysed dependency graph. Costs of individual files are taken from the
+    self cost metric if calculated, otherwise they are estimated from file
+    sizes and the average build time per compiled byte.
+    """
+
+    PchRecommendation = namedtuple('PchRecommendation', [
+        'project', 'translation_units', 'headers', 'contents', 'size', 'saved_build_time'])
+
+    UnityBatch = namedtuple('UnityBatch', [
+        'project', 'index', 'translation_units', 'total_size', 'size_reduction',
+        'saved_build_time'])
+
+    def __init__(self, dependency_graph, analyser=None):
+        self._dependency_graph = dependency_graph
+        self._analyser = analyser or Analyser(dependency_graph)
+        self._build_time_per_byte = None
+        self._dependency_matrix = None
+
+    def build_indexes(self):
+        """
+        Builds the indexes otherwise built by the first recommendation (the
+        condensation of the graph, its sparse adjacency matrix, the average
+        build time per byte), so that the recommender may be shared by
+        threads. The dependency graph must not be modified afterwards.
+        """
+        self._analyser.get_condensation()
+        self._get_dependency_matrix()
+        self._get_build_time_per_byte()
+
+    def _get_dependency_matrix(self):
+        # labels of the graph (without the root), their indices and the
+        # adjacency matrix of the dependencies, for traversals in scipy
+        if self._dependency_matrix is None:
+            from scipy.sparse import csr_matrix
+            labels = list(self._dependency_graph.get_nodes())
+            index = {label: i for i, label in enumerate(labels)}
+            rows = []
+            columns = []
+            for label in labels:
+                for dependency in self._dependency_graph.get_node_immediate_dependencies(label):
+                    rows.append(index[label])
+                    columns.append(index[dependency])
+            matrix = csr_matrix((np.ones(len(rows), dtype=np.int8), (rows, columns)),
+                                shape=(len(labels), len(labels)))
+            self._dependency_matrix = (labels, index, matrix)
+        return self._dependency_matrix
+
+    @staticmethod
+    def _reachable(origins, get_neighbours, allowed):
+        # labels reachable from the origins (included) through allowed labels
+        reached = set(origins)
+        stack = list(reached)
+        while stack:
+            for neighbour in get_neighbours(stack.pop()):
+                if neighbour not in reached and allowed(neighbour):
+                    reached.add(neighbour)
+                    stack.append(neighbour)
+        return reached
+
+    def _get_cost(self, label):
+        cost = self._dependency_graph.get_attribute(label, Analyser.Attributes.SELF_COST)
+        if cost is not None:
+            return cost
+        return self._get_build_time_per_byte() * self._dependency_graph.get_attribute(
+            label, Analyser.Attributes.FILE_SIZE, 0)
+
+    def _get_build_time_per_byte(self):
+        if self._build_time_per_byte is None:
+            total_time = 0.0
+            total_size = 0
+            for top_level in self._dependency_graph.get_top_level_nodes():
+                total_time += self._dependency_graph.get_attribute(
+                    top_level, Analyser.Attributes.BUILD_TIME, 0.0)
+                total_size += self._dependency_graph.get_attribute(
+                    top_level, Analyser.Attributes.TOTAL_SIZE, 0)
+            self._build_time_per_byte = (total_time / total_size) if total_size > 0 else 0.0
+        return self._build_time_per_byte
+
+    def _get_project_translation_units(self):
+        project_translation_units = defaultdict(list)
+        for top_level in self._dependency_graph.get_top_level_nodes():
+            if self._dependency_graph.get_attribute(top_level, Analyser.Attributes.CREATED_PCH):
+                continue
+            project = self._dependency_graph.get_attribute(top_level, Analyser.Attributes.PROJECT,
+                                                           Analyser.UNKNOWN_PROJECT_NAME)
+            project_translation_units[project].append(top_level)
+        return project_translation_units
+
+    def _recommend_project_pch(self, project, translation_units, size_budget, max_headers,
+                               include_own_headers):
+        from scipy.sparse.csgraph import breadth_first_order
+        labels, index, matrix = self._get_dependency_matrix()
+        frequencies = np.zeros(len(labels), dtype=np.int64)
+        for top_level in translation_units:
+            frequencies[breadth_first_order(matrix, index[top_level],
+                                            return_predecessors=False)] += 1
+            frequencies[index[top_level]] -= 1
+        project_labels = [labels[i] for i in np.flatnonzero(frequencies)]
+        values = np.zeros(len(labels), dtype=float)
+        sizes = np.zeros(len(labels), dtype=np.int64)
+        for label in project_labels:
+            values[index[label]] = frequencies[index[label]] * self._get_cost(label)
+            sizes[index[label]] = self._dependency_graph.get_attribute(
+                label, Analyser.Attributes.FILE_SIZE, 0)
+        dependencies = {label: list(self._dependency_graph.get_node_immediate_dependencies(label))
+                        for label in project_labels}
+        dependants = {label: [] for label in project_labels}
+        for label, label_dependencies in dependencies.items():
+            for dependency in label_dependencies:
+                dependants[dependency].append(label)
+
+        candidates = set(project_labels)
+        if not include_own_headers:
+            # headers depending on an own header are skipped too
+            own_headers = [label for label in project_labels
+                           if self._dependency_graph.get_attribute(
+                               label, Analyser.Attributes.PROJECT) == project]
+            candidates -= self._reachable(own_headers, dependants.__getitem__,
+                                          lambda dependant: True)
+
+        contents = set()
+        in_contents = np.zeros(len(labels), dtype=bool)
+
+        def evaluate(label):
+            # marginal gain and size of adding the closure of the label
+            closure = breadth_first_order(matrix, index[label], return_predecessors=False)
+            closure = closure[~in_contents[closure]]
+            return [values[closure].sum().item(), sizes[closure].sum().item(), 0]
+
+        # lazy greedy: a candidate's gain and size when it was evaluated,
+        # and the bytes since added to the pch by headers sharing files
+        # with it. Gains only fall as the pch grows, but sizes fall too, so
+        # the gain per byte of a candidate whose closure got added to may
+        # grow. Such candidates are queued with an upper bound, assuming
+        # all these bytes came from their closure, and only evaluated again
+        # when that bound gets on top.
+        marginals = {}
+        evaluated = set()
+        versions = defaultdict(int)
+        heap = []
+
+        def push(label):
+            gain, size, shared_size = marginals[label]
+            if label not in evaluated:
+                size = max(sizes[index[label]].item(), size - shared_size)
+            if gain > 0.0 and total_size + size <= size_budget:
+                heapq.heappush(heap, (-gain / max(size, 1), label, versions[label]))
+
+        total_size = 0
+        for label in candidates:
+            marginals[label] = evaluate(label)
+            evaluated.add(label)
+            push(label)
+
+        headers = []
+        saved_build_time = 0.0
+        while heap and (max_headers is None or len(headers) < max_headers):
+            _, label, version = heapq.heappop(heap)
+            if label in contents or version != versions[label]:
+                continue
+            if label not in evaluated:
+                marginals[label] = evaluate(label)
+                evaluated.add(label)
+                versions[label] += 1
+                push(label)
+                continue
+            gain, size, _ = marginals[label]
+            if total_size + size > size_budget:
+                continue
+            headers.append(label)
+            total_size += size
+            saved_build_time += gain
+
+            added = self._reachable([label], dependencies.__getitem__,
+                                    lambda dependency: dependency not in contents)
+            contents |= added
+            in_contents[[index[dependency] for dependency in added]] = True
+            # only the candidates including added files have their gains
+            # and sizes changed, they're queued again with their bounds
+            for dependant in self._reachable(added, dependants.__getitem__,
+                                             lambda dependant: dependant not in contents) - added:
+                if dependant in marginals:
+                    marginals[dependant][2] += size
+                    evaluated.discard(dependant)
+                    versions[dependant] += 1
+                    push(dependant)
+
+        return self.PchRecommendation(project, len(translation_units), headers,
+                                      sorted(contents), total_size, saved_build_time)
+
+    def recommend_pch_contents(self, size_budget, max_headers=None, include_own_headers=False,
+                               projects=None):
+        """
+        Proposes the headers to put in the precompiled header of each project.
+        The estimated build time saved by precompiling a set of files is the
+        sum, over the files, of the number of project translation units
+        including it times its cost. Precompiling a header means precompiling
+        all its dependencies too, so headers are chosen greedily by the saved
+        time per byte they add to the pch, until size_budget (in bytes) or
+        max_headers is reached. Choices are evaluated lazily: after a header
+        is chosen, only the headers sharing files with it get their bounds
+        updated, and are evaluated again when these get on top. Headers of the project itself change most
+        often and would trigger a rebuild of the whole project, so they
+        (and headers depending on them) are skipped unless
+        include_own_headers is True.
+
+        Returns a list of PchRecommendation tuples, one per project (or per
+        project listed in projects).
+        """
+        logging.info('Recommending precompiled header contents...')
+        recommendations = []
+        for project, translation_units in sorted(self._get_project_translation_units().items()):
+            if projects is not None and project not in projects:
+                continue
+            recommendation = self._recommend_project_pch(project, translation_units, size_budget,
+                                                         max_headers, include_own_headers)
+            logging.debug('Recommended pch for %s: %s', project, recommendation)
+            recommendations.append(recommendation)
+        return recommendations
+
+    @classmethod
+    def _minhash_signatures(cls, sets, signature_size):
+        generator = random.Random(signature_size)
+        multipliers = np.array([generator.randrange(1, 1 << 31) for _ in range(signature_size)],
+                               dtype=np.uint64)
+        increments = np.array([generator.randrange(0, 1 << 31) for _ in range(signature_size)],
+                              dtype=np.uint64)
+        signatures = np.full((len(sets), signature_size), np.iinfo(np.uint64).max,
+                             dtype=np.uint64)
+        for row, labels in enumerate(sets):
+            if labels:
+                elements = np.array([zlib.crc32(label.encode('utf-8')) for label in labels],
+                                    dtype=np.uint64)
+                hashes = (np.outer(multipliers, elements) + increments[:, None]) % _MINHASH_PRIME
+                signatures[row] = hashes.min(axis=1)
+        return signatures
+
+    @classmethod
+    def _lsh_neighbours(cls, signatures, bands):
+        rows = signatures.shape[1] // bands
+        neighbours = defaultdict(set)
+        for band in range(bands):
+            buckets = defaultdict(list)
+            for index, signature in enumerate(signatures[:, band * rows:(band + 1) * rows]):
+                buckets[signature.tobytes()].append(index)
+            for bucket in buckets.values():
+                if len(bucket) > 1:
+                    for index in bucket:
+                        neighbours[index].update(bucket)
+        for index, indices in neighbours.items():
+            indices.discard(index)
+        return neighbours
+
+    def _batch_project(self, project, translation_units, max_batch_size, max_batch_build_time,
+                       signature_size, bands):
+        closures = [frozenset(self._analyser.get_translation_unit_dependencies(top_level))
+                    for top_level in translation_units]
+        build_times = [self._dependency_graph.get_attribute(top_level,
+                                                            Analyser.Attributes.BUILD_TIME, 0.0)
+                       for top_level in translation_units]
+        signatures = self._minhash_signatures(closures, signature_size)
+        neighbours = self._lsh_neighbours(signatures, bands)
+
+        def similarity(first, second):
+            return np.count_nonzero(signatures[first] == signatures[second])
+
+        def file_size(label):
+            return self._dependency_graph.get_attribute(label, Analyser.Attributes.FILE_SIZE, 0)
+
+        assigned = set()
+        batches = []
+        seeds = sorted(range(len(translation_units)), key=lambda index: -len(closures[index]))
+        for seed in seeds:
+            if seed in assigned:
+                continue
+            batch = [seed]
+            assigned.add(seed)
+            batch_build_time = build_times[seed]
+            candidates = set(neighbours[seed]) - assigned
+            while candidates and len(batch) < max_batch_size:
+                best = max(candidates, key=lambda index: (similarity(seed, index), -index))
+                candidates.discard(best)
+                if max_batch_build_time is not None and \
+                        batch_build_time + build_times[best] > max_batch_build_time:
+                    continue
+                batch.append(best)
+                assigned.add(best)
+                batch_build_time += build_times[best]
+                candidates |= neighbours[best] - assigned
+
+            separate_size = 0
+            counts = defaultdict(int)
+            for index in batch:
+                separate_size += file_size(translation_units[index])
+                for label in closures[index]:
+                    separate_size += file_size(label)
+                    counts[label] += 1
+            total_size = sum(file_size(translation_units[index]) for index in batch) + \
+                sum(file_size(label) for label in counts)
+            saved_build_time = sum(self._get_cost(label) * (count - 1)
+                                   for label, count in counts.items())
+            batches.append(self.UnityBatch(project, len(batches),
+                                           sorted(translation_units[index] for index in batch),
+                                           total_size, separate_size - total_size,
+                                           saved_build_time))
+        return batches
+
+    def recommend_unity_batches(self, max_batch_size, max_batch_build_time=None,
+                                signature_size=64, bands=16, projects=None):
+        """
+        Groups the translation units of each project into unity (jumbo) build
+        batches of at most max_batch_size files and max_batch_build_time
+        seconds of summed build time. Only files using the same precompiled
+        header (or none) are batched together, as a unity file is compiled
+        with a single one. Files sharing the most dependencies are
+        batched together, as these are compiled once per batch instead of
+        once per file. Similar files are found using MinHash signatures of
+        the compiled dependency sets and locality-sensitive hashing with the
+        provided number of bands, so only likely-similar pairs are compared.
+
+        Returns a list of UnityBatch tuples with the projected reduction of
+        compiled bytes and the build time saved on compiling dependencies
+        once per batch.
+        """
+        logging.info('Recommending unity build batches...')
+        if signature_size % bands != 0:
+            raise RuntimeError('Signature size %d is not divisible by the number of bands %d' %
+                               (signature_size, bands))
+        batches = []
+        for project, translation_units in sorted(self._get_project_translation_units().items()):
+            if projects is not None and project not in projects:
+                continue
+            pch_translation_units = defaultdict(list)
+            for top_level in translation_units:
+                use_pch = self._dependency_graph.get_attribute(top_level,
+                                                               Analyser.Attributes.USED_PCH, '')
+                pch_translation_units[use_pch].append(top_level)
+            project_batches = []
+            for use_pch in sorted(pch_translation_units):
+                project_batches.extend(self._batch_project(
+                    project, sorted(pch_translation_units[use_pch]), max_batch_size,
+                    max_batch_build_time, signature_size, bands))
+            batches.extend(batch._replace(index=index)
+                           for index, batch in enumerate(project_batches))
+        return batches
@@ -0,0 +1,308 @@
+# Copyright (c) Techland. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+
+"""
+Contains the HtmlReport class, writing a static HTML report of an analysed
+dependency graph that can be opened in a browser without a server.
+"""
+
+import os
+import json
+import logging
+import heapq
+from xml.sax.saxutils import escape
+from cppbuildprofiler.analysis import Analyser
+from cppbuildprofiler.dependency import DependencyGraph
+
+_PAGE_TEMPLATE = '''<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>C++ build profile</title>
+<style>
+body {{ font-family: sans-serif; font-size: 13px; margin: 1em 2em; }}
+table {{ border-collapse: collapse; margin-bottom: 0.5em; }}
+th, td {{ border: 1px solid #ccc; padding: 2px 6px; text-align: right; }}
+th {{ background: #eee; cursor: pointer; }}
+th.sorted {{ background: #cde; }}
+th.fixed {{ cursor: default; }}
+td:first-child, td:nth-child(2) {{ text-align: left; }}
+tr.viewable {{ cursor: pointer; }}
+tr.viewable:hover {{ background: #f4f4ff; }}
+.view {{ margin: 0.5em 0 1.5em 0; }}
+</style>
+</head>
+<body>
+<h1>C++ build profile</h1>
+<h2>Summary</h2>
+<table id="summary"></table>
+{sections}
+<script>
+var report = {meta};
+var chunks = {{}};
+var waiting = {{}};
+var cbpReport = {{
+    load: function(name, data) {{
+        chunks[name] = data;
+        (waiting[name] || []).forEach(function(callback) {{ callback(data); }});
+        delete waiting[name];
+    }}
+}};
+function fetchChunk(name, callback) {{
+    if (name in chunks) {{
+        callback(chunks[name]);
+    }} else if (name in waiting) {{
+        waiting[name].push(callback);
+    }} else {{
+        waiting[name] = [callback];
+        var script = document.createElement('script');
+        script.src = 'data/' + name + '.js';
+        document.head.appendChild(script);
+    }}
+}}
+function format(value) {{
+    if (typeof value === 'number') {{
+        return value.toLocaleString();
+    }}
+    return String(value).replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;');
+}}
+function showTable(tableName, sort, page) {{
+    var table = report.tables[tableName];
+    var sortInfo = table.sorts[sort];
+    var pages = Math.max(1, Math.ceil(sortInfo.rows / table.pageSize));
+    fetchChunk(tableName + '.' + sort + '.' + page, function(rows) {{
+        var element = document.getElementById(tableName);
+        var html = '<tr>' + table.columns.map(function(column, index) {{
+            var key = table.keys[index];
+            if (!(key in table.sorts)) {{
+                return '<th class="fixed">' + column + '</th>';
+            }}
+            return '<th data-sort="' + key + '"' +
+                (key === sort ? ' class="sorted"' : '') + '>' + column + '</th>';
+        }}).join('') + '</tr>';
+        rows.forEach(function(row) {{
+            var view = table.views[row[0]];
+            html += '<tr' + (view !== undefined ? ' class="viewable" data-view="' + view + '"' : '') +
+                '>' + row.map(function(value) {{
+                    return '<td>' + format(value) + '</td>';
+                }}).join('') + '</tr>';
+        }});
+        element.innerHTML = html;
+        element.querySelectorAll('th[data-sort]').forEach(function(header) {{
+            header.onclick = function() {{ showTable(tableName, header.dataset.sort, 0); }};
+        }});
+        element.querySelectorAll('tr[data-view]').forEach(function(tableRow) {{
+            tableRow.onclick = function() {{
+                fetchChunk('view.' + tableRow.dataset.view, function(svg) {{
+                    document.getElementById(tableName + '-view').innerHTML = svg;
+                }});
+            }};
+        }});
+        var navigation = document.getElementById(tableName + '-pages');
+        navigation.innerHTML = 'page ' + (page + 1) + ' of ' + pages + ' (' +
+            sortInfo.rows + ' of ' + table.rows + ' rows when sorted by this column) ';
+        if (page > 0) {{
+            var previous = document.createElement('button');
+            previous.textContent = 'previous';
+            previous.onclick = function() {{ showTable(tableName, sort, page - 1); }};
+            navigation.appendChild(previous);
+        }}
+        if (page + 1 < pages) {{
+            var next = document.createElement('button');
+            next.textContent = 'next';
+            next.onclick = function() {{ showTable(tableName, sort, page + 1); }};
+            navigation.appendChild(next);
+        }}
+    }});
+}}
+document.getElementById('summary').innerHTML = report.summary.map(function(row) {{
+    return '<tr><th class="fixed">' + row[0] + '</th><td>' + format(row[1]) + '</td></tr>';
+}}).join('');
+Object.keys(report.tables).forEach(function(tableName) {{
+    showTable(tableName, report.tables[tableName].defaultSort, 0);
+}});
+</script>
+</body>
+</html>
+'''
+
+_SECTION_TEMPLATE = '''<h2>{title}</h2>
+<div id="{name}-pages"></div>
+<table id="{name}"></table>
+<div class="view" id="{name}-view"></div>
+'''
+
+class HtmlReport:
+
+    """
+    Writes a static HTML report of an analysed dependency graph: a summary of
+    the root metrics, tables of translation units, headers and projects,
+    and neighbourhood views of the heaviest files.
+
+    Table rows are precomputed for every sortable column and split into
+    pages of page_size rows, each stored in a separate JavaScript file
+    loaded only when the page is shown, so the report opens quickly no
+    matter the graph size and works from the file system. The default sort
+    of a table covers all of its rows, other sorts only the first
+    max_sorted_rows, keeping the report small. Neighbourhood views (the
+    most expensive dependants and dependencies of a file, drawn as SVG) are
+    generated for the first neighbourhoods rows of the default sorts.
+    """
+
+    _TABLES = [
+        ('translation_units', 'Translation units', Analyser.TOP_LEVEL_COLUMNS,
+         Analyser.Attributes.BUILD_TIME),
+        ('headers', 'Headers', Analyser.INTERNAL_COLUMNS,
+         Analyser.Attributes.AGG_BUILD_TIME_DEV),
+        ('projects', 'Projects', Analyser.PROJECT_COLUMNS,
+         Analyser.ProjectMetrics.BUILD_TIME),
+        ]
+
+    _TEXT_COLUMNS = frozenset([Analyser.Attributes.PROJECT])
+    _SKIPPED_COLUMNS = frozenset([Analyser.Attributes.ABSOLUTE_PATH])
+
+    _VIEW_ROW_HEIGHT = 18
+    _VIEW_COLUMN_WIDTH = 260
+    _VIEW_LABEL_LENGTH = 36
+
+    def __init__(self, dependency_graph, page_size=100, max_sorted_rows=1000,
+                 neighbourhoods=50, neighbourhood_size=8):
+        self._dependency_graph = dependency_graph
+        self._page_size = page_size
+        self._max_sorted_rows = max_sorted_rows
+        self._neighbourhoods = neighbourhoods
+        self._neighbourhood_size = neighbourhood_size
+        self._views = {}
+
+    @staticmethod
+    def _compact(value):
+        if isinstance(value, float):
+            return round(value, 3)
+        return value
+
+    def _get_rows(self, name, keys, defaults):
+        if name == 'projects':
+            source = Analyser(self._dependency_graph).get_project_metrics()
+        elif name == 'translation_units':
+            source = self._dependency_graph.get_rows(self._dependency_graph.get_top_level_nodes())
+        else:
+            source = self._dependency_graph.get_rows(
+                self._dependency_graph.get_dependency_nodes())
+        return [[label] + [self._compact(attributes.get(key, default))
+                           for key, default in zip(keys, defaults)]
+                for label, attributes in source]
+
+    def _write_chunk(self, directory, name, data):
+        with open(os.path.join(directory, name + '.js'), 'w', encoding='utf-8') as stream:
+            stream.write('cbpReport.load(%s,' % json.dumps(name))
+            json.dump(data, stream, separators=(',', ':'))
+            stream.write(');\n')
+
+    def _get_cost(self, label):
+        return self._dependency_graph.get_attribute(label, Analyser.Attributes.BUILD_TIME, 0.0)
+
+    def _draw_column(self, labels, x, anchor):
+        lines = []
+        for index, label in enumerate(labels):
+            y = (index + 1) * self._VIEW_ROW_HEIGHT
+            text = label if len(label) <= self._VIEW_LABEL_LENGTH else \
+                label[:self._VIEW_LABEL_LENGTH - 3] + '...'
+            lines.append('<text x="%d" y="%d" text-anchor="%s"><title>%s (%.3fs)</title>%s</text>' %
+                         (x, y, anchor, escape(label), self._get_cost(label), escape(text)))
+        return lines
+
+    def _draw_neighbourhood(self, label):
+        dependants = heapq.nlargest(
+            self._neighbourhood_size,
+            (parent for parent in self._dependency_graph.get_node_immediate_dependants(label)
+             if parent != DependencyGraph.ROOT_NODE_LABEL),
+            key=self._get_cost)
+        dependencies = heapq.nlargest(
+            self._neighbourhood_size,
+            self._dependency_graph.get_node_immediate_dependencies(label),
+            key=self._get_cost)
+
+        width = self._VIEW_COLUMN_WIDTH
+        rows = max(len(dependants), len(dependencies), 1)
+        height = (rows + 1) * self._VIEW_ROW_HEIGHT
+        center_y = (rows + 1) * self._VIEW_ROW_HEIGHT // 2
+        lines = ['<svg xmlns="http://www.w3.org/2000/svg" width="%d" height="%d" '
+                 'font-size="11" font-family="sans-serif">' % (3 * width, height)]
+        for index in range(len(dependants)):
+            lines.append('<line x1="%d" y1="%d" x2="%d" y2="%d" stroke="#bbb"/>' %
+                         (width - 10, (index + 1) * self._VIEW_ROW_HEIGHT - 4,
+                          width + 10, center_y - 4))
+        for index in range(len(dependencies)):
+            lines.append('<line x1="%d" y1="%d" x2="%d" y2="%d" stroke="#bbb"/>' %
+                         (2 * width - 10, center_y - 4,
+                          2 * width + 10, (index + 1) * self._VIEW_ROW_HEIGHT - 4))
+        lines.extend(self._draw_column(dependants, width - 14, 'end'))
+        lines.append('<text x="%d" y="%d" text-anchor="middle" font-weight="bold">%s</text>' %
+                     (3 * width // 2, center_y, escape(label)))
+        lines.extend(self._draw_column(dependencies, 2 * width + 14, 'start'))
+        lines.append('</svg>')
+        return ''.join(lines)
+
+    def _write_table(self, data_directory, name, columns, default_sort):
+        keys = [key for key in columns if key not in self._SKIPPED_COLUMNS]
+        defaults = [columns[key].default_value for key in keys]
+        rows = self._get_rows(name, keys, defaults)
+        logging.info('Storing %d rows of the %s table', len(rows), name)
+
+        sorts = {}
+        views = {}
+        for index, key in enumerate(keys, 1):
+            if key in self._TEXT_COLUMNS:
+                continue
+            if key == default_sort:
+                ordered = sorted(rows, key=lambda row, index=index: row[index], reverse=True)
+            else:
+                ordered = heapq.nlargest(self._max_sorted_rows, rows,
+                                         key=lambda row, index=index: row[index])
+            sorts[key] = {'rows': len(ordered)}
+            for page, start in enumerate(range(0, max(len(ordered), 1), self._page_size)):
+                self._write_chunk(data_directory, '%s.%s.%d' % (name, key, page),
+                                  ordered[start:start + self._page_size])
+
+            if key == default_sort and name != 'projects':
+                for row in ordered[:self._neighbourhoods]:
+                    label = row[0]
+                    if label not in self._views:
+                        self._views[label] = len(self._views)
+                        self._write_chunk(data_directory, 'view.%d' % self._views[label],
+                                          self._draw_neighbourhood(label))
+                    views[label] = self._views[label]
+
+        return {
+            'columns': ['label'] + [columns[key].title for key in keys],
+            'keys': ['label'] + keys,
+            'rows': len(rows),
+            'pageSize': self._page_size,
+            'sorts': sorts,
+            'defaultSort': default_sort,
+            'views': views,
+            }
+
+    def write(self, directory):
+        """
+        Writes the report to directory (created if needed). The report is
+        opened through index.html, data files are stored in the "data"
+        subdirectory.
+        """
+        data_directory = os.path.join(directory, 'data')
+        os.makedirs(data_directory, exist_ok=True)
+
+        summary = [[column.title, self._compact(self._dependency_graph.get_attribute(
+            DependencyGraph.ROOT_NODE_LABEL, key, column.default_value))]
+                   for key, column in Analyser.ROOT_COLUMNS.items()]
+        tables = {}
+        sections = []
+        for name, title, columns, default_sort in self._TABLES:
+            tables[name] = self._write_table(data_directory, name, columns, default_sort)
+            sections.append(_SECTION_TEMPLATE.format(name=name, title=title))
+
+        meta = json.dumps({'summary': summary, 'tables': tables}, separators=(',', ':'))
+        # keep the data from closing the script element
+        meta = meta.replace('</', '<\\/')
+        with open(os.path.join(directory, 'index.html'), 'w', encoding='utf-8') as stream:
+            stream.write(_PAGE_TEMPLATE.format(sections=''.join(sections), meta=meta))
@@ -0,0 +1,253 @@
+# Copyright (c) Techland. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+
+"""
+Contains a server answering read-only command line interpreter commands
+(print, why etc.) over HTTP. The dependency graph is loaded once and kept in
+memory, so that tools can query it repeatedly without reloading it.
+Requests are handled by a pool of threads and answered with JSON objects.
+"""
+
+import io
+import os
+import json
+import logging
+import ipaddress
+import socketserver
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import urlsplit, parse_qs
+from cppbuildprofiler.analysis import Analyser
+from cppbuildprofiler.cli import Interpreter
+from cppbuildprofiler.recommendation import Recommender
+
+def _is_loopback(host):
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+class _QueryInterpreter(Interpreter):
+
+    """
+    Interpreter running a single command against a shared dependency graph.
+    Output is collected in memory and errors are raised instead of logged.
+    """
+
+    def __init__(self, depgraph, analyser, recommender):
+        super().__init__()
+        self._depgraph = depgraph
+        self._analyser = analyser
+        self._recommender = recommender
+        self.stdout = io.StringIO()
+
+    def _get_analyser(self):
+        return self._analyser
+
+    def _get_recommender(self):
+        return self._recommender
+
+    def _parse_args(self, parser, param_string):
+        def error(message):
+            raise RuntimeError('%s%s: error: %s' % (parser.format_usage(), parser.prog,
+                                                    message))
+        parser.error = error
+        argv = self._argv(param_string)
+        if '-h' in argv or '--help' in argv:
+            self.stdout.write(parser.format_help())
+            raise SystemExit(0)
+        return parser.parse_args(argv)
+
+    def _open_output(self, path):
+        if path:
+            raise RuntimeError('Writing to files is not allowed in queries')
+        return _UnclosedStream(self.stdout)
+
+    def onecmd(self, line):
+        # skips Interpreter.onecmd, so errors reach the client and queries
+        # aren't measured by the instrument command
+        return super(Interpreter, self).onecmd(line)
+
+class _UnclosedStream:
+
+    """Wraps a stream, so that it's not closed when used as a context manager."""
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    def __enter__(self):
+        return self._stream
+
+    def __exit__(self, *args):
+        pass
+
+class _ThreadPoolMixIn:
+
+    """Handles requests in a fixed size pool of threads."""
+
+    executor = None
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self._process_request_thread, request, client_address)
+
+    def _process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception: # pylint: disable=broad-except
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+class _HTTPServer(_ThreadPoolMixIn, HTTPServer):
+    pass
+
+if hasattr(socketserver, 'UnixStreamServer'):
+    class _UnixHTTPServer(_ThreadPoolMixIn, socketserver.UnixStreamServer):
+        pass
+else:
+    _UnixHTTPServer = None
+
+class _RequestHandler(BaseHTTPRequestHandler):
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args): # pylint: disable=redefined-builtin
+        logging.debug('%s - %s', self.address_string(), format % args)
+
+    def _respond(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle_query(self, command):
+        if command is None:
+            self._respond(400, {'error': 'No command given'})
+            return
+        try:
+            output = self.server.query_server.execute(command)
+        except Exception as e: # pylint: disable=broad-except
+            self._respond(400, {'command': command, 'error': str(e)})
+            return
+        self._respond(200, {'command': command, 'output': output})
+
+    def do_GET(self): # pylint: disable=invalid-name
+        url = urlsplit(self.path)
+        if url.path == '/commands':
+            self._respond(200, {'commands': QueryServer.COMMANDS})
+        elif url.path == '/query':
+            self._handle_query(parse_qs(url.query).get('command', [None])[0])
+        else:
+            self._respond(404, {'error': 'Unknown path %s' % url.path})
+
+    def do_POST(self): # pylint: disable=invalid-name
+        url = urlsplit(self.path)
+        if url.path != '/query':
+            self._respond(404, {'error': 'Unknown path %s' % url.path})
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            body = json.loads(self.rfile.read(length).decode('utf-8'))
+        except ValueError as e:
+            self._respond(400, {'error': 'Invalid request: %s' % e})
+            return
+        self._handle_query(body.get('command') if isinstance(body, dict) else None)
+
+class QueryServer:
+
+    """
+    Answers read-only interpreter commands for a dependency graph. Commands
+    are sent as GET /query?command=... or POST /query with a JSON object
+    {"command": "..."} body and answered with {"command": ..., "output": ...}
+    or {"command": ..., "error": ...}. GET /commands lists the available
+    commands. Commands may not write to files.
+
+    The analysis indexes (precompiled header contents, the condensation of
+    the graph) are built once, before the server starts listening, and
+    shared by the queries. The dependency graph must not be modified while
+    it is served.
+
+    Queries aren't authenticated, so only loopback addresses may be listened
+    on unless allow_remote is True. Queries aren't instrumented.
+    """
+
+    COMMANDS = [
+        'print',
+        'why',
+        'whatif',
+        'redundant_dependencies',
+        'include_cycles',
+        'recommend_pch',
+        'recommend_unity',
+        ]
+
+    def __init__(self, depgraph, host='127.0.0.1', port=8000, socket_path=None, threads=8,
+                 allow_remote=False):
+        if depgraph is None:
+            raise RuntimeError('No dependency graph loaded')
+        if socket_path is None and not _is_loopback(host):
+            if not allow_remote:
+                raise RuntimeError('%s is not a loopback address and queries are not '
+                                   'authenticated, allow remote clients (serve --allow-remote) '
+                                   'to listen on it' % host)
+            logging.warning('Listening on %s, queries are not authenticated and anyone able to '
+                            'connect can read the dependency graph', host)
+        self._depgraph = depgraph
+        self._analyser = Analyser(depgraph)
+        self._recommender = Recommender(depgraph, self._analyser)
+        self._recommender.build_indexes()
+        self._socket_path = socket_path
+        self._executor = ThreadPoolExecutor(threads)
+        if socket_path is not None:
+            if _UnixHTTPServer is None:
+                raise RuntimeError('Unix sockets are not supported on this platform')
+            self._server = _UnixHTTPServer(socket_path, _RequestHandler, False)
+        else:
+            self._server = _HTTPServer((host, port), _RequestHandler, False)
+        self._server.executor = self._executor
+        self._server.query_server = self
+        try:
+            self._server.server_bind()
+            self._server.server_activate()
+        except OSError:
+            self._server.server_close()
+            raise
+
+    @property
+    def address(self):
+        """The (host, port) pair or the socket path the server listens on"""
+        return self._server.server_address
+
+    def execute(self, command):
+        """
+        Runs the interpreter command and returns its output. Raises a
+        RuntimeError for unknown or invalid commands.
+        """
+        name = command.strip().split(None, 1)[0] if command.strip() else ''
+        if name not in self.COMMANDS:
+            raise RuntimeError('Unknown command "%s", available commands: %s' %
+                               (name, ', '.join(self.COMMANDS)))
+        interpreter = _QueryInterpreter(self._depgraph, self._analyser, self._recommender)
+        interpreter.onecmd(command)
+        return interpreter.stdout.getvalue()
+
+    def serve_forever(self):
+        """Handles requests until shutdown is called from another thread"""
+        self._server.serve_forever()
+
+    def shutdown(self):
+        """
+        Stops serve_forever, waits for pending requests and closes the server.
+        Must be called after serve_forever has been started.
+        """
+        self._server.shutdown()
+        self._executor.shutdown()
+        self._server.server_close()
+        if self._socket_path is not None:
+            os.remove(self._socket_path)
@@ -0,0 +1,266 @@
+# Copyright (c) Techland. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+
+"""
+Contains a generator of synthetic Visual Studio build logs, as produced with
+the "/Bt+ /showIncludes /nologo- /FC" compiler options, for testing and
+benchmarking. Logs are deterministic for a given set of parameters and seed.
+"""
+
+import os
+import random
+
+_SYSTEM_INCLUDE_DIR = 'sdk'
+_COMPILER_PATH = r'C:\Program Files (x86)\Microsoft Visual Studio 14.0\VC\bin\amd64'
+_CL_OPTIONS = ('/c /ZI /nologo /W3 /WX- /Od /D _DEBUG /D _UNICODE /D UNICODE /Gm /EHsc /RTC1 '
+               '/MDd /GS /fp:precise /Zc:wchar_t /Zc:forScope /Zc:inline /Fo"x64\\Debug\\\\" '
+               '/Gd /TP /errorReport:prompt')
+_COMMON_HEADER_NAMES = ['types.h', 'config.h', 'utils.h', 'common.h', 'platform.h',
+                        'macros.h', 'forward.h', 'debug.h']
+_COMMON_SOURCE_NAMES = ['main.cpp', 'utils.cpp', 'module.cpp', 'config.cpp', 'debug.cpp']
+
+class _Project: # pylint: disable=too-few-public-methods
+
+    def __init__(self, name):
+        self.name = name
+        self.pch_header = None
+        self.translation_units = []
+
+class _TranslationUnit: # pylint: disable=too-few-public-methods
+
+    def __init__(self, name, path, includes):
+        self.name = name
+        self.path = path
+        self.includes = includes
+
+class SyntheticLog:
+
+    """
+    Generates a build log of projects compiled on channels (parallel
+    MSBuild nodes, whose lines are interleaved in the log). Headers form a
+    DAG: system headers include lower-numbered system headers, project
+    headers include lower-numbered headers of their project and system
+    headers. Translation units include their project's headers, system
+    headers and headers of up to project_dependencies preceding projects.
+    includes is the average number of direct includes of a file. A
+    fraction of projects (pch) compiles a precompiled header, a fraction
+    of files (duplicate_basenames) gets a common name like "types.h" that
+    is shared with files in other directories. Paths start at root.
+    """
+
+    def __init__(self, projects=2, translation_units=25, headers=60, system_headers=150,
+                 channels=4, includes=3, project_dependencies=2, files_per_command=8,
+                 pch=0.5, duplicate_basenames=0.1, root='D:\\work', seed=0):
+        self.projects = projects
+        self.translation_units = translation_units
+        self.headers = headers
+        self.system_headers = system_headers
+        self.channels = channels
+        self.includes = includes
+        self.project_dependencies = project_dependencies
+        self.files_per_command = files_per_command
+        self.pch = pch
+        self.duplicate_basenames = duplicate_basenames
+        self.root = root
+        self.seed = seed
+        self._paths = None
+        self._header_includes = None
+        self._projects = None
+
+    def scaled(self, factor):
+        """
+        Returns a generator of a log factor times larger: with factor times
+        more projects and channels (up to 64), so that the number of
+        translation units and headers grows linearly.
+        """
+        return SyntheticLog(self.projects * factor, self.translation_units, self.headers,
+                            self.system_headers, min(self.channels * factor, 64),
+                            self.includes, self.project_dependencies,
+                            self.files_per_command, self.pch, self.duplicate_basenames,
+                            self.root, self.seed)
+
+    def _join(self, *parts):
+        separator = '/' if self.root.startswith('/') else '\\'
+        return separator.join((self.root,) + parts)
+
+    def _pick_includes(self, rng, count, candidates):
+        # lower-numbered candidates are more popular, like base headers
+        return [candidates[int(len(candidates) * rng.random() ** 2)]
+                for _ in range(count) if candidates]
+
+    def _add_header(self, path, includes):
+        self._paths.append(path)
+        self._header_includes.append(sorted(set(includes)))
+        return len(self._paths) - 1
+
+    def _build(self):
+        if self._projects is not None:
+            return
+        rng = random.Random(self.seed)
+        self._paths = []
+        self._header_includes = []
+        self._projects = []
+
+        system = []
+        for index in range(self.system_headers):
+            includes = self._pick_includes(rng, rng.randint(0, 2 * self.includes), system)
+            system.append(self._add_header(
+                self._join(_SYSTEM_INCLUDE_DIR, 'include', 'sys%04d.h' % index), includes))
+
+        project_headers = []
+        for project_index in range(self.projects):
+            name = 'project%d' % project_index
+            project = _Project(name)
+            headers = []
+            for index in range(self.headers):
+                if rng.random() < self.duplicate_basenames:
+                    basename = rng.choice(_COMMON_HEADER_NAMES)
+                else:
+                    basename = '%s_%d.h' % (name, index)
+                includes = []
+                for _ in range(rng.randint(0, 2 * self.includes)):
+                    if headers and (rng.random() < 0.7 or not system):
+                        includes.append(headers[rng.randrange(len(headers))])
+                    else:
+                        includes.extend(self._pick_includes(rng, 1, system))
+                headers.append(self._add_header(
+                    self._join(name, 'include', 'module%d' % index, basename), includes))
+            project_headers.append(headers)
+
+            if rng.random() < self.pch:
+                # precompiled header names must be unique for the Analyser
+                project.pch_header = self._add_header(
+                    self._join(name, 'src', name + '_pch.h'),
+                    self._pick_includes(rng, 4 * self.includes, system))
+
+            dependencies = [header
+                            for headers_of_dependency in project_headers[
+                                max(project_index - self.project_dependencies, 0):project_index]
+                            for header in headers_of_dependency]
+            names = set()
+            for index in range(self.translation_units):
+                basename = '%s_%d.cpp' % (name, index)
+                if rng.random() < self.duplicate_basenames:
+                    common = rng.choice(_COMMON_SOURCE_NAMES)
+                    if common not in names:
+                        basename = common
+                names.add(basename)
+                includes = []
+                if project.pch_header is not None:
+                    includes.append(project.pch_header)
+                for _ in range(rng.randint(1, 2 * self.includes)):
+                    source = rng.random()
+                    if source < 0.6 and headers:
+                        # own headers, the higher-level ones more often
+                        includes.append(headers[int(len(headers) * (1 - rng.random() ** 2)) - 1])
+                    elif source < 0.8 and dependencies:
+                        includes.append(rng.choice(dependencies))
+                    elif system:
+                        includes.extend(self._pick_includes(rng, 1, system))
+                project.translation_units.append(_TranslationUnit(
+                    basename, self._join(name, 'src', basename), includes))
+            self._projects.append(project)
+
+    def _include_lines(self, channel, includes):
+        # headers are assumed to have include guards, so each one is listed
+        # once per translation unit
+        visited = set()
+        stack = [(header, 1) for header in reversed(includes)]
+        while stack:
+            header, depth = stack.pop()
+            if header in visited:
+                continue
+            visited.add(header)
+            yield '%d>  Note: including file:%s%s' % (channel, ' ' * depth, self._paths[header])
+            stack.extend((child, depth + 1)
+                         for child in reversed(self._header_includes[header])
+                         if child not in visited)
+
+    def _command_lines(self, rng, channel, project, translation_units, pch_switches):
+        yield '%d>  cl %s %s /Fd"x64\\Debug\\%s.pdb" /Bt+ /showIncludes /nologo- /FC %s' % (
+            channel, _CL_OPTIONS, pch_switches, project.name,
+            ' '.join(unit.name for unit in translation_units))
+        for unit in translation_units:
+            yield '%d>  %s' % (channel, unit.name)
+            included = 0
+            for line in self._include_lines(channel, unit.includes):
+                included += 1
+                yield line
+            front_end = (0.02 + 0.0005 * included) * rng.lognormvariate(0.0, 0.3)
+            back_end = 0.005 * rng.lognormvariate(0.0, 0.5)
+            for dll, build_time in [('c1xx.dll', front_end), ('c2.dll', back_end)]:
+                yield '%d>  time(%s\\%s)=%.5fs < 0 - 0 > BB [%s]' % (
+                    channel, _COMPILER_PATH, dll, build_time, unit.path)
+
+    def _channel_lines(self, rng, channel, projects):
+        for project in projects:
+            yield ('%d>------ Rebuild All started: Project: %s, Configuration: Debug x64 '
+                   '------' % (channel, project.name))
+            units = project.translation_units
+            if project.pch_header is not None:
+                pch_name = project.name + '_pch'
+                pch_unit = _TranslationUnit(pch_name + '.cpp',
+                                            self._join(project.name, 'src', pch_name + '.cpp'),
+                                            [project.pch_header])
+                switches = '/Fp"x64\\Debug\\%s.pch"' % project.name
+                yield from self._command_lines(rng, channel, project, [pch_unit],
+                                               '/Yc"%s.h" %s' % (pch_name, switches))
+                pch_switches = '/Yu"%s.h" %s' % (pch_name, switches)
+            else:
+                pch_switches = ''
+            for start in range(0, len(units), self.files_per_command):
+                yield from self._command_lines(rng, channel, project,
+                                               units[start:start + self.files_per_command],
+                                               pch_switches)
+            yield '%d>  %s.vcxproj -> %s' % (channel, project.name,
+                                             self._join(project.name, 'x64', 'Debug',
+                                                        project.name + '.lib'))
+
+    def lines(self):
+        """Returns a generator of the log lines (without line ends)"""
+        self._build()
+        rng = random.Random(self.seed)
+        channels = []
+        for channel in range(1, min(self.channels, max(len(self._projects), 1)) + 1):
+            projects = self._projects[channel - 1::self.channels]
+            channels.append(self._channel_lines(random.Random(rng.random()), channel,
+                                                projects))
+        # parallel builds interleave chunks of lines from different channels
+        while channels:
+            index = rng.randrange(len(channels))
+            for _ in range(rng.randint(1, 20)):
+                line = next(channels[index], None)
+                if line is None:
+                    channels.pop(index)
+                    break
+                yield line
+        yield '========== Rebuild All: %d succeeded, 0 failed, 0 skipped ==========' % \
+            len(self._projects)
+
+    def write(self, path):
+        """Writes the log to a file and returns the number of lines written"""
+        count = 0
+        with open(path, 'w', buffering=1 << 20) as stream:
+            for line in self.lines():
+                stream.write(line)
+                stream.write('\n')
+                count += 1
+        return count
+
+    def write_sources(self):
+        """
+        Creates the headers and source files listed in the log under root,
+        with sizes between 100 B and 20 kB, so that file sizes may be
+        calculated. root must be a directory path of this system.
+        """
+        self._build()
+        rng = random.Random(self.seed)
+        paths = list(self._paths)
+        for project in self._projects:
+            paths.extend(unit.path for unit in project.translation_units)
+            if project.pch_header is not None:
+                paths.append(self._paths[project.pch_header][:-len('.h')] + '.cpp')
+        for path in paths:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as stream:
+                stream.write('/' * int(100 * 200 ** rng.random()))
@@ -25,5 +25,10 @@ distutils.core.setup(
         },
     install_requires=[
         'networkx',
+        'numpy',
+        'scipy',
         ],
+    extras_require={
+        'parquet': ['pyarrow'],
+        },
     )
@@ -205,5 +205,237 @@ class TestAnalysis(unittest.TestCase):
             self._dependency_graph.get_attribute('other.hpp', Analyser.Attributes.TRANSLATION_UNITS),
             2)
 
+    def test_self_costs(self):
+        depgraph = DependencyGraph()
+        build_times = {}
+        for index in range(20):
+            label = 'tu%d.cpp' % index
+            heavy = index % 2 == 0
+            file_size = 100 * (index + 1)
+            build_times[label] = 0.5 + 0.001 * file_size + (5.0 if heavy else 0.0)
+            depgraph.add_top_level_node(label, **{Analyser.Attributes.BUILD_TIME: build_times[label],
+                                                  Analyser.Attributes.FILE_SIZE: file_size})
+            depgraph.add_dependency_node(label, 'tiny.h', **{Analyser.Attributes.FILE_SIZE: 10})
+            if heavy:
+                depgraph.add_dependency_node(label, 'heavy.h',
+                                             **{Analyser.Attributes.FILE_SIZE: 5000})
+
+        analyser = Analyser(depgraph)
+        analyser.calculate_total_build_times()
+        analyser.calculate_self_costs(regularisation=0.01)
+
+        heavy_cost = depgraph.get_attribute('heavy.h', Analyser.Attributes.SELF_COST)
+        tiny_cost = depgraph.get_attribute('tiny.h', Analyser.Attributes.SELF_COST)
+        self.assertAlmostEqual(heavy_cost, 5.0, delta=0.5)
+        self.assertLess(tiny_cost, 0.1 * heavy_cost)
+        self.assertGreaterEqual(tiny_cost, 0.0)
+        self.assertGreater(depgraph.get_attribute('tiny.h', Analyser.Attributes.BUILD_TIME),
+                           10 * heavy_cost)
+        for label, build_time in build_times.items():
+            own_cost = depgraph.get_attribute(label, Analyser.Attributes.SELF_COST)
+            self.assertGreaterEqual(own_cost, 0.0)
+            self.assertLessEqual(own_cost, build_time)
+
+    def test_exclusive_costs(self):
+        analyser = Analyser(self._dependency_graph)
+        analyser.calculate_file_sizes()
+        analyser.calculate_exclusive_costs()
+
+        self.assertEqual(
+            self._dependency_graph.get_attribute('pch.h', Analyser.Attributes.EXCLUSIVE_SIZE),
+            50 + 20) # b.cpp not added
+        self.assertEqual(
+            self._dependency_graph.get_attribute('lib.hpp', Analyser.Attributes.EXCLUSIVE_SIZE),
+            20 + 20)
+        self.assertEqual(
+            self._dependency_graph.get_attribute('a.hpp', Analyser.Attributes.EXCLUSIVE_SIZE),
+            10 + 20)
+        self.assertEqual(
+            self._dependency_graph.get_attribute('other.hpp', Analyser.Attributes.EXCLUSIVE_SIZE),
+            50 + 50)
+        self.assertFalse(self._dependency_graph.has_attribute(
+            'a.cpp',
+            Analyser.Attributes.EXCLUSIVE_SIZE))
+
+    def test_exclusive_costs_shared_dependencies(self):
+        depgraph = DependencyGraph()
+        depgraph.add_top_level_node('a.cpp', **{Analyser.Attributes.FILE_SIZE: 1})
+        depgraph.add_dependency_node('a.cpp', 'a.hpp', **{Analyser.Attributes.FILE_SIZE: 10,
+                                                          Analyser.Attributes.SELF_COST: 1.0})
+        depgraph.add_dependency_node('a.hpp', 'aa.hpp', **{Analyser.Attributes.FILE_SIZE: 15,
+                                                           Analyser.Attributes.SELF_COST: 2.0})
+        depgraph.add_dependency_node('a.hpp', 'b.hpp', **{Analyser.Attributes.FILE_SIZE: 2})
+        depgraph.add_dependency_node('b.hpp', 'bb.hpp', **{Analyser.Attributes.FILE_SIZE: 2})
+        depgraph.add_dependency_node('a.cpp', 'c.hpp', **{Analyser.Attributes.FILE_SIZE: 5})
+        depgraph.add_dependency_node('c.hpp', 'b.hpp')
+        depgraph.add_top_level_node('b.cpp', **{Analyser.Attributes.FILE_SIZE: 1})
+        depgraph.add_dependency_node('b.cpp', 'b.hpp')
+
+        analyser = Analyser(depgraph)
+        analyser.calculate_exclusive_costs()
+
+        self.assertEqual(depgraph.get_attribute('a.hpp', Analyser.Attributes.EXCLUSIVE_SIZE),
+                         10 + 15)
+        self.assertEqual(depgraph.get_attribute('a.hpp', Analyser.Attributes.EXCLUSIVE_BUILD_TIME),
+                         1.0 + 2.0)
+        self.assertEqual(depgraph.get_attribute('c.hpp', Analyser.Attributes.EXCLUSIVE_SIZE), 5)
+        self.assertEqual(depgraph.get_attribute('b.hpp', Analyser.Attributes.EXCLUSIVE_SIZE),
+                         (2 + 2) * 2)
+        self.assertEqual(depgraph.get_attribute('bb.hpp', Analyser.Attributes.EXCLUSIVE_SIZE),
+                         2 * 2)
+
+    def test_dependency_change_impact(self):
+        analyser = Analyser(self._dependency_graph)
+        analyser.calculate_file_sizes()
+
+        overlay = self._dependency_graph.get_overlay()
+        overlay.remove_dependency('a.hpp', 'lib.hpp')
+        overlay.add_dependency('b.cpp', 'a.hpp')
+        changes = analyser.get_dependency_change_impact(overlay)
+
+        self.assertEqual(len(changes), 2)
+        self.assertEqual(changes[0].label, 'a.cpp')
+        self.assertEqual(changes[0].removed, ['lib.hpp'])
+        self.assertEqual(changes[0].added, [])
+        self.assertEqual(changes[0].total_size_delta, -20)
+        self.assertEqual(changes[1].label, 'b.cpp')
+        self.assertEqual(changes[1].removed, [])
+        self.assertEqual(changes[1].added, ['a.hpp']) # lib.hpp is precompiled
+        self.assertEqual(changes[1].total_size_delta, 10)
+
+        self.assertTrue(self._dependency_graph.has_dependency('a.hpp', 'lib.hpp'))
+        self.assertFalse(self._dependency_graph.has_dependency('b.cpp', 'a.hpp'))
+
+    def test_dependency_change_impact_on_pch(self):
+        analyser = Analyser(self._dependency_graph)
+        analyser.calculate_file_sizes()
+
+        overlay = self._dependency_graph.get_overlay()
+        overlay.add_dependency('pch.h', 'other.hpp')
+        overlay.remove_dependency('a.hpp', 'lib.hpp')
+        overlay.add_dependency('a.hpp', 'lib.hpp')
+        self.assertEqual(overlay.get_added_dependencies(), [('pch.h', 'other.hpp')])
+        self.assertEqual(overlay.get_removed_dependencies(), [])
+        changes = analyser.get_dependency_change_impact(overlay)
+
+        self.assertEqual([(change.label, change.removed, change.added) for change in changes], [
+            ('b.cpp', ['other.hpp'], []), # now precompiled
+            ('pch.cpp', [], ['other.hpp']),
+            ])
+
+    def test_redundant_dependencies(self):
+        depgraph = DependencyGraph()
+        depgraph.add_top_level_node('a.cpp')
+        depgraph.add_dependency_node('a.cpp', 'a.h')
+        depgraph.add_dependency_node('a.h', 'aa.h')
+        depgraph.add_dependency_node('aa.h', 'aaa.h')
+        depgraph.add_dependency_node('a.h', 'aaa.h')
+        depgraph.add_dependency_node('a.cpp', 'aa.h')
+        depgraph.add_top_level_node('b.cpp')
+        depgraph.add_dependency_node('b.cpp', 'a.h')
+        depgraph.add_dependency_node('b.cpp', 'b.h')
+
+        analyser = Analyser(depgraph)
+        analyser.calculate_translation_units()
+        redundant = analyser.get_redundant_dependencies()
+
+        self.assertEqual(redundant, [
+            Analyser.RedundantDependency('a.h', 'aaa.h', 'aa.h', 2),
+            Analyser.RedundantDependency('a.cpp', 'aa.h', 'a.h', 1),
+            ])
+
+    def test_include_cycles(self):
+        depgraph = DependencyGraph()
+        depgraph.add_top_level_node('a.cpp')
+        depgraph.add_dependency_node('a.cpp', 'a.h')
+        depgraph.add_dependency_node('a.h', 'b.h')
+        depgraph.add_dependency_node('b.h', 'c.h')
+        depgraph.add_dependency_node('c.h', 'a.h')
+        depgraph.add_dependency_node('a.cpp', 'c.h')
+        depgraph.add_dependency_node('a.cpp', 'self.h')
+        depgraph.add_dependency_node('self.h', 'self.h')
+
+        analyser = Analyser(depgraph)
+        self.assertEqual(analyser.get_include_cycles(), [['a.h', 'b.h', 'c.h'], ['self.h']])
+        self.assertEqual(analyser.get_redundant_dependencies(), [
+            Analyser.RedundantDependency('a.cpp', 'c.h', 'a.h', 1),
+            ])
+
+    def test_coarsened_graph(self):
+        depgraph = DependencyGraph()
+        depgraph.add_top_level_node(
+            'a.cpp', **{Analyser.Attributes.PROJECT: 'a',
+                        Analyser.Attributes.BUILD_TIME: 2.0,
+                        Analyser.Attributes.FILE_SIZE: 10})
+        depgraph.add_dependency_node(
+            'a.cpp', 'a.h', **{Analyser.Attributes.PROJECT: 'a',
+                               Analyser.Attributes.BUILD_TIME: 2.0,
+                               Analyser.Attributes.FILE_SIZE: 5})
+        depgraph.add_dependency_node(
+            'a.h', 'lib.h', **{Analyser.Attributes.PROJECT: 'lib',
+                               Analyser.Attributes.BUILD_TIME: 5.0,
+                               Analyser.Attributes.FILE_SIZE: 20})
+        depgraph.add_dependency_node('a.cpp', 'lib.h')
+        depgraph.add_top_level_node(
+            'b.cpp', **{Analyser.Attributes.PROJECT: 'b',
+                        Analyser.Attributes.BUILD_TIME: 3.0,
+                        Analyser.Attributes.FILE_SIZE: 30})
+        depgraph.add_dependency_node('b.cpp', 'lib.h')
+
+        graph = Analyser(depgraph).get_coarsened_graph(Analyser.PROJECT_GROUPING)
+
+        self.assertEqual(sorted(graph.nodes()), ['a', 'b', 'lib'])
+        self.assertEqual(graph.node['a'], {
+            'nodes': 2, 'translationunits': 1, 'filesize': 15, 'buildtime': 2.0})
+        self.assertEqual(graph.node['lib'], {
+            'nodes': 1, 'translationunits': 0, 'filesize': 20, 'buildtime': 0.0})
+        self.assertEqual(sorted(graph.edges()), [('a', 'lib'), ('b', 'lib')])
+        self.assertEqual(graph.edge['a']['lib'], {'includes': 2, 'buildtime': 4.0})
+        self.assertEqual(graph.edge['b']['lib'], {'includes': 1, 'buildtime': 3.0})
+
+        communities = Analyser(depgraph).get_coarsened_graph(Analyser.COMMUNITY_GROUPING)
+        self.assertEqual(sum(attributes['nodes'] for _, attributes in communities.nodes(data=True)),
+                         4)
+        self.assertEqual(communities.number_of_nodes(), 1)
+
+        for label, path in [('a.cpp', '/src/a/a.cpp'), ('a.h', '/src/a/a.h'),
+                            ('lib.h', 'd:/lib/inc/lib.h'), ('b.cpp', '/src/b/x/b.cpp')]:
+            depgraph.set_attribute(label, Analyser.Attributes.ABSOLUTE_PATH, path)
+        directories = Analyser(depgraph).get_coarsened_graph(Analyser.DIRECTORY_GROUPING)
+        self.assertEqual(sorted(node for node in directories.nodes()
+                                if node != Analyser.UNKNOWN_PROJECT_NAME),
+                         ['/src/a', '/src/b', 'd:/lib'])
+
+    def test_project_metrics(self):
+        depgraph = DependencyGraph()
+        for label, project, build_time in [('a1.cpp', 'a', 1.0),
+                                           ('a2.cpp', 'a', 3.0),
+                                           ('b.cpp', 'b', 4.0)]:
+            depgraph.add_top_level_node(
+                label, **{Analyser.Attributes.PROJECT: project,
+                          Analyser.Attributes.BUILD_TIME: build_time,
+                          Analyser.Attributes.TOTAL_SIZE: 10})
+        depgraph.add_dependency_node('a1.cpp', 'a.h', **{Analyser.Attributes.PROJECT: 'a'})
+        depgraph.add_dependency_node('a.h', 'lib.h', **{Analyser.Attributes.PROJECT: 'lib'})
+        depgraph.add_dependency_node('a1.cpp', 'lib.h')
+        depgraph.add_dependency_node('b.cpp', 'a.h')
+
+        metrics = dict(Analyser(depgraph).get_project_metrics())
+
+        self.assertEqual(sorted(metrics.keys()), ['a', 'b', 'lib'])
+        self.assertEqual(metrics['a'], {
+            Analyser.ProjectMetrics.TRANSLATION_UNITS: 2,
+            Analyser.ProjectMetrics.BUILD_TIME: 4.0,
+            Analyser.ProjectMetrics.AVG_BUILD_TIME: 2.0,
+            Analyser.ProjectMetrics.P95_BUILD_TIME: 3.0,
+            Analyser.ProjectMetrics.COMPILED_SIZE: 20,
+            Analyser.ProjectMetrics.OWNED_HEADERS: 1,
+            Analyser.ProjectMetrics.IMPOSED_BUILD_TIME: 4.0,
+            })
+        self.assertEqual(metrics['lib'][Analyser.ProjectMetrics.TRANSLATION_UNITS], 0)
+        self.assertEqual(metrics['lib'][Analyser.ProjectMetrics.OWNED_HEADERS], 1)
+        self.assertEqual(metrics['lib'][Analyser.ProjectMetrics.IMPOSED_BUILD_TIME], 5.0)
+        self.assertEqual(metrics['b'][Analyser.ProjectMetrics.IMPOSED_BUILD_TIME], 0.0)
+
 if __name__ == '__main__':
     unittest.main()
@@ -4,6 +4,8 @@
 import unittest
 import tempfile
 import os
+import sys
+import subprocess
 import networkx as nx
 from cppbuildprofiler import DependencyGraph
 from cppbuildprofiler.cli import Interpreter
@@ -274,5 +276,128 @@ class TestCli(unittest.TestCase):
             if os.path.exists(graph_file):
                 os.unlink(graph_file)
 
+    def test_snapshots_and_undo(self):
+        depgraph = DependencyGraph()
+        depgraph.add_top_level_node('a.cpp')
+        depgraph.add_dependency_node('a.cpp', 'a.hpp')
+        depgraph.add_dependency_node('a.hpp', 'b.hpp')
+
+        interpreter = Interpreter()
+        interpreter._depgraph = depgraph
+        interpreter.onecmd('snapshot save full')
+        interpreter.onecmd('subgraph -o a.hpp --dependencies')
+        self.assertEqual(interpreter._depgraph.number_of_nodes(), 3)
+        interpreter.onecmd('subgraph -o b.hpp --dependencies')
+        self.assertEqual(interpreter._depgraph.number_of_nodes(), 2)
+
+        interpreter.onecmd('undo')
+        self.assertEqual(interpreter._depgraph.number_of_nodes(), 3)
+        interpreter.onecmd('snapshot restore full')
+        self.assertEqual(interpreter._depgraph.number_of_nodes(), 4)
+        interpreter.onecmd('undo')
+        self.assertEqual(interpreter._depgraph.number_of_nodes(), 3)
+        interpreter.onecmd('undo')
+        interpreter.onecmd('undo')
+        self.assertIs(interpreter._depgraph, depgraph)
+
+        interpreter.onecmd('snapshot delete full')
+        self.assertEqual(interpreter._snapshots, {})
+
+        interpreter = Interpreter()
+        with self.assertLogs(level='ERROR') as logs:
+            interpreter.onecmd('snapshot save empty')
+        self.assertIn('No dependency graph loaded', logs.output[0])
+        self.assertEqual(interpreter._snapshots, {})
+
+    def test_splits_arguments(self):
+        interpreter = Interpreter()
+        self.assertEqual(interpreter._argv('a  "b c"\td:\\x\\y.h #1 "it\'s" \'"q"\''),
+                         ['a', 'b c', 'd:\\x\\y.h', '#1', "it's", '"q"'])
+
+    def test_bounded_subgraph(self):
+        depgraph = DependencyGraph()
+        depgraph.add_top_level_node('a.cpp', buildtime=1.0)
+        depgraph.add_top_level_node('b.cpp', buildtime=2.0)
+        depgraph.add_dependency_node('a.cpp', 'a.hpp', buildtime=2.0)
+        depgraph.add_dependency_node('b.cpp', 'a.hpp')
+
+        interpreter = Interpreter()
+        interpreter._depgraph = depgraph
+        interpreter.onecmd('subgraph -o a.hpp --dependants --top-k x')
+        interpreter.onecmd('subgraph -o a.hpp --dependants --top-k 1 -m label')
+        self.assertIs(interpreter._depgraph, depgraph)
+        interpreter.onecmd('subgraph -o a.hpp --dependants --top-k 1')
+        self.assertEqual(sorted(interpreter._depgraph.get_top_level_nodes()), ['b.cpp'])
+
+    def test_why(self):
+        depgraph = DependencyGraph()
+        depgraph.add_top_level_node('a.cpp', project='a')
+        depgraph.add_top_level_node('b.cpp', project='b')
+        depgraph.add_dependency_node('a.cpp', 'a.hpp')
+        depgraph.add_dependency_node('a.hpp', 'c.hpp')
+        depgraph.add_dependency_node('b.cpp', 'c.hpp')
+        out = tempfile.mktemp(prefix='why')
+
+        interpreter = Interpreter()
+        interpreter._depgraph = depgraph
+        try:
+            interpreter.onecmd('why c.hpp --project a --out %s' % out)
+            with open(out) as f:
+                self.assertEqual(f.read(), 'a.cpp -> a.hpp -> c.hpp\n')
+            with self.assertLogs(level='ERROR') as logs:
+                interpreter.onecmd('why c.hpp --origin b.cpp --project a')
+            self.assertIn('--project', logs.output[0])
+        finally:
+            if os.path.exists(out):
+                os.unlink(out)
+
+    def test_history(self):
+        depgraph = DependencyGraph()
+        depgraph.add_top_level_node('a.cpp', buildtime=2.0)
+        depgraph.add_dependency_node('a.cpp', 'a.hpp', buildtime=2.0)
+        depgraph.add_dependency_node('a.hpp', 'b.hpp')
+        database = tempfile.mktemp(suffix='.sqlite')
+        out = tempfile.mktemp(prefix='history')
+
+        interpreter = Interpreter()
+        interpreter._depgraph = depgraph
+        try:
+            interpreter.onecmd('history add %s --build night1' % database)
+            interpreter.onecmd('subgraph -o a.hpp --dependencies')
+            interpreter.onecmd('history add %s --build night2' % database)
+            interpreter.onecmd('history diff %s -o %s' % (database, out))
+            with open(out) as f:
+                self.assertEqual(f.read(), 'change;parent;dependency\n'
+                                           'removed;a.cpp;a.hpp\n')
+            interpreter.onecmd('history metric %s -l a.hpp -o %s' % (database, out))
+            with open(out) as f:
+                self.assertEqual([line.split(';')[::2] for line in f.read().splitlines()],
+                                 [['build', 'buildtime'], ['night1', '2'], ['night2', '2']])
+
+            interpreter.onecmd('history load %s -b night1' % database)
+            self.assertEqual(interpreter._depgraph.number_of_nodes(), 4)
+            self.assertEqual(interpreter._depgraph.get_attribute('a.cpp', 'buildtime'), 2.0)
+            interpreter.onecmd('undo')
+            self.assertEqual(interpreter._depgraph.number_of_nodes(), 3)
+        finally:
+            for path in [database, database + '-wal', database + '-shm', out]:
+                if os.path.exists(path):
+                    os.unlink(path)
+
+    def test_startup_doesnt_import_networkx(self):
+        script = ('import sys\n'
+                  'from cppbuildprofiler.cli import Interpreter\n'
+                  'interpreter = Interpreter()\n'
+                  'interpreter.onecmd("help print")\n'
+                  'interpreter.onecmd("print --unknown-option")\n'
+                  'sys.exit("networkx" in sys.modules)\n')
+        package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        environment = dict(os.environ)
+        environment['PYTHONPATH'] = os.pathsep.join(
+            [package_dir] + [path for path in [environment.get('PYTHONPATH')] if path])
+        result = subprocess.run([sys.executable, '-c', script], env=environment,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.assertEqual(result.returncode, 0)
+
 if __name__ == '__main__':
     unittest.main()
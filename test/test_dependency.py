@@ -4,6 +4,7 @@
 import unittest
 import tempfile
 import os
+import io
 from cppbuildprofiler import DependencyGraph
 
 class TestDependency(unittest.TestCase):
@@ -138,5 +139,143 @@ class TestDependency(unittest.TestCase):
             sorted([(DependencyGraph.ROOT_NODE_LABEL, 'b.hpp'),
                     ('b.hpp', 'c.hpp')]))
 
+    def test_copies_share_graph_until_modified(self):
+        depgraph = DependencyGraph()
+        depgraph.add_top_level_node('a.cpp', size=1)
+        depgraph.add_dependency_node('a.cpp', 'a.hpp')
+
+        copy = depgraph.copy()
+        self.assertIs(copy._graph, depgraph._graph)
+
+        copy.set_attribute('a.cpp', 'size', 2)
+        copy.add_dependency_node('a.hpp', 'b.hpp')
+        self.assertIsNot(copy._graph, depgraph._graph)
+        self.assertEqual(depgraph.get_attribute('a.cpp', 'size'), 1)
+        self.assertEqual(copy.get_attribute('a.cpp', 'size'), 2)
+        self.assertFalse(depgraph.has_node('b.hpp'))
+
+        # subgraphs share attributes with the original graph
+        subgraph = depgraph.get_subgraph('a.cpp', True, False)
+        subgraph.set_attribute('a.cpp', 'size', 3)
+        self.assertEqual(depgraph.get_attribute('a.cpp', 'size'), 1)
+
+        # the last remaining graph is modified in place
+        del copy, subgraph
+        graph = depgraph._graph
+        depgraph.set_attribute('a.cpp', 'size', 4)
+        self.assertIs(depgraph._graph, graph)
+
+    def test_overlay_doesnt_modify_graph(self):
+        depgraph = DependencyGraph()
+        depgraph.add_top_level_node('a.cpp')
+        depgraph.add_dependency_node('a.cpp', 'a.hpp')
+        depgraph.add_dependency_node('a.hpp', 'b.hpp')
+        depgraph.add_dependency_node('a.cpp', 'c.hpp')
+
+        overlay = depgraph.get_overlay()
+        overlay.remove_dependency('a.hpp', 'b.hpp')
+        overlay.add_dependency('c.hpp', 'b.hpp')
+        overlay.add_dependency('a.hpp', 'c.hpp')
+        overlay.remove_dependency('a.hpp', 'c.hpp')
+
+        with self.assertRaisesRegex(RuntimeError, r'^Dependency "a.cpp" -> "b.hpp" not found'):
+            overlay.remove_dependency('a.cpp', 'b.hpp')
+
+        self.assertEqual(overlay.get_removed_dependencies(), [('a.hpp', 'b.hpp')])
+        self.assertEqual(overlay.get_added_dependencies(), [('c.hpp', 'b.hpp')])
+        self.assertEqual(list(overlay.get_node_immediate_dependencies('a.hpp')), [])
+        self.assertEqual(list(overlay.get_node_immediate_dependencies('c.hpp')), ['b.hpp'])
+        self.assertEqual(list(overlay.get_node_immediate_dependants('b.hpp')), ['c.hpp'])
+
+        self.assertEqual(list(depgraph.get_node_immediate_dependencies('a.hpp')), ['b.hpp'])
+        self.assertEqual(list(depgraph.get_node_immediate_dependencies('c.hpp')), [])
+
+    def test_shortest_dependency_paths(self):
+        depgraph = DependencyGraph()
+        depgraph.add_top_level_node('a.cpp')
+        depgraph.add_dependency_node('a.cpp', 'a.hpp')
+        depgraph.add_dependency_node('a.hpp', 'b.hpp')
+        depgraph.add_dependency_node('b.hpp', 'c.hpp')
+        depgraph.add_dependency_node('a.cpp', 'd.hpp')
+        depgraph.add_dependency_node('d.hpp', 'c.hpp')
+        depgraph.add_top_level_node('b.cpp')
+        depgraph.add_dependency_node('b.cpp', 'b.hpp')
+        depgraph.add_top_level_node('c.cpp')
+
+        self.assertEqual(depgraph.get_shortest_dependency_path('a.cpp', 'c.hpp'),
+                         ['a.cpp', 'd.hpp', 'c.hpp'])
+        self.assertIsNone(depgraph.get_shortest_dependency_path('c.cpp', 'c.hpp'))
+        self.assertEqual(depgraph.get_shortest_dependency_paths('a.cpp', 'c.hpp', 3),
+                         [['a.cpp', 'd.hpp', 'c.hpp'],
+                          ['a.cpp', 'a.hpp', 'b.hpp', 'c.hpp']])
+        self.assertEqual(depgraph.get_shortest_dependant_paths('c.hpp',
+                                                               ['a.cpp', 'b.cpp', 'c.cpp']),
+                         {'a.cpp': ['a.cpp', 'd.hpp', 'c.hpp'],
+                          'b.cpp': ['b.cpp', 'b.hpp', 'c.hpp']})
+
+    def test_bounded_subgraph(self):
+        depgraph = DependencyGraph()
+        depgraph.add_top_level_node('a.cpp', buildtime=1.0)
+        depgraph.add_top_level_node('b.cpp', buildtime=5.0)
+        depgraph.add_top_level_node('c.cpp', buildtime=3.0)
+        for label in ['a.cpp', 'b.cpp', 'c.cpp']:
+            depgraph.add_dependency_node(label, 'core.hpp')
+        depgraph.add_dependency_node('core.hpp', 'detail.hpp')
+        depgraph.add_dependency_node('detail.hpp', 'impl.hpp')
+
+        subgraph = depgraph.get_subgraph('core.hpp', False, True, max_nodes=3,
+                                         priority='buildtime')
+        self.assertEqual(
+            sorted(subgraph._graph.nodes()),
+            sorted([DependencyGraph.ROOT_NODE_LABEL, 'core.hpp', 'b.cpp', 'c.cpp']))
+        self.assertIn((DependencyGraph.ROOT_NODE_LABEL, 'b.cpp'), subgraph._graph.edges())
+
+        subgraph = depgraph.get_subgraph('core.hpp', True, True, max_depth=1, top_k=1,
+                                         priority='buildtime',
+                                         predicate=lambda label: label != 'detail.hpp')
+        self.assertEqual(
+            sorted(subgraph._graph.nodes()),
+            sorted([DependencyGraph.ROOT_NODE_LABEL, 'core.hpp', 'b.cpp']))
+
+        # cheap dependencies don't crowd out the dependants
+        depgraph.set_attribute('detail.hpp', 'buildtime', 0.5)
+        depgraph.set_attribute('impl.hpp', 'buildtime', 0.2)
+        subgraph = depgraph.get_subgraph('core.hpp', True, True, max_nodes=3,
+                                         priority='buildtime')
+        self.assertEqual(
+            sorted(subgraph._graph.nodes()),
+            sorted([DependencyGraph.ROOT_NODE_LABEL, 'core.hpp', 'b.cpp', 'c.cpp']))
+
+        subgraph = depgraph.get_subgraph('core.hpp', True, False, max_depth=1)
+        self.assertEqual(
+            sorted(subgraph._graph.nodes()),
+            sorted([DependencyGraph.ROOT_NODE_LABEL, 'core.hpp', 'detail.hpp']))
+
+        # truncated dependants are attached to the root
+        subgraph = depgraph.get_subgraph('detail.hpp', True, True, max_depth=0)
+        self.assertEqual(subgraph._graph.edges(DependencyGraph.ROOT_NODE_LABEL),
+                         [(DependencyGraph.ROOT_NODE_LABEL, 'detail.hpp')])
+        subgraph = depgraph.get_subgraph('impl.hpp', False, True, max_depth=1)
+        self.assertEqual(list(subgraph.get_top_level_nodes()), ['detail.hpp'])
+
+    def test_print_csv_quotes_values(self):
+        depgraph = DependencyGraph()
+        depgraph.add_top_level_node('a.cpp', path='c:/a,b/a.cpp', size=10)
+        depgraph.add_top_level_node('b "quoted".cpp', size=20)
+        columns = {
+            'size': DependencyGraph.Column('size [B]', 0),
+            'path': DependencyGraph.Column('path', ''),
+            }
+
+        stream = io.StringIO()
+        depgraph.print_csv(stream, columns, ',', ['a.cpp', 'b "quoted".cpp'])
+
+        self.assertEqual(stream.getvalue(),
+                         'label,size [B],path\n'
+                         'a.cpp,10,"c:/a,b/a.cpp"\n'
+                         '"b ""quoted"".cpp",20,\n')
+        with self.assertRaises(RuntimeError):
+            depgraph.print_csv(io.StringIO(), columns, ', ', ['a.cpp'])
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,112 @@
+# Copyright (c) Techland. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+
+import unittest
+import tempfile
+import os
+import sqlite3
+import numpy as np
+from scipy.sparse import csr_matrix
+from cppbuildprofiler import Analyser, DependencyGraph, write_sqlite, write_npz, load_npz
+
+class TestExport(unittest.TestCase):
+
+    def setUp(self):
+        self._dependency_graph = DependencyGraph()
+        for label, project, build_time in [('a.cpp', 'a', 3.0), ('b.cpp', 'b', 5.0)]:
+            self._dependency_graph.add_top_level_node(
+                label,
+                **{Analyser.Attributes.PROJECT: project,
+                   Analyser.Attributes.BUILD_TIME: build_time,
+                   Analyser.Attributes.COMPILATION_COMMAND: 'cl /c /O2'})
+        self._dependency_graph.add_dependency_node(
+            'a.cpp', 'a.h',
+            **{Analyser.Attributes.PROJECT: 'a',
+               Analyser.Attributes.AGG_BUILD_TIME_DEV: -1.0})
+        self._dependency_graph.add_dependency_node(
+            'a.h', 'common.h',
+            **{Analyser.Attributes.AGG_BUILD_TIME_DEV: 0.5})
+        self._dependency_graph.add_dependency_node('b.cpp', 'common.h')
+        self._path = tempfile.mktemp(suffix='.sqlite')
+
+    def tearDown(self):
+        if os.path.exists(self._path):
+            os.unlink(self._path)
+
+    def test_write_sqlite(self):
+        write_sqlite(self._dependency_graph, self._path)
+        connection = sqlite3.connect(self._path)
+        try:
+            self.assertEqual(connection.execute('SELECT COUNT(*) FROM nodes').fetchone()[0], 4)
+            self.assertEqual(connection.execute('SELECT COUNT(*) FROM compilation_commands')
+                             .fetchone()[0], 1)
+            edges = connection.execute(
+                'SELECT parent.label, child.label FROM edges '
+                'JOIN nodes AS parent ON parent.id = edges.parent_id '
+                'JOIN nodes AS child ON child.id = edges.child_id').fetchall()
+            self.assertEqual(sorted(edges), [('a.cpp', 'a.h'), ('a.h', 'common.h'),
+                                             ('b.cpp', 'common.h')])
+            self.assertEqual(
+                connection.execute('SELECT label, project FROM top_headers_by_deviation')
+                .fetchall(),
+                [('common.h', Analyser.UNKNOWN_PROJECT_NAME), ('a.h', 'a')])
+            self.assertEqual(
+                connection.execute('SELECT project, translation_units, build_time '
+                                   'FROM translation_units_per_project').fetchall(),
+                [('b', 1, 5.0), ('a', 1, 3.0)])
+            self.assertEqual(
+                connection.execute('SELECT %s FROM projects WHERE name = ?' %
+                                   Analyser.ProjectMetrics.IMPOSED_BUILD_TIME,
+                                   (Analyser.UNKNOWN_PROJECT_NAME,)).fetchone()[0],
+                8.0)
+        finally:
+            connection.close()
+
+        write_sqlite(self._dependency_graph, self._path)
+
+    def test_write_sqlite_with_orphans(self):
+        self._dependency_graph.add_dependency_node(
+            'b.cpp', 'q.h', **{Analyser.Attributes.PROJECT: 'q'})
+        self._dependency_graph.remove_dependency_by_predicate(
+            lambda parent, child: child == 'q.h')
+        write_sqlite(self._dependency_graph, self._path)
+        connection = sqlite3.connect(self._path)
+        try:
+            self.assertEqual(
+                connection.execute('SELECT projects.name FROM nodes '
+                                   'JOIN projects ON projects.id = nodes.project_id '
+                                   'WHERE nodes.label = ?', ('q.h',)).fetchall(),
+                [('q',)])
+        finally:
+            connection.close()
+
+    def test_write_npz(self):
+        adjacency_path = tempfile.mktemp(suffix='.npz')
+        try:
+            write_npz(self._dependency_graph, self._path, adjacency_path)
+            columns = load_npz(self._path)
+            adjacency = load_npz(adjacency_path)
+
+            labels = list(columns['label'])
+            self.assertEqual(sorted(labels), ['a.cpp', 'a.h', 'b.cpp', 'common.h'])
+            self.assertIsInstance(columns['buildtime'], np.memmap)
+            self.assertEqual(columns['buildtime'].dtype, np.float64)
+            self.assertEqual(columns['translationunits'].dtype, np.int64)
+            self.assertEqual(columns['buildtime'][labels.index('b.cpp')], 5.0)
+            self.assertEqual(columns['project'][labels.index('common.h')],
+                             Analyser.UNKNOWN_PROJECT_NAME)
+            self.assertEqual(list(columns['toplevel']),
+                             [label.endswith('.cpp') for label in labels])
+
+            matrix = csr_matrix((adjacency['data'], adjacency['indices'], adjacency['indptr']),
+                                shape=tuple(adjacency['shape']))
+            edges = sorted((labels[parent], labels[child])
+                           for parent, child in zip(*matrix.nonzero()))
+            self.assertEqual(edges, [('a.cpp', 'a.h'), ('a.h', 'common.h'),
+                                     ('b.cpp', 'common.h')])
+            del columns, adjacency, matrix
+        finally:
+            os.unlink(adjacency_path)
+
+if __name__ == '__main__':
+    unittest.main()
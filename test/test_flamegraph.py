@@ -0,0 +1,59 @@
+# Copyright (c) Techland. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+
+import unittest
+import io
+import json
+from cppbuildprofiler import Analyser, DependencyGraph, FlameGraph
+
+class TestFlameGraph(unittest.TestCase):
+
+    def setUp(self):
+        '''
+        The test dependency graph is setup as follows:
+
+        a.cpp [project: p, file size: 1B]
+        - a.h [file size: 10B]
+        -- common.h [file size: 100B]
+        - common.h
+        b.cpp [project: p, file size: 2B]
+        - a.h
+        '''
+        self._dependency_graph = DependencyGraph()
+        self._dependency_graph.add_top_level_node('a.cpp', **{Analyser.Attributes.PROJECT: 'p',
+                                                              Analyser.Attributes.FILE_SIZE: 1})
+        self._dependency_graph.add_dependency_node('a.cpp', 'a.h',
+                                                   **{Analyser.Attributes.FILE_SIZE: 10})
+        self._dependency_graph.add_dependency_node('a.h', 'common.h',
+                                                   **{Analyser.Attributes.FILE_SIZE: 100})
+        self._dependency_graph.add_dependency_node('a.cpp', 'common.h')
+        self._dependency_graph.add_top_level_node('b.cpp', **{Analyser.Attributes.PROJECT: 'p',
+                                                              Analyser.Attributes.FILE_SIZE: 2})
+        self._dependency_graph.add_dependency_node('b.cpp', 'a.h')
+
+    def test_writes_merged_folded_stacks(self):
+        flame_graph = FlameGraph(self._dependency_graph)
+        flame_graph.add_translation_units()
+        stream = io.StringIO()
+        flame_graph.write_folded(stream)
+
+        self.assertEqual(stream.getvalue(), 'p 3\n'
+                                            'p;a.h 20\n'
+                                            'p;a.h;common.h 200\n')
+
+    def test_writes_speedscope_per_translation_unit(self):
+        flame_graph = FlameGraph(self._dependency_graph, merge_translation_units=False)
+        flame_graph.add_translation_unit('a.cpp')
+        stream = io.StringIO()
+        flame_graph.write_speedscope(stream, 'test')
+
+        profile = json.loads(stream.getvalue())
+        frames = [frame['name'] for frame in profile['shared']['frames']]
+        samples = [[frames[index] for index in sample]
+                   for sample in profile['profiles'][0]['samples']]
+        self.assertEqual(samples, [['a.cpp'], ['a.cpp', 'a.h'], ['a.cpp', 'a.h', 'common.h']])
+        self.assertEqual(profile['profiles'][0]['weights'], [1, 10, 100])
+        self.assertEqual(profile['profiles'][0]['endValue'], 111)
+
+if __name__ == '__main__':
+    unittest.main()
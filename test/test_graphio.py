@@ -0,0 +1,61 @@
+# Copyright (c) Techland. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+
+import unittest
+import tempfile
+import os
+import networkx as nx
+from cppbuildprofiler.graphio import write_gml, write_graphml
+
+class TestGraphIO(unittest.TestCase):
+
+    def setUp(self):
+        self._graph = nx.DiGraph()
+        self._graph.add_node('a.cpp', buildtime=1.5, filesize=10, project='a "b" & c',
+                             compilationcommand='cl /c a.cpp', missing=None)
+        self._graph.add_node('ż.h', buildtime=1e+20, filesize=2, flag=True)
+        self._graph.add_edge('a.cpp', 'ż.h', weight=2)
+        self._paths = []
+
+    def tearDown(self):
+        for path in self._paths:
+            os.unlink(path)
+
+    def _get_path(self, suffix):
+        path = tempfile.mktemp(suffix=suffix)
+        self._paths.append(path)
+        return path
+
+    def test_write_gml(self):
+        path = self._get_path('.gml')
+        write_gml(self._graph, path)
+        graph = nx.read_gml(path)
+        self.assertEqual(graph.node['a.cpp'], {'buildtime': 1.5, 'filesize': 10,
+                                               'project': 'a "b" & c',
+                                               'compilationcommand': 'cl /c a.cpp'})
+        self.assertEqual(graph.node['ż.h'], {'buildtime': 1e+20, 'filesize': 2, 'flag': 1})
+        self.assertEqual(graph.edges(data=True), [('a.cpp', 'ż.h', {'weight': 2})])
+
+    def test_write_gml_compressed_subset(self):
+        path = self._get_path('.gml.gz')
+        write_gml(self._graph, path, ['buildtime', 'project'], [])
+        graph = nx.read_gml(path)
+        self.assertEqual(graph.node['a.cpp'], {'buildtime': 1.5, 'project': 'a "b" & c'})
+        self.assertEqual(graph.edges(data=True), [('a.cpp', 'ż.h', {})])
+
+    def test_write_gml_invalid_key(self):
+        self._graph.node['a.cpp']['invalid key'] = 1
+        with self.assertRaises(RuntimeError):
+            write_gml(self._graph, self._get_path('.gml'))
+
+    def test_write_graphml(self):
+        path = self._get_path('.graphml')
+        write_graphml(self._graph, path, ['buildtime', 'filesize', 'project', 'flag'])
+        graph = nx.read_graphml(path)
+        self.assertEqual(graph.node['a.cpp'], {'buildtime': 1.5, 'filesize': 10,
+                                               'project': 'a "b" & c'})
+        self.assertEqual(graph.node['ż.h'], {'buildtime': 1e+20, 'filesize': 2, 'flag': True})
+        self.assertEqual(graph.edges(data=True), [('a.cpp', 'ż.h', {'weight': 2})])
+
+if __name__ == '__main__':
+    unittest.main()
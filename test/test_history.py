@@ -0,0 +1,135 @@
+# Copyright (c) Techland. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+
+import unittest
+import tempfile
+import os
+import sqlite3
+from cppbuildprofiler import Analyser, DependencyGraph, HistoryStore
+
+class TestHistory(unittest.TestCase):
+
+    def setUp(self):
+        self._path = tempfile.mktemp(suffix='.sqlite')
+
+    def tearDown(self):
+        for suffix in ['', '-wal', '-shm']:
+            if os.path.exists(self._path + suffix):
+                os.unlink(self._path + suffix)
+
+    def _create_graph(self, build_time, common_dependency=True):
+        dependency_graph = DependencyGraph()
+        for label, project in [('a.cpp', 'a'), ('b.cpp', 'b')]:
+            dependency_graph.add_top_level_node(
+                label,
+                **{Analyser.Attributes.PROJECT: project,
+                   Analyser.Attributes.BUILD_TIME: build_time,
+                   Analyser.Attributes.COMPILATION_COMMAND: 'cl /c /O2'})
+        dependency_graph.add_dependency_node(
+            'a.cpp', 'a.h',
+            **{Analyser.Attributes.PROJECT: 'a',
+               Analyser.Attributes.BUILD_TIME: build_time})
+        dependency_graph.add_dependency_node('a.h', 'common.h')
+        if common_dependency:
+            dependency_graph.add_dependency_node('b.cpp', 'common.h')
+        return dependency_graph
+
+    def _count(self, table):
+        connection = sqlite3.connect(self._path)
+        try:
+            return connection.execute('SELECT COUNT(*) FROM %s' % table).fetchone()[0]
+        finally:
+            connection.close()
+
+    def test_deduplicates_unchanged_structure(self):
+        with HistoryStore(self._path) as history:
+            self.assertEqual(history.add_build(self._create_graph(1.0), 'night1'), (4, 3))
+            self.assertEqual(history.add_build(self._create_graph(2.0), 'night2'), (0, 0))
+            self.assertEqual(history.add_build(self._create_graph(3.0, False), 'night3'), (0, 0))
+            self.assertEqual(history.add_build(self._create_graph(4.0), 'night4'), (0, 1))
+            with self.assertRaises(RuntimeError):
+                history.add_build(self._create_graph(5.0), 'night4')
+            self.assertEqual([build[0] for build in history.get_builds()],
+                             ['night1', 'night2', 'night3', 'night4'])
+
+            self.assertEqual(history.get_dependency_changes('night2', 'night3'),
+                             ([], [('b.cpp', 'common.h')]))
+            self.assertEqual(history.get_dependency_changes('night1', 'night4'), ([], []))
+
+        self.assertEqual(self._count('edges'), 3)
+        self.assertEqual(self._count('node_spans'), 4)
+        self.assertEqual(self._count('edge_spans'), 4)
+        self.assertEqual(self._count('strings'), 7)
+
+    def test_get_metric_history(self):
+        with HistoryStore(self._path) as history:
+            for night in range(1, 5):
+                history.add_build(self._create_graph(float(night)), 'night%d' % night,
+                                  '2024-01-0%d' % night)
+        with HistoryStore(self._path) as history:
+            self.assertEqual(history.get_metric_history('a.h', Analyser.Attributes.BUILD_TIME, 2),
+                             [('night3', '2024-01-03', 3.0), ('night4', '2024-01-04', 4.0)])
+            self.assertEqual(
+                [value for _, _, value in
+                 history.get_metric_history('common.h', Analyser.Attributes.BUILD_TIME)],
+                [None] * 4)
+            with self.assertRaises(RuntimeError):
+                history.get_metric_history('missing.h', Analyser.Attributes.BUILD_TIME)
+            with self.assertRaises(RuntimeError):
+                history.get_metric_history('a.h', Analyser.Attributes.PROJECT)
+
+    def test_identifies_files_by_path(self):
+        def create_graph(paths, build_time):
+            dependency_graph = DependencyGraph()
+            dependency_graph.add_top_level_node('a.cpp')
+            for label, path in paths:
+                dependency_graph.add_dependency_node(
+                    'a.cpp', label,
+                    **{Analyser.Attributes.ABSOLUTE_PATH: path,
+                       Analyser.Attributes.BUILD_TIME: build_time})
+            return dependency_graph
+
+        with HistoryStore(self._path) as history:
+            history.add_build(create_graph([('types.h', '/core/types.h')], 1.0), 'night1')
+            # a file with the same name parsed first takes over the label
+            self.assertEqual(history.add_build(
+                create_graph([('types.h', '/net/types.h'), ('types.h_1', '/core/types.h')], 2.0),
+                'night2'), (2, 1))
+            self.assertEqual(
+                [value for _, _, value in history.get_metric_history(
+                    '/core/types.h', Analyser.Attributes.BUILD_TIME)],
+                [1.0, 2.0])
+            self.assertEqual(
+                [value for _, _, value in history.get_metric_history(
+                    '/net/types.h', Analyser.Attributes.BUILD_TIME)],
+                [None, 2.0])
+            self.assertEqual(history.find_path('types.h_1'), '/core/types.h')
+            self.assertEqual(history.find_path('types.h', 'night1'), '/core/types.h')
+            with self.assertRaises(RuntimeError):
+                history.find_path('types.h_1', 'night1')
+            self.assertEqual(history.get_dependency_changes('night1', 'night2'),
+                             ([('a.cpp', 'types.h')], []))
+            graph = history.get_graph('night2')
+            self.assertEqual(graph.get_attribute('types.h_1', Analyser.Attributes.ABSOLUTE_PATH),
+                             '/core/types.h')
+            self.assertEqual(graph.get_attribute('types.h_1', Analyser.Attributes.BUILD_TIME), 2.0)
+
+    def test_get_graph(self):
+        with HistoryStore(self._path) as history:
+            history.add_build(self._create_graph(1.0), 'night1')
+            history.add_build(self._create_graph(2.0, False), 'night2')
+            graph = history.get_graph('night1')
+            self.assertEqual(sorted(graph.get_top_level_nodes()), ['a.cpp', 'b.cpp'])
+            self.assertTrue(graph.has_immediate_dependency('b.cpp', 'common.h'))
+            self.assertEqual(graph.get_attribute('a.cpp', Analyser.Attributes.PROJECT), 'a')
+            self.assertEqual(graph.get_attribute('a.cpp', Analyser.Attributes.COMPILATION_COMMAND),
+                             'cl /c /O2')
+            self.assertEqual(graph.get_attribute('a.h', Analyser.Attributes.BUILD_TIME), 1.0)
+            graph = history.get_graph('night2')
+            self.assertEqual(graph.number_of_edges(), 4)
+            self.assertFalse(graph.has_immediate_dependency('b.cpp', 'common.h'))
+            with self.assertRaises(RuntimeError):
+                history.get_graph('night3')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+# Copyright (c) Techland. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+
+import unittest
+import tempfile
+import os
+import json
+import shutil
+import tracemalloc
+from cppbuildprofiler import Analyser, DependencyGraph, Instrumentation
+from cppbuildprofiler import instrumentation
+from cppbuildprofiler.cli import Interpreter
+
+class TestInstrumentation(unittest.TestCase):
+
+    def setUp(self):
+        self._dependency_graph = DependencyGraph()
+        self._dependency_graph.add_top_level_node(
+            'a.cpp', **{Analyser.Attributes.BUILD_TIME: 1.0,
+                        Analyser.Attributes.ABSOLUTE_PATH: __file__})
+        self._dependency_graph.add_dependency_node(
+            'a.cpp', 'a.h', **{Analyser.Attributes.ABSOLUTE_PATH: __file__})
+
+    def test_records_nested_stages(self):
+        recorder = Instrumentation(trace_memory=True)
+        recorder.start()
+        try:
+            with instrumentation.stage('outer') as stage:
+                stage.count('lines', 10)
+                Analyser(self._dependency_graph).calculate_total_build_times()
+                instrumentation.count('lines', 5)
+        finally:
+            recorder.stop()
+
+        stages = recorder.get_report()['stages']
+        self.assertEqual([(stage['path'], stage['depth']) for stage in stages],
+                         [('outer', 0), ('outer/calculate_total_build_times', 1)])
+        self.assertEqual(stages[0]['counters'], {'lines': 15})
+        self.assertEqual(stages[1]['counters'], {'nodes': 3, 'edges': 2})
+        self.assertIn('lines_per_second', stages[0]['rates'])
+        self.assertIn('traced_memory_delta', stages[0])
+        self.assertGreaterEqual(stages[0]['wall_time'], stages[1]['wall_time'])
+
+        # nothing is recorded once stopped
+        with instrumentation.stage('ignored') as stage:
+            stage.count('lines', 1)
+        self.assertEqual(len(recorder.get_report()['stages']), 2)
+
+    def test_instruments_commands(self):
+        report_path = tempfile.mktemp(suffix='.json')
+        try:
+            interpreter = Interpreter()
+            interpreter._depgraph = self._dependency_graph
+            interpreter.onecmd('instrument %s' % report_path)
+            interpreter.onecmd('analyse')
+            with open(report_path) as stream:
+                report = json.load(stream)
+            paths = [stage['path'] for stage in report['stages']]
+            self.assertEqual(paths[:3], ['analyse',
+                                         'analyse/run_full_analysis',
+                                         'analyse/run_full_analysis/get_include_cycles'])
+            self.assertIn('analyse/run_full_analysis/calculate_self_costs', paths)
+        finally:
+            interpreter.onecmd('instrument --stop')
+            self.assertFalse(instrumentation.is_active())
+            if os.path.exists(report_path):
+                os.unlink(report_path)
+
+    def test_unwritable_report(self):
+        report_dir = tempfile.mkdtemp()
+        interpreter = Interpreter()
+        interpreter._depgraph = self._dependency_graph
+        interpreter.onecmd('instrument %s' % os.path.join(report_dir, 'missing', 'report.json'))
+        self.assertFalse(instrumentation.is_active())
+
+        # write errors after later commands are logged
+        interpreter.onecmd('instrument %s' % os.path.join(report_dir, 'report.json'))
+        shutil.rmtree(report_dir)
+        try:
+            interpreter.onecmd('analyse')
+            self.assertTrue(instrumentation.is_active())
+        finally:
+            interpreter.onecmd('instrument --stop')
+        self.assertFalse(instrumentation.is_active())
+
+    def test_keeps_foreign_memory_tracing(self):
+        tracemalloc.start()
+        try:
+            recorder = Instrumentation(trace_memory=True)
+            recorder.start()
+            recorder.stop()
+            self.assertTrue(tracemalloc.is_tracing())
+        finally:
+            tracemalloc.stop()
+        recorder = Instrumentation(trace_memory=True)
+        recorder.start()
+        recorder.stop()
+        self.assertFalse(tracemalloc.is_tracing())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -127,6 +127,22 @@ class TestParser(unittest.TestCase):
 1>  time(C:\Program Files (x86)\Microsoft Visual Studio 11.0\VC\bin\AMD64\c2.dll)=0.00431s < 1806377469258 - 1806377483587 > BB [D:\work\test\test\uses-pch.cpp]
 1>  test.vcxproj -> D:\work\test\x64\Debug\test.exe
 ========== Rebuild All: 1 succeeded, 0 failed, 0 skipped ==========
+'''
+
+    _REPEATED_INCLUSIONS_LOG = r'''
+1>------ Rebuild All started: Project: test, Configuration: Debug Win32 ------
+1>  cl /c /ZI /nologo /W3 /WX- /Od /Bt+ /showIncludes /nologo- /FC test.cpp
+1>  test.cpp
+1>  Note: including file: d:\work\test\test\a.hpp
+1>  Note: including file:  d:\work\test\test\unguarded.hpp
+1>  Note: including file:  d:\work\test\test\cycle.hpp
+1>  Note: including file:   d:\work\test\test\a.hpp
+1>  Note: including file: d:\work\test\test\unguarded.hpp
+1>  Note: including file: d:\work\test\test\b.hpp
+1>  Note: including file:  d:\work\test\test\unguarded.hpp
+1>  time(C:\Program Files (x86)\Microsoft Visual Studio 14.0\VC\bin\amd64_x86\c1xx.dll)=0.03792s < 2653389603198 - 2653389729403 > BB [d:\work\test\test\test.cpp]
+1>  test.vcxproj -> D:\work\test\Debug\test.exe
+========== Rebuild All: 1 succeeded, 0 failed, 0 skipped ==========
 '''
 
     def test_parses_full_vs_log(self):
@@ -302,5 +318,24 @@ class TestParser(unittest.TestCase):
         finally:
             os.remove(log_path)
 
+    def test_counts_repeated_inclusions_and_cycles(self):
+        log_path = tempfile.mktemp()
+        try:
+            with open(log_path, 'w') as output_file:
+                output_file.write(self._REPEATED_INCLUSIONS_LOG)
+            depgraph = parse_vs_log(log_path)
+
+            graph = depgraph._graph
+            self.assertTrue(graph.has_edge('cycle.hpp', 'a.hpp'))
+            self.assertEqual(graph.node['test.cpp'][Analyser.Attributes.REPEATED_INCLUSIONS], 2)
+            self.assertEqual(graph.node['unguarded.hpp'][Analyser.Attributes.REPEATED_INCLUSIONS],
+                             2)
+            self.assertEqual(graph.node['a.hpp'][Analyser.Attributes.INCLUDE_CYCLES], 1)
+            self.assertNotIn(Analyser.Attributes.REPEATED_INCLUSIONS, graph.node['a.hpp'])
+            self.assertNotIn(Analyser.Attributes.INCLUDE_CYCLES, graph.node['unguarded.hpp'])
+            self.assertNotIn(Analyser.Attributes.REPEATED_INCLUSIONS, graph.node['b.hpp'])
+        finally:
+            os.remove(log_path)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,85 @@
+# Copyright (c) Techland. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+
+import unittest
+import tempfile
+import shutil
+import os
+import io
+import logging
+from cppbuildprofiler import progress, parse_vs_log, SyntheticLog
+
+class TestProgress(unittest.TestCase):
+
+    def setUp(self):
+        self._interval = progress.REPORT_INTERVAL
+        self._states = []
+        progress.add_callback(self._states.append)
+
+    def tearDown(self):
+        progress.remove_callback(self._states.append)
+        progress.REPORT_INTERVAL = self._interval
+
+    def test_throttles_reports(self):
+        progress.REPORT_INTERVAL = 3600.0
+        with progress.track('task', 1000) as tracker:
+            for done in range(1, 1001):
+                tracker.update(done)
+        self.assertEqual(len(self._states), 1)
+        state = self._states[0]
+        self.assertTrue(state.finished)
+        self.assertEqual((state.task, state.done, state.total, state.eta),
+                         ('task', 1000, 1000, 0.0))
+
+    def test_reports_parsing_progress(self):
+        progress.REPORT_INTERVAL = 0.0
+        directory = tempfile.mkdtemp()
+        try:
+            log_path = os.path.join(directory, 'log.txt')
+            lines = SyntheticLog(projects=2, translation_units=50).write(log_path)
+            parse_vs_log(log_path)
+        finally:
+            shutil.rmtree(directory)
+
+        parsing = [state for state in self._states if state.task == 'Parsing log.txt']
+        self.assertGreater(len(parsing), 1)
+        self.assertEqual([state.finished for state in parsing[-2:]], [False, True])
+        self.assertEqual(parsing[-1].done, parsing[-1].total)
+        self.assertEqual(parsing[-1].counters, {'lines': lines})
+        self.assertLess(parsing[0].done, parsing[-1].done)
+
+    def test_renders_terminal_line(self):
+        stream = io.StringIO()
+        renderer = progress.TerminalRenderer(stream)
+        renderer(progress.ProgressState('Parsing', 2500000, 10000000, 'B', {'lines': 100},
+                                        2.0, 1250000.0, 6.0, False))
+        renderer(progress.ProgressState('Parsing', 10000000, 10000000, 'B', {'lines': 400},
+                                        8.0, 1250000.0, 0.0, True))
+        renderer(progress.ProgressState('Quick', 1, 1, 'items', {}, 0.0, None, None, True))
+        self.assertEqual(stream.getvalue(),
+                         '\rParsing: 2.5 MB / 10.0 MB (25.0%), 1.2 MB/s, 100 lines (50/s), '
+                         'ETA 0:00:06'
+                         '\rParsing: 10.0 MB / 10.0 MB (100.0%), 1.2 MB/s, 400 lines (50/s), '
+                         'done in 0:00:08\n')
+
+    def test_clears_terminal_line_before_logging(self):
+        stream = io.StringIO()
+        handler = logging.StreamHandler(stream)
+        logger = logging.getLogger('test_progress')
+        logger.addHandler(handler)
+        renderer = progress.TerminalRenderer(stream)
+        handler.addFilter(renderer)
+        try:
+            renderer(progress.ProgressState('Task', 1, None, 'items', {}, 1.0, 1.0, None, False))
+            logger.warning('message')
+            renderer(progress.ProgressState('Task', 2, None, 'items', {}, 2.0, 1.0, None, False))
+        finally:
+            logger.removeHandler(handler)
+        self.assertEqual(stream.getvalue(),
+                         '\rTask: 1 items, 1 items/s'
+                         '\r' + ' ' * len('Task: 1 items, 1 items/s') + '\r'
+                         'message\n'
+                         '\rTask: 2 items, 1 items/s')
+
+if __name__ == '__main__':
+    unittest.main()
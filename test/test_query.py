@@ -0,0 +1,59 @@
+# Copyright (c) Techland. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+
+import unittest
+from cppbuildprofiler import Query
+
+class TestQuery(unittest.TestCase):
+
+    def setUp(self):
+        self._rows = [
+            ('a.h', {'project': 'core', 'buildtime': 150.0, 'translationunits': 3}),
+            ('b.h', {'project': 'core', 'buildtime': 50.0}),
+            ('c.h', {'project': 'render', 'buildtime': 300.0, 'translationunits': 1}),
+            ('d.hpp', {'project': 'render core', 'buildtime': 120.0, 'translationunits': 2}),
+            ]
+
+    def _labels(self, query):
+        return [label for label, _ in query.select(self._rows)]
+
+    def test_where(self):
+        self.assertEqual(self._labels(Query('project == core and buildtime > 100')), ['a.h'])
+        self.assertEqual(self._labels(Query('project == "render core" or buildtime<100')),
+                         ['b.h', 'd.hpp'])
+        self.assertEqual(self._labels(Query('not (project =~ ^core or buildtime >= 300)')),
+                         ['d.hpp'])
+        self.assertEqual(self._labels(Query('translationunits < 2',
+                                            defaults={'translationunits': 0})),
+                         ['b.h', 'c.h'])
+        self.assertEqual(self._labels(Query('label != c.h', label_regex=r'\.h$')),
+                         ['a.h', 'b.h'])
+
+    def test_invalid_where(self):
+        for expression in ['buildtime >', 'project == core and', '(buildtime > 1', 'a = b',
+                           'buildtime > 1 buildtime']:
+            with self.assertRaises(RuntimeError):
+                Query(expression)
+
+    def test_sort_and_top(self):
+        self.assertEqual(self._labels(Query(sort='buildtime')), ['c.h', 'a.h', 'd.hpp', 'b.h'])
+        self.assertEqual(self._labels(Query(sort='buildtime', top=2)), ['c.h', 'a.h'])
+        self.assertEqual(self._labels(Query(sort='buildtime', top=2, ascending=True)),
+                         ['b.h', 'd.hpp'])
+        self.assertEqual(self._labels(Query(sort='label', top=1, ascending=True)), ['a.h'])
+        self.assertEqual(self._labels(Query(top=1)), ['a.h'])
+
+    def test_sort_by_missing_values(self):
+        self.assertEqual(self._labels(Query(sort='translationunits')),
+                         ['a.h', 'd.hpp', 'c.h', 'b.h'])
+        self.assertEqual(self._labels(Query(sort='translationunits', ascending=True, top=4)),
+                         ['c.h', 'd.hpp', 'a.h', 'b.h'])
+        self.assertEqual(self._labels(Query(sort='absolutepath', top=2,
+                                            defaults={'absolutepath': None})),
+                         ['a.h', 'b.h'])
+        with self.assertRaises(RuntimeError):
+            Query(sort='nosuchmetric', defaults={'buildtime': 0.0})
+        Query(sort='label', defaults={'buildtime': 0.0})
+
+if __name__ == '__main__':
+    unittest.main()
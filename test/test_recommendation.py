@@ -0,0 +1,137 @@
+# Copyright (c) Techland. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+
+import unittest
+from cppbuildprofiler import Analyser, DependencyGraph, Recommender
+
+class TestRecommendation(unittest.TestCase):
+
+    def setUp(self):
+        '''
+        The test dependency graph is setup as follows:
+
+        a.cpp, b.cpp, c.cpp [project: p]
+        - common.h [project: lib, file size: 10B, self cost: 1.0]
+        -- detail.h [project: lib, file size: 10B, self cost: 1.0]
+        a.cpp
+        - rare.h [project: lib, file size: 10B, self cost: 1.0]
+        - own.h [project: p, file size: 10B, self cost: 5.0]
+        other.cpp [project: q]
+        - common.h
+        '''
+        self._dependency_graph = DependencyGraph()
+        for label in ['a.cpp', 'b.cpp', 'c.cpp']:
+            self._dependency_graph.add_top_level_node(label, **{Analyser.Attributes.PROJECT: 'p'})
+            self._add_dependency(label, 'common.h', 'lib', 1.0)
+        self._add_dependency('common.h', 'detail.h', 'lib', 1.0)
+        self._add_dependency('a.cpp', 'rare.h', 'lib', 1.0)
+        self._add_dependency('a.cpp', 'own.h', 'p', 5.0)
+        self._dependency_graph.add_top_level_node('other.cpp', **{Analyser.Attributes.PROJECT: 'q'})
+        self._dependency_graph.add_dependency_node('other.cpp', 'common.h')
+
+    def _add_dependency(self, parent, label, project, self_cost):
+        self._dependency_graph.add_dependency_node(
+            parent, label,
+            **{Analyser.Attributes.PROJECT: project,
+               Analyser.Attributes.FILE_SIZE: 10,
+               Analyser.Attributes.SELF_COST: self_cost})
+
+    def test_recommends_pch_contents(self):
+        recommendations = Recommender(self._dependency_graph).recommend_pch_contents(20)
+
+        self.assertEqual([r.project for r in recommendations], ['p', 'q'])
+        recommendation = recommendations[0]
+        self.assertEqual(recommendation.translation_units, 3)
+        self.assertEqual(recommendation.headers, ['common.h'])
+        self.assertEqual(recommendation.contents, ['common.h', 'detail.h'])
+        self.assertEqual(recommendation.size, 20)
+        self.assertAlmostEqual(recommendation.saved_build_time, 3 * (1.0 + 1.0))
+
+    def test_recommends_own_headers_on_request(self):
+        recommendations = Recommender(self._dependency_graph).recommend_pch_contents(
+            30, include_own_headers=True, projects=['p'])
+
+        self.assertEqual(len(recommendations), 1)
+        self.assertEqual(recommendations[0].headers, ['own.h', 'common.h'])
+        self.assertAlmostEqual(recommendations[0].saved_build_time, 3 * 2.0 + 5.0)
+
+    def test_pch_gain_per_byte_may_grow(self):
+        '''
+        wrap.h is worth little until big.h, which it includes, gets in the
+        pch with top.h, then it is worth more per byte than lone.h.
+        '''
+        depgraph = DependencyGraph()
+        depgraph.add_top_level_node('a.cpp', **{Analyser.Attributes.PROJECT: 'p'})
+        for parent, label, file_size, self_cost in [('a.cpp', 'top.h', 10, 200.0),
+                                                    ('top.h', 'big.h', 100, 0.0),
+                                                    ('a.cpp', 'wrap.h', 10, 5.0),
+                                                    ('wrap.h', 'big.h', 100, 0.0),
+                                                    ('a.cpp', 'lone.h', 10, 4.0)]:
+            depgraph.add_dependency_node(parent, label,
+                                         **{Analyser.Attributes.PROJECT: 'lib',
+                                            Analyser.Attributes.FILE_SIZE: file_size,
+                                            Analyser.Attributes.SELF_COST: self_cost})
+
+        recommendation = Recommender(depgraph).recommend_pch_contents(1000, max_headers=2)[0]
+
+        self.assertEqual(recommendation.headers, ['top.h', 'wrap.h'])
+        self.assertEqual(recommendation.contents, ['big.h', 'top.h', 'wrap.h'])
+        self.assertEqual(recommendation.size, 120)
+        self.assertAlmostEqual(recommendation.saved_build_time, 205.0)
+
+    def test_recommends_unity_batches(self):
+        depgraph = DependencyGraph()
+        for index in range(8):
+            label = 'tu%d.cpp' % index
+            group = 'even' if index % 2 == 0 else 'odd'
+            depgraph.add_top_level_node(label, **{Analyser.Attributes.PROJECT: 'p',
+                                                  Analyser.Attributes.FILE_SIZE: 1,
+                                                  Analyser.Attributes.BUILD_TIME: 1.0})
+            for header in range(10):
+                depgraph.add_dependency_node(label, '%s%d.h' % (group, header),
+                                             **{Analyser.Attributes.FILE_SIZE: 10,
+                                                Analyser.Attributes.SELF_COST: 0.1})
+
+        batches = Recommender(depgraph).recommend_unity_batches(4)
+
+        self.assertEqual(sorted(batch.translation_units for batch in batches), [
+            ['tu0.cpp', 'tu2.cpp', 'tu4.cpp', 'tu6.cpp'],
+            ['tu1.cpp', 'tu3.cpp', 'tu5.cpp', 'tu7.cpp'],
+            ])
+        for batch in batches:
+            self.assertEqual(batch.project, 'p')
+            self.assertEqual(batch.total_size, 4 + 10 * 10)
+            self.assertEqual(batch.size_reduction, 3 * 10 * 10)
+            self.assertAlmostEqual(batch.saved_build_time, 3 * 10 * 0.1)
+
+        # files using different precompiled headers aren't batched together
+        for pch in ['pch', 'other']:
+            depgraph.add_top_level_node(pch + '.cpp', **{Analyser.Attributes.PROJECT: 'p',
+                                                         Analyser.Attributes.CREATED_PCH:
+                                                         pch + '.h'})
+            depgraph.add_dependency_node(pch + '.cpp', pch + '.h')
+        for index in range(8):
+            depgraph.set_attribute('tu%d.cpp' % index, Analyser.Attributes.USED_PCH,
+                                   'pch.h' if index < 4 else 'other.h')
+        batches = Recommender(depgraph).recommend_unity_batches(4)
+
+        self.assertEqual(sorted(batch.translation_units for batch in batches), [
+            ['tu0.cpp', 'tu2.cpp'],
+            ['tu1.cpp', 'tu3.cpp'],
+            ['tu4.cpp', 'tu6.cpp'],
+            ['tu5.cpp', 'tu7.cpp'],
+            ])
+        self.assertEqual(sorted(batch.index for batch in batches), [0, 1, 2, 3])
+
+    def test_unity_batches_respect_build_time(self):
+        for label in ['a.cpp', 'b.cpp', 'c.cpp']:
+            self._dependency_graph.set_attribute(label, Analyser.Attributes.BUILD_TIME, 1.0)
+        batches = Recommender(self._dependency_graph).recommend_unity_batches(
+            10, max_batch_build_time=1.5, projects=['p'])
+
+        self.assertEqual(len(batches), 3)
+        self.assertTrue(all(len(batch.translation_units) == 1 for batch in batches))
+        self.assertTrue(all(batch.size_reduction == 0 for batch in batches))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+# Copyright (c) Techland. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+
+import unittest
+import tempfile
+import shutil
+import os
+import json
+from cppbuildprofiler import Analyser, DependencyGraph, HtmlReport
+
+class TestReport(unittest.TestCase):
+
+    def setUp(self):
+        self._dependency_graph = DependencyGraph()
+        for index in range(5):
+            self._dependency_graph.add_top_level_node(
+                '%d.cpp' % index,
+                **{Analyser.Attributes.PROJECT: 'project',
+                   Analyser.Attributes.BUILD_TIME: float(index)})
+            self._dependency_graph.add_dependency_node('%d.cpp' % index, '<common>.h')
+        analyser = Analyser(self._dependency_graph)
+        analyser.calculate_total_build_times()
+        analyser.calculate_translation_units()
+        self._directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self._directory)
+
+    def _read_chunk(self, name):
+        with open(os.path.join(self._directory, 'data', name + '.js')) as stream:
+            content = stream.read()
+        prefix = 'cbpReport.load(%s,' % json.dumps(name)
+        self.assertTrue(content.startswith(prefix))
+        return json.loads(content[len(prefix):-len(');\n')])
+
+    def test_writes_paginated_tables(self):
+        HtmlReport(self._dependency_graph, page_size=2, max_sorted_rows=3,
+                   neighbourhoods=1).write(self._directory)
+
+        self.assertTrue(os.path.exists(os.path.join(self._directory, 'index.html')))
+        build_time = Analyser.Attributes.BUILD_TIME
+        pages = [self._read_chunk('translation_units.%s.%d' % (build_time, page))
+                 for page in range(3)]
+        self.assertEqual([[row[0] for row in page] for page in pages],
+                         [['4.cpp', '3.cpp'], ['2.cpp', '1.cpp'], ['0.cpp']])
+        self.assertFalse(os.path.exists(os.path.join(
+            self._directory, 'data', 'translation_units.%s.3.js' % build_time)))
+
+        file_size = Analyser.Attributes.FILE_SIZE
+        self.assertEqual(len(self._read_chunk('translation_units.%s.1' % file_size)), 1)
+        self.assertFalse(os.path.exists(os.path.join(
+            self._directory, 'data', 'translation_units.%s.2.js' % file_size)))
+
+        headers = self._read_chunk('headers.%s.0' % Analyser.Attributes.AGG_BUILD_TIME_DEV)
+        self.assertEqual(headers[0][0], '<common>.h')
+        self.assertIn('&lt;common&gt;.h', self._read_chunk('view.1'))
+
+        projects = self._read_chunk('projects.%s.0' % Analyser.ProjectMetrics.BUILD_TIME)
+        self.assertEqual(projects[0][:3], ['project', 5, 10.0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+# Copyright (c) Techland. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+
+import unittest
+import threading
+import json
+from unittest import mock
+from urllib.request import urlopen, Request
+from urllib.error import HTTPError
+from urllib.parse import quote
+from cppbuildprofiler import Analyser, DependencyGraph, QueryServer
+
+class TestServer(unittest.TestCase):
+
+    def setUp(self):
+        dependency_graph = DependencyGraph()
+        dependency_graph.add_top_level_node('a.cpp', **{Analyser.Attributes.BUILD_TIME: 2.0})
+        dependency_graph.add_top_level_node('b.cpp', **{Analyser.Attributes.BUILD_TIME: 1.0})
+        dependency_graph.add_dependency_node('a.cpp', 'a.h')
+        dependency_graph.add_dependency_node('a.h', 'common.h')
+        dependency_graph.add_dependency_node('b.cpp', 'common.h')
+        self._server = QueryServer(dependency_graph, port=0, threads=2)
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.start()
+        self._url = 'http://%s:%d' % self._server.address
+
+    def tearDown(self):
+        self._server.shutdown()
+        self._thread.join()
+
+    def _query(self, command, post=False):
+        if post:
+            request = Request(self._url + '/query',
+                              json.dumps({'command': command}).encode('utf-8'),
+                              {'Content-Type': 'application/json'})
+        else:
+            request = self._url + '/query?command=' + quote(command)
+        try:
+            with urlopen(request) as response:
+                return response.status, json.loads(response.read().decode('utf-8'))
+        except HTTPError as error:
+            return error.code, json.loads(error.read().decode('utf-8'))
+
+    def test_answers_queries(self):
+        status, body = self._query('why common.h --origin a.cpp')
+        self.assertEqual(status, 200)
+        self.assertEqual(body['output'], 'a.cpp -> a.h -> common.h\n')
+
+        status, body = self._query('print -n top-level -m buildtime --sort buildtime', True)
+        self.assertEqual(status, 200)
+        self.assertEqual(body['output'].splitlines()[1:],
+                         ['a.cpp;2.0', 'b.cpp;1.0'])
+
+        status, body = self._query('print --help')
+        self.assertEqual(status, 200)
+        self.assertIn('--where', body['output'])
+
+    def test_rejects_invalid_queries(self):
+        status, body = self._query('remove_thirdparty_dependencies D:/work')
+        self.assertEqual(status, 400)
+        self.assertIn('Unknown command', body['error'])
+
+        status, body = self._query('print -n top-level -M --out graph.csv')
+        self.assertEqual(status, 400)
+        self.assertIn('not allowed', body['error'])
+
+        status, body = self._query('print --unknown-option')
+        self.assertEqual(status, 400)
+        self.assertIn('arguments are required', body['error'])
+
+    def test_shares_analysis_indexes(self):
+        # the indexes are built by the server, not by each query
+        with mock.patch.object(Analyser, '_build_pch_dependencies',
+                               side_effect=AssertionError), \
+                mock.patch.object(DependencyGraph, 'get_condensation',
+                                  side_effect=AssertionError):
+            status, body = self._query('recommend_pch -s 100')
+            self.assertEqual(status, 200)
+            status, body = self._query('include_cycles')
+            self.assertEqual(status, 200)
+            status, body = self._query('whatif --remove a.cpp a.h')
+            self.assertEqual(status, 200)
+            self.assertIn('a.cpp', body['output'])
+
+    def test_requires_dependency_graph(self):
+        with self.assertRaisesRegex(RuntimeError, 'No dependency graph'):
+            QueryServer(None, port=0)
+
+    def test_listens_on_loopback_only(self):
+        with self.assertRaisesRegex(RuntimeError, 'not a loopback address'):
+            QueryServer(DependencyGraph(), host='0.0.0.0', port=0)
+
+if __name__ == '__main__':
+    unittest.main()
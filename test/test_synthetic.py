@@ -0,0 +1,46 @@
+# Copyright (c) Techland. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+
+import unittest
+import tempfile
+import shutil
+import os
+from cppbuildprofiler import Analyser, SyntheticLog, parse_vs_log
+
+class TestSynthetic(unittest.TestCase):
+
+    def setUp(self):
+        self._directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self._directory)
+
+    def test_is_deterministic(self):
+        log = SyntheticLog(projects=3, translation_units=5, headers=10, system_headers=20)
+        self.assertEqual(list(log.lines()), list(SyntheticLog(
+            projects=3, translation_units=5, headers=10, system_headers=20).lines()))
+        self.assertNotEqual(list(log.lines()), list(SyntheticLog(
+            projects=3, translation_units=5, headers=10, system_headers=20, seed=1).lines()))
+
+    def test_generates_parseable_log(self):
+        log = SyntheticLog(projects=4, translation_units=10, headers=20, system_headers=30,
+                           channels=3, pch=0.5, duplicate_basenames=0.3,
+                           root=os.path.join(self._directory, 'src'))
+        log_path = os.path.join(self._directory, 'log.txt')
+        log.write(log_path)
+        log.write_sources()
+
+        depgraph = parse_vs_log(log_path)
+        top_level = list(depgraph.get_top_level_nodes())
+        pch_projects = [label for label in top_level
+                        if depgraph.has_attribute(label, Analyser.Attributes.CREATED_PCH)]
+        self.assertEqual(len(top_level), 4 * 10 + len(pch_projects))
+        self.assertTrue(any(label.startswith('types.h_') for label in depgraph.get_nodes()))
+
+        Analyser(depgraph).run_full_analysis()
+        for label in top_level:
+            self.assertGreater(depgraph.get_attribute(label, Analyser.Attributes.BUILD_TIME), 0.0)
+            self.assertGreater(depgraph.get_attribute(label, Analyser.Attributes.TOTAL_SIZE), 0)
+
+if __name__ == '__main__':
+    unittest.main()